@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import datetime
+import gzip
+import json
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+from urllib.parse import quote
+
+from pynamodb.exceptions import UpdateError
+
+from awd.database import DoiProcessAttempt, StatusCounts
+from awd.status import Status
+
+if TYPE_CHECKING:
+    from awd.storage import ObjectStore
+
+logger = logging.getLogger(__name__)
+
+# key prefix in the bucket for archived DOI items, not listed by spreadsheet ingestion
+ARCHIVE_PREFIX = "archived/doi-items"
+TERMINAL_STATUS_CODES = (Status.SUCCESS.value, Status.FAILED.value)
+
+
+class DoiArchive:
+    """An S3 archive of DOI items removed from the DOI table.
+
+    Archived items are written as gzipped JSONL files for reporting, and a small
+    index object per DOI records that the DOI was deposited, so a DOI resubmitted in
+    a spreadsheet is recognized after its item has expired from the DOI table.
+    """
+
+    def __init__(self, s3_client: ObjectStore, bucket: str) -> None:
+        """Initialize DOI archive instance.
+
+        Args:
+            s3_client: A configured S3 client or another object store.
+            bucket: The S3 bucket holding the archive.
+        """
+        self.s3_client: ObjectStore = s3_client
+        self.bucket: str = bucket
+
+    @staticmethod
+    def index_key(doi: str) -> str:
+        """Get the key of the index object for a DOI.
+
+        Args:
+            doi: The DOI of the archived item.
+        """
+        return f"{ARCHIVE_PREFIX}/index/{quote(doi, safe='')}.json"
+
+    def contains(self, doi: str) -> bool:
+        """Check whether a DOI has been archived with a single request.
+
+        Args:
+            doi: The DOI to check.
+        """
+        return self.s3_client.file_exists(self.bucket, self.index_key(doi))
+
+    def archive_terminal_items(self, min_age_seconds: float, segments: int = 4) -> int:
+        """Archive SUCCESS and FAILED items older than an age and expire them.
+
+        Items are written to the archive before they are marked for deletion with the
+        DynamoDB TTL attribute expires_at, which is only set if the item's status is
+        unchanged. Expiring items are no longer counted in the status counts. Returns
+        the number of items archived.
+
+        Args:
+            min_age_seconds: The minimum number of seconds since an item was last
+            modified.
+            segments: The number of scan segments read concurrently.
+        """
+        cutoff = time.time() - min_age_seconds
+
+        def archive_segment(segment: int) -> int:
+            items = list(
+                DoiProcessAttempt.scan(
+                    segment=segment,
+                    total_segments=segments,
+                    filter_condition=DoiProcessAttempt.status_code.is_in(
+                        *TERMINAL_STATUS_CODES
+                    )
+                    & (DoiProcessAttempt.last_modified_ts <= cutoff)
+                    & DoiProcessAttempt.expires_at.does_not_exist(),
+                )
+            )
+            if not items:
+                return 0
+            self.write_items(items)
+            return sum(self.expire_item(item) for item in items)
+
+        with ThreadPoolExecutor(max_workers=segments) as executor:
+            archived_count = sum(executor.map(archive_segment, range(segments)))
+        logger.info("%s DOI items archived to s3://%s", archived_count, self.bucket)
+        return archived_count
+
+    def write_items(self, items: list[DoiProcessAttempt]) -> None:
+        """Write DOI items to a new archive file and their index objects.
+
+        Args:
+            items: The DOI items to archive.
+        """
+        date = datetime.datetime.now(tz=datetime.UTC).strftime("%Y-%m-%d")
+        key = f"{ARCHIVE_PREFIX}/items/{date}/{uuid.uuid4().hex}.jsonl.gz"
+        records = [item.to_simple_dict() for item in items]
+        self.s3_client.put_file(
+            gzip.compress(
+                "".join(f"{json.dumps(record)}\n" for record in records).encode()
+            ),
+            self.bucket,
+            key,
+        )
+        for record in records:
+            self.s3_client.put_file(
+                json.dumps({"status_code": record["status_code"], "archive": key}),
+                self.bucket,
+                self.index_key(record["doi"]),
+            )
+
+    @staticmethod
+    def expire_item(item: DoiProcessAttempt) -> bool:
+        """Mark an archived item for deletion from the DOI table.
+
+        Returns False if the item changed after it was archived, leaving it in place.
+
+        Args:
+            item: The archived DOI item.
+        """
+        try:
+            item.update(
+                actions=[
+                    DoiProcessAttempt.expires_at.set(
+                        datetime.datetime.now(tz=datetime.UTC)
+                    )
+                ],
+                condition=(DoiProcessAttempt.status_code == item.status_code)
+                & (DoiProcessAttempt.last_modified == item.last_modified),
+            )
+        except UpdateError as e:
+            if e.cause_response_code != "ConditionalCheckFailedException":
+                raise
+            logger.debug("%s changed after it was archived, not expired", item.doi)
+            return False
+        StatusCounts.apply([(item.status_code, -1)])
+        return True
@@ -1,20 +1,58 @@
+from __future__ import annotations
+
+import functools
+import itertools
 import json
 import logging
-from typing import Any
-
-from requests import Response
-
-from awd.database import DoiProcessAttempt
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any
+
+from awd.concurrency import BackgroundCall
+from awd.config import (
+    CONTENT_RETRY_BASE_SECONDS,
+    CONTENT_RETRY_MAX_SECONDS,
+    CONTENT_RETRY_THRESHOLD,
+    DOI_LEASE_SECONDS,
+)
 from awd.helpers import (
-    S3Client,
     SQSClient,
     get_crossref_response_from_doi,
     get_wiley_response,
 )
+from awd.logs import log_context
+from awd.metrics import RUN_METRICS
+from awd.scheduler import BackoffSchedule
+from awd.state import STATE_STORE_ERRORS, DynamoDBStateStore
 from awd.status import Status
 
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+    from concurrent.futures import ThreadPoolExecutor
+
+    from requests import Response
+
+    from awd.concurrency import ByteBudget, RequestHedger
+    from awd.database import DoiProcessAttempt
+    from awd.state import StateStore
+    from awd.storage import ObjectStore
+
 logger = logging.getLogger(__name__)
 
+PDF_MAGIC_BYTES = b"%PDF-"
+WILEY_PREVIEW_BYTES = 2048
+WILEY_CHUNK_BYTES = 1024 * 1024
+
+
+@functools.cache
+def default_lease_owner() -> str:
+    """Identify this deposit process as a lease owner by host, process ID and a nonce."""
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
 
 class Article:
     """Article class.
@@ -28,13 +66,20 @@ class Article:
         doi: str,
         metadata_url: str,
         content_url: str,
-        s3_client: S3Client,
+        s3_client: ObjectStore,
         bucket: str,
         sqs_client: SQSClient,
         sqs_base_url: str,
         sqs_input_queue: str,
         sqs_output_queue: str,
         collection_handle: str,
+        byte_budget: ByteBudget | None = None,
+        lease_owner: str | None = None,
+        lease_seconds: float = DOI_LEASE_SECONDS,
+        state_store: StateStore | None = None,
+        content_backoff: BackoffSchedule | None = None,
+        crossref_hedger: RequestHedger | None = None,
+        io_executor: ThreadPoolExecutor | None = None,
     ) -> None:
         """Initialize article instance.
 
@@ -42,7 +87,7 @@ class Article:
             doi: A digital object identifer (DOI) for an article.
             metadata_url: The URL for retrieving metadata records.
             content_url: The URL for retrieving article content.
-            s3_client: A configured S3 client.
+            s3_client: A configured S3 client or another object store.
             bucket: The S3 bucket for uploading metadata and article content.
             sqs_client: A configured SQS client.
             sqs_base_url: The SQS base URL to use. Enables easier unit testing.
@@ -50,43 +95,174 @@ class Article:
             sqs_output_queue: The SQS output queue to use.
             collection_handle: The handle of the DSpace collection to which items
             will be uploaded.
+            byte_budget: An optional budget shared by concurrently processed articles,
+            from which the size of the article content is held until it is uploaded.
+            lease_owner: The identifier of the deposit process, which holds the DOI's
+            lease while the article is processed. Defaults to this host and process.
+            lease_seconds: The number of seconds until the DOI's lease expires.
+            state_store: The store of the DOI's processing state, which defaults to
+            the DynamoDB table.
+            content_backoff: The schedule for retrying the DOI while its PDF is not
+            available from Wiley.
+            crossref_hedger: An optional request hedger for the Crossref request.
+            io_executor: An optional executor on which the Wiley content is
+            downloaded while the Crossref metadata is retrieved, and the metadata is
+            uploaded while the content is uploaded.
         """
         self.doi: str = doi
         self.metadata_url: str = metadata_url
         self.content_url: str = content_url
-        self.s3_client: S3Client = s3_client
+        self.s3_client: ObjectStore = s3_client
         self.bucket: str = bucket
         self.sqs_client: SQSClient = sqs_client
         self.sqs_base_url: str = sqs_base_url
         self.sqs_input_queue: str = sqs_input_queue
         self.sqs_output_queue: str = sqs_output_queue
         self.collection_handle: str = collection_handle
+        self.byte_budget: ByteBudget | None = byte_budget
+        self.content_bytes: int = 0
+        self.lease_owner: str = lease_owner or default_lease_owner()
+        self.lease_seconds: float = lease_seconds
+        self.lease_acquired: bool = False
+        self.state_store: StateStore = state_store or DynamoDBStateStore()
+        self.content_backoff: BackoffSchedule = content_backoff or BackoffSchedule(
+            CONTENT_RETRY_BASE_SECONDS, CONTENT_RETRY_MAX_SECONDS, CONTENT_RETRY_THRESHOLD
+        )
+        self.crossref_hedger: RequestHedger | None = crossref_hedger
+        self.io_executor: ThreadPoolExecutor | None = io_executor
+        self.content_cancelled: threading.Event = threading.Event()
         self.doi_process_attempt: DoiProcessAttempt
         self.crossref_metadata: dict[str, Any]
         self.dspace_metadata: dict[str, Any]
         self.article_content: bytes
 
     def process(self) -> None:
-        """Run the complete article processing workflow."""
-        self.check_status_and_increment_process_attempts()
-        self.get_and_validate_crossref_metadata()
-        self.create_and_validate_dspace_metadata()
-        self.get_and_validate_wiley_article_content()
-        self.upload_files_and_send_sqs_message()
+        """Run the complete article processing workflow, timing each stage.
+
+        With an I/O executor, the Wiley content is downloaded while the metadata is
+        retrieved from Crossref, and the download is stopped if the metadata is
+        invalid. Errors are handled in the same order as when run sequentially.
+        """
+        with RUN_METRICS.timer("article"), log_context(doi=self.doi):
+            try:
+                with self.stage("status_check"):
+                    self.check_status_and_increment_process_attempts()
+                content_call = None
+                if self.io_executor is not None:
+                    content_call = BackgroundCall(self.io_executor, self.get_content)
+                try:
+                    self.get_metadata()
+                except BaseException:
+                    if content_call is not None:
+                        self.content_cancelled.set()
+                        content_call.abandon()
+                    raise
+                try:
+                    if content_call is not None:
+                        content_call.result()
+                    else:
+                        self.get_content()
+                except InvalidArticleContentResponseError:
+                    self.schedule_content_retry()
+                    raise
+                with self.stage("upload_and_send"):
+                    self.upload_files_and_send_sqs_message()
+            finally:
+                self.release_content_bytes()
+                self.release_lease()
+
+    def get_metadata(self) -> None:
+        """Get the Crossref metadata and create the DSpace metadata from it."""
+        with self.stage("crossref_metadata"):
+            self.get_and_validate_crossref_metadata()
+        with self.stage("dspace_metadata"):
+            self.create_and_validate_dspace_metadata()
+
+    def get_content(self) -> None:
+        """Get the article content from Wiley."""
+        with self.stage("wiley_content"):
+            self.get_and_validate_wiley_article_content()
+
+    @staticmethod
+    @contextmanager
+    def stage(name: str) -> Iterator[None]:
+        """Time a processing stage and add its name to the records it logs.
+
+        Args:
+            name: The name of the stage.
+        """
+        with RUN_METRICS.timer(name), log_context(stage=name):
+            yield
 
     def check_status_and_increment_process_attempts(self) -> None:
-        """Check for unprocessed status.
+        """Check for unprocessed status and acquire the DOI's lease.
 
-        Raise exception if DOI should not be retried. Increment process_attempts
+        Raise exception if DOI should not be retried, is backing off until its next
+        attempt or is leased by another deposit process. Increment process_attempts
         field.
-
-        Args:
-            doi: The DOI to be checked and possibly added to the DOI table.
         """
-        self.doi_process_attempt = DoiProcessAttempt.get(self.doi)
-        if not self.doi_process_attempt.has_unprocessed_status():
+        self.doi_process_attempt = self.state_store.get(self.doi)
+        if self.doi_process_attempt.status_code != Status.UNPROCESSED.value:
             raise UnprocessedStatusFalseError
-        self.doi_process_attempt.increment_process_attempts()
+        next_attempt_at = self.doi_process_attempt.next_attempt_at
+        if next_attempt_at is not None and next_attempt_at > time.time():
+            logger.debug("%s is not due for an attempt yet, skipped", self.doi)
+            raise DoiAttemptNotDueError
+        if not self.state_store.acquire_lease(
+            self.doi_process_attempt, self.lease_owner, self.lease_seconds
+        ):
+            logger.info("%s is being processed by another deposit, skipped", self.doi)
+            raise DoiLeaseUnavailableError
+        self.lease_acquired = True
+        self.state_store.increment_process_attempts(
+            self.doi_process_attempt, lease_owner=self.lease_owner
+        )
+
+    def schedule_content_retry(self) -> None:
+        """Back off from the DOI until its PDF may be available from Wiley.
+
+        The process attempt is given back, as the DOI never reached DSS, and the
+        content attempts have their own budget, after which the DOI is set to FAILED.
+        """
+        item = self.doi_process_attempt
+        item.process_attempts -= 1
+        item.content_attempts = int(item.content_attempts or 0) + 1
+        if self.content_backoff.exhausted(item.content_attempts):
+            logger.error(
+                "DOI: '%s' PDF was not available after %s attempts and will not be "
+                "attempted again.",
+                self.doi,
+                item.content_attempts,
+            )
+            self.state_store.update_status(
+                item, Status.FAILED.value, lease_owner=self.lease_owner
+            )
+            return
+        delay = self.content_backoff.delay(item.content_attempts)
+        self.state_store.update_status(
+            item,
+            Status.UNPROCESSED.value,
+            next_attempt_at=time.time() + delay,
+            lease_owner=self.lease_owner,
+        )
+        logger.info(
+            "PDF for %s not available yet, next attempt in %d seconds", self.doi, delay
+        )
+
+    def release_lease(self) -> None:
+        """Release the DOI's lease, leaving it to expire if it cannot be released."""
+        if not self.lease_acquired:
+            return
+        self.lease_acquired = False
+        try:
+            self.state_store.release_lease(self.doi_process_attempt, self.lease_owner)
+        except STATE_STORE_ERRORS:
+            logger.warning(
+                "Unable to release lease on %s, it expires in %s seconds",
+                self.doi,
+                self.lease_seconds,
+                exc_info=True,
+            )
 
     def valid_crossref_metadata(self, crossref_response: Response) -> bool:
         """Validate that a Crossref work record contains sufficient metadata.
@@ -95,7 +271,11 @@ class Article:
             crossref_response: A response from Crossref to be validated.
         """
         valid = False
-        if work_record := crossref_response.json():
+        try:
+            work_record = crossref_response.json()
+        except ValueError:
+            work_record = None
+        if work_record:
             if (
                 work_record.get("message", {}).get("title") is not None
                 and work_record.get("message", {}).get("URL") is not None
@@ -112,7 +292,9 @@ class Article:
 
     def get_and_validate_crossref_metadata(self) -> None:
         """Get and validate metadata from Crossref API."""
-        crossref_response = get_crossref_response_from_doi(self.metadata_url, self.doi)
+        crossref_response = get_crossref_response_from_doi(
+            self.metadata_url, self.doi, hedger=self.crossref_hedger
+        )
         if self.valid_crossref_metadata(crossref_response) is False:
             raise InvalidCrossrefMetadataError
         self.crossref_metadata = crossref_response.json()
@@ -222,31 +404,84 @@ class Article:
             raise InvalidDSpaceMetadataError
         self.dspace_metadata = dspace_metadata
 
-    def valid_article_content_response(self, wiley_response: Response) -> bool:
+    def valid_article_content_response(
+        self, wiley_response: Response, body_start: bytes | None = None
+    ) -> bool:
         """Validate the Wiley response contained a PDF.
 
+        The content-type header is checked and, if the start of the body has been
+        read, so are the '%PDF-' magic bytes. Only a preview of the body is logged.
+
         Args:
            wiley_response: A response from the Wiley server to be validated.
+           body_start: The first chunk of the response body, if it has been read.
         """
         valid = False
-        if wiley_response.headers["content-type"].startswith("application/pdf"):
+        if wiley_response.headers.get("content-type", "").startswith(
+            "application/pdf"
+        ) and (body_start is None or body_start.startswith(PDF_MAGIC_BYTES)):
             valid = True
             logger.debug("PDF downloaded for %s", self.doi)
         else:
             logger.error("A PDF could not be retrieved for DOI: %s", self.doi)
             logger.debug(
-                "Response contents retrieved from Wiley server for %s: %s",
+                "Response preview retrieved from Wiley server for %s: %r",
                 self.doi,
-                wiley_response.content,
+                (body_start or b"")[:WILEY_PREVIEW_BYTES],
             )
         return valid
 
     def get_and_validate_wiley_article_content(self) -> None:
-        """Get and validate article content from the Wiley server."""
+        """Get and validate article content from the Wiley server.
+
+        The response is validated from its headers and first chunk, so a response
+        that is not a PDF is closed without downloading the rest of its body. With a
+        byte budget, the Content-Length of the PDF is acquired before the rest of the
+        body is read, and a body without a Content-Length is accounted for once read.
+        """
+        if self.content_cancelled.is_set():
+            raise ArticleContentCancelledError
         wiley_response = get_wiley_response(self.content_url, self.doi)
-        if self.valid_article_content_response(wiley_response) is False:
-            raise InvalidArticleContentResponseError
-        self.article_content = wiley_response.content
+        with wiley_response:
+            chunks = wiley_response.iter_content(chunk_size=WILEY_PREVIEW_BYTES)
+            body_start = next(chunks, b"")
+            if not self.valid_article_content_response(wiley_response, body_start):
+                raise InvalidArticleContentResponseError
+            if self.byte_budget is not None:
+                content_length = int(wiley_response.headers.get("content-length", 0))
+                self.byte_budget.acquire(content_length)
+                self.content_bytes = content_length
+            self.article_content = b"".join(
+                self.check_cancelled(chunk)
+                for chunk in itertools.chain(
+                    [body_start],
+                    wiley_response.iter_content(chunk_size=WILEY_CHUNK_BYTES),
+                )
+            )
+        if (
+            self.byte_budget is not None
+            and len(self.article_content) > self.content_bytes
+        ):
+            self.byte_budget.acquire(
+                len(self.article_content) - self.content_bytes, block=False
+            )
+            self.content_bytes = len(self.article_content)
+
+    def check_cancelled(self, chunk: bytes) -> bytes:
+        """Return a chunk of the article content unless its download was cancelled.
+
+        Args:
+            chunk: The chunk of the article content.
+        """
+        if self.content_cancelled.is_set():
+            raise ArticleContentCancelledError
+        return chunk
+
+    def release_content_bytes(self) -> None:
+        """Return the bytes held for the article content to the byte budget."""
+        if self.byte_budget is not None and self.content_bytes:
+            self.byte_budget.release(self.content_bytes)
+            self.content_bytes = 0
 
     def upload_files_and_send_sqs_message(
         self,
@@ -254,18 +489,31 @@ class Article:
         """Upload files to S3 bucket and send SQS message with the resulting S3 URIs."""
         doi_file_name = self.doi.replace("/", "-")  # 10.12/term.3131 to 10.12-term.3131
 
-        self.s3_client.put_file(
+        upload_metadata = functools.partial(
+            self.s3_client.put_file,
             file_content=json.dumps(self.dspace_metadata),
             bucket=self.bucket,
             key=f"{doi_file_name}.json",
         )
-        self.s3_client.put_file(
-            file_content=self.article_content,
-            bucket=self.bucket,
-            key=f"{doi_file_name}.pdf",
-        )
+        upload_call = None
+        if self.io_executor is not None:
+            upload_call = BackgroundCall(self.io_executor, upload_metadata)
+        else:
+            upload_metadata()
+        try:
+            self.s3_client.put_file(
+                file_content=self.article_content,
+                bucket=self.bucket,
+                key=f"{doi_file_name}.pdf",
+            )
+        except BaseException:
+            if upload_call is not None:
+                upload_call.abandon()
+            raise
+        if upload_call is not None:
+            upload_call.result()
 
-        s3_uri_prefix = f"s3://{self.bucket}/{doi_file_name}"
+        s3_uri_prefix = self.s3_client.uri(self.bucket, doi_file_name)
 
         dss_message_attributes = self.sqs_client.create_dss_message_attributes(
             package_id=self.doi,
@@ -285,7 +533,15 @@ class Article:
             message_body=dss_message_body,
         )
 
-        self.doi_process_attempt.update_status(status_code=Status.MESSAGE_SENT.value)
+        self.state_store.update_status(
+            self.doi_process_attempt,
+            status_code=Status.MESSAGE_SENT.value,
+            lease_owner=self.lease_owner,
+        )
+
+
+class ArticleContentCancelledError(Exception):
+    pass
 
 
 class InvalidCrossrefMetadataError(Exception):
@@ -302,3 +558,11 @@ class InvalidArticleContentResponseError(Exception):
 
 class UnprocessedStatusFalseError(Exception):
     pass
+
+
+class DoiLeaseUnavailableError(Exception):
+    pass
+
+
+class DoiAttemptNotDueError(Exception):
+    pass
@@ -1,144 +1,506 @@
+from __future__ import annotations
+
 import datetime
 import io
 import logging
+import signal
+from typing import TYPE_CHECKING
 
 import click
-from botocore.exceptions import ClientError
-from pynamodb.exceptions import DoesNotExist, GetError
 
-from awd.article import (
-    Article,
-    InvalidArticleContentResponseError,
-    InvalidCrossrefMetadataError,
-    InvalidDSpaceMetadataError,
-    UnprocessedStatusFalseError,
-)
 from awd.config import AWS_REGION_NAME, DATE_FORMAT, Config
-from awd.database import DoiProcessAttempt
-from awd.helpers import (
-    S3Client,
-    SESClient,
-    SQSClient,
-    filter_log_stream,
-    get_dois_from_spreadsheet,
-)
+
+if TYPE_CHECKING:
+    from mypy_boto3_sqs.type_defs import MessageTypeDef
+
+    from awd.scheduler import DoiScheduler
+    from awd.state import StateStore
+    from awd.storage import ObjectStore
+
+# Heavy dependencies (boto3, pynamodb, requests, smart_open) are imported within each
+# command so that '--help' and short-lived commands only load what they use.
 
 logger = logging.getLogger(__name__)
 CONFIG = Config()
 
 
 @click.group()
+@click.option(
+    "--profile",
+    "profile_path",
+    default=None,
+    help="Profile the command with cProfile and write the profile to this local path "
+    "or S3 URI. A summary of the top functions is written to the same location with "
+    "a '.txt' suffix. Worker threads are profiled and merged into the profile, so "
+    "cumulative times of functions run by several workers can exceed the run time.",
+)
+@click.option(
+    "--profile-top",
+    default=25,
+    show_default=True,
+    help="Number of functions to include in the profile summary.",
+)
+@click.option(
+    "--profile-email/--no-profile-email",
+    default=False,
+    show_default=True,
+    help="Attach the profile summary to the email report.",
+)
 @click.pass_context
 def cli(
     ctx: click.Context,
+    profile_path: str | None,
+    profile_top: int,
+    profile_email: bool,  # noqa: FBT001
 ) -> None:
 
     ctx.ensure_object(dict)
     stream = io.StringIO()
     logger.info(CONFIG.configure_sentry())
-    logger.info(CONFIG.configure_logger(stream))
+    try:
+        logger.info(CONFIG.configure_logger(stream))
+    except ValueError as e:
+        raise click.ClickException(str(e)) from e
     CONFIG.check_required_env_vars()
     ctx.obj["stream"] = stream
+    ctx.obj["profiler"] = None
+    ctx.obj["profile_email"] = profile_email
+    if profile_path:
+        from awd.profiling import RunProfiler
+
+        profiler = RunProfiler(output_path=profile_path, top=profile_top)
+        profiler.start()
+        ctx.call_on_close(profiler.stop_and_write)
+        ctx.obj["profiler"] = profiler
+        logger.info("Profiling enabled, results will be written to %s", profile_path)
+
+
+def profile_summary_attachment(ctx: click.Context) -> str:
+    """Return the profile summary to append to the email report, if requested.
+
+    Args:
+        ctx: The click context of the current command.
+    """
+    profiler = ctx.obj.get("profiler")
+    if profiler is None or not ctx.obj.get("profile_email"):
+        return ""
+    return f"\nProfile summary:\n{profiler.summary()}"
+
+
+def configure_aws() -> None:
+    """Apply the AWS_CLIENT connection settings to the AWS clients of a command.
+
+    This is called by each command rather than by the group, as click runs the group
+    callback before a command's '--help', which should not load boto3 or pynamodb.
+    """
+    from awd.helpers import configure_aws_clients
+
+    configure_aws_clients(**CONFIG.aws_client_settings())
+
+
+def get_state_store() -> StateStore:
+    """Create the state store selected by the STATE_STORE env var."""
+    from awd.state import create_state_store
+
+    try:
+        return create_state_store(CONFIG.STATE_STORE, CONFIG.DOI_TABLE)
+    except ValueError as e:
+        raise click.ClickException(str(e)) from e
+
+
+def get_object_store() -> ObjectStore:
+    """Create the object store selected by the OBJECT_STORE env var."""
+    from awd.storage import create_object_store
+
+    try:
+        return create_object_store(CONFIG.OBJECT_STORE)
+    except ValueError as e:
+        raise click.ClickException(str(e)) from e
+
+
+def validate_schedule(
+    _ctx: click.Context, _param: click.Parameter, value: str
+) -> DoiScheduler:
+    from awd.scheduler import DoiScheduler
+
+    try:
+        return DoiScheduler.from_spec(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e)) from e
 
 
 @cli.command()
+@click.option(
+    "--events/--no-events",
+    default=False,
+    show_default=True,
+    help="Process only the .csv files announced by S3 event notifications on "
+    "SQS_EVENT_QUEUE instead of listing the bucket and retrying unprocessed DOIs.",
+)
+@click.option(
+    "--coordinator",
+    is_flag=True,
+    default=False,
+    help="Ingest .csv files and send the unprocessed DOIs to SQS_WORK_QUEUE for "
+    "deposit workers, wait for the workers to drain the queue and email their "
+    "combined errors.",
+)
+@click.option(
+    "--worker",
+    is_flag=True,
+    default=False,
+    help="Process DOIs from SQS_WORK_QUEUE until it is empty, writing errors to the "
+    "bucket for the coordinator. Any number of workers can run at once.",
+)
+@click.option(
+    "--wait-time-seconds",
+    default=20,
+    show_default=True,
+    type=click.IntRange(min=0, max=20),
+    help="Seconds to long-poll for S3 event notifications or work items.",
+)
+@click.option(
+    "--poll-interval",
+    default=30,
+    show_default=True,
+    type=click.FloatRange(min=0),
+    help="Seconds between checks of the work queue while the coordinator waits for "
+    "the workers.",
+)
+@click.option(
+    "--stall-timeout",
+    default=3600,
+    show_default=True,
+    type=click.FloatRange(min=0),
+    help="Seconds the coordinator waits while the work queue makes no progress, for "
+    "example when no workers are running, before sending its report.",
+)
+@click.option(
+    "--max-work-item-receives",
+    default=5,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of times a worker receives a work item before giving up on it and "
+    "reporting an error, so a DOI that always fails cannot keep the queue from "
+    "draining.",
+)
+@click.option(
+    "--workers",
+    default=1,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of DOIs processed concurrently. The article content held in memory "
+    "is bounded by INFLIGHT_BYTES_BUDGET.",
+)
+@click.option(
+    "--schedule",
+    default="oldest",
+    show_default=True,
+    callback=validate_schedule,
+    help="Order in which unprocessed DOIs are processed: 'oldest' (least recently "
+    "attempted first), 'fewest-attempts' or 'new' (DOIs from this run's spreadsheets "
+    "first). Policies can be mixed with weights, e.g. 'new:1,oldest:2', to share the "
+    "run's throughput between them.",
+)
+@click.option(
+    "--time-budget",
+    default=None,
+    type=click.FloatRange(min=0),
+    help="Seconds the run may take. New DOIs are only started while they are predicted "
+    "to finish, from observed per-DOI latency, at least 60 seconds before the budget "
+    "ends, leaving time for the email report. SIGTERM also stops new DOIs from being "
+    "started.",
+)
+@click.option(
+    "--crossref-hedge-percentile",
+    default=None,
+    type=click.FloatRange(min=0, max=100, min_open=True, max_open=True),
+    help="Send a duplicate Crossref request when a request has not completed within "
+    "this percentile of recent Crossref request latencies, e.g. 95, and use whichever "
+    "answers first. Not enabled by default.",
+)
+@click.option(
+    "--crossref-max-hedge-rate",
+    default=0.05,
+    show_default=True,
+    type=click.FloatRange(min=0, max=1),
+    help="Maximum fraction of Crossref requests that are sent again.",
+)
+@click.option(
+    "--parallel-article-io/--no-parallel-article-io",
+    default=False,
+    show_default=True,
+    help="Download each DOI's PDF from Wiley while its metadata is retrieved from "
+    "Crossref, and upload its metadata and PDF at the same time. The download is "
+    "stopped if the metadata is invalid.",
+)
 @click.pass_context
 def deposit(
     ctx: click.Context,
+    events: bool,  # noqa: FBT001
+    coordinator: bool,  # noqa: FBT001
+    worker: bool,  # noqa: FBT001
+    wait_time_seconds: int,
+    poll_interval: float,
+    stall_timeout: float,
+    max_work_item_receives: int,
+    workers: int,
+    schedule: DoiScheduler,
+    time_budget: float | None,
+    crossref_hedge_percentile: float | None,
+    crossref_max_hedge_rate: float,
+    parallel_article_io: bool,  # noqa: FBT001
 ) -> None:
     """Process DOIs from .csv files and unprocessed DOIs from DynamoDB.
 
     Retrieve metadata and PDFs for the DOI and send a message to an SQS
     queue. Errors generated during the process are emailed to stakeholders.
     """
+    if events + coordinator + worker > 1:
+        message = "--events, --coordinator and --worker cannot be combined"
+        raise click.UsageError(message)
+
+    import uuid
+    from concurrent.futures import ThreadPoolExecutor
+
+    from awd.archive import DoiArchive
+    from awd.concurrency import ByteBudget, RequestHedger
+    from awd.depositor import WORKER_REPORT_PREFIX, Depositor
+    from awd.helpers import (
+        SESClient,
+        SQSClient,
+        drain_log_stream,
+        filter_log_stream,
+    )
+    from awd.metrics import RUN_METRICS
+    from awd.scheduler import BackoffSchedule, RunDeadline
+
+    configure_aws()
+    deadline = RunDeadline(time_budget)
     date = datetime.datetime.now(tz=datetime.UTC).strftime(DATE_FORMAT)
     stream = ctx.obj["stream"]
-    s3_client = S3Client()
+    s3_client = get_object_store()
     sqs_client = SQSClient(
         region=AWS_REGION_NAME,
         base_url=CONFIG.SQS_BASE_URL,
         queue_name=CONFIG.SQS_INPUT_QUEUE,
     )
-    try:
-        s3_client.client.list_objects_v2(Bucket=CONFIG.BUCKET)
-    except ClientError as e:
-        logger.exception(
-            "Error accessing bucket: %s, %s",
-            CONFIG.BUCKET,
-            e.response["Error"]["Message"],
-        )
+    if not s3_client.check_bucket_access(CONFIG.BUCKET):
         return  # Unable to access S3 bucket, exit application
 
-    DoiProcessAttempt.set_table_name(CONFIG.DOI_TABLE)
-    if not DoiProcessAttempt.exists():
-        logger.exception("Unable to read DynamoDB table")
+    state_store = get_state_store()
+    if not state_store.exists():
+        logger.exception("Unable to read %s", state_store.name)
         return  # exit application
 
-    unprocessed_dois = set()
-    unprocessed_dois.update(DoiProcessAttempt.retrieve_unprocessed_dois())
-
-    for doi_file in s3_client.retrieve_file_type_from_bucket(
-        CONFIG.BUCKET, ".csv", "archived"
-    ):
-        for doi in get_dois_from_spreadsheet(f"s3://{CONFIG.BUCKET}/{doi_file}"):
-            DoiProcessAttempt.check_doi_and_add_to_table(doi)
-            unprocessed_dois.add(doi)
-
-        s3_client.archive_file_with_new_key(
-            bucket=CONFIG.BUCKET, key=doi_file, archived_key_prefix="archived"
+    crossref_hedger = (
+        RequestHedger(
+            percentile=crossref_hedge_percentile,
+            max_hedge_rate=crossref_max_hedge_rate,
+            max_workers=workers * 2,
         )
+        if crossref_hedge_percentile is not None
+        else None
+    )
+    # each DOI being processed runs one fetch or upload on the executor at a time
+    io_executor = (
+        ThreadPoolExecutor(max_workers=workers, thread_name_prefix="article-io")
+        if parallel_article_io
+        else None
+    )
+    depositor = Depositor(
+        s3_client=s3_client,
+        sqs_client=sqs_client,
+        bucket=CONFIG.BUCKET,
+        metadata_url=CONFIG.METADATA_URL,
+        content_url=CONFIG.CONTENT_URL,
+        sqs_base_url=CONFIG.SQS_BASE_URL,
+        sqs_input_queue=CONFIG.SQS_INPUT_QUEUE,
+        sqs_output_queue=CONFIG.SQS_OUTPUT_QUEUE,
+        collection_handle=CONFIG.COLLECTION_HANDLE,
+        workers=workers,
+        byte_budget=ByteBudget(CONFIG.inflight_bytes_budget()),
+        scheduler=schedule,
+        lease_seconds=CONFIG.doi_lease_seconds(),
+        archive=DoiArchive(s3_client, CONFIG.BUCKET),
+        state_store=state_store,
+        content_backoff=BackoffSchedule(**CONFIG.content_retry_settings()),
+        crossref_hedger=crossref_hedger,
+        io_executor=io_executor,
+    )
 
-    for doi in unprocessed_dois:
-        article = Article(
-            doi=doi,
-            metadata_url=CONFIG.METADATA_URL,
-            content_url=CONFIG.CONTENT_URL,
-            s3_client=s3_client,
-            bucket=CONFIG.BUCKET,
-            sqs_client=sqs_client,
-            sqs_base_url=CONFIG.SQS_BASE_URL,
-            sqs_input_queue=CONFIG.SQS_INPUT_QUEUE,
-            sqs_output_queue=CONFIG.SQS_OUTPUT_QUEUE,
-            collection_handle=CONFIG.COLLECTION_HANDLE,
-        )
-        try:
-            article.process()
-        except (
-            InvalidArticleContentResponseError,
-            InvalidCrossrefMetadataError,
-            InvalidDSpaceMetadataError,
-            UnprocessedStatusFalseError,
-        ):
-            continue
-        except (
-            ClientError,
-            DoesNotExist,
-            GetError,
-        ):
-            logger.exception("AWS exception for %s, skipped processing", doi)
-            continue
-    logger.info("Submission process has completed")
+    if events and not CONFIG.SQS_EVENT_QUEUE:
+        logger.error("SQS_EVENT_QUEUE must be set to process S3 events")
+        return
+    if (coordinator or worker) and not CONFIG.SQS_WORK_QUEUE:
+        logger.error("SQS_WORK_QUEUE must be set to run a coordinator or worker")
+        return
+    work_sqs_client = SQSClient(
+        region=AWS_REGION_NAME,
+        base_url=CONFIG.SQS_BASE_URL,
+        queue_name=CONFIG.SQS_WORK_QUEUE or "",
+    )
 
-    # Send logs as email via SES
-    filtered_log = filter_log_stream(stream=stream)
+    def ingest_spreadsheets() -> list[str]:
+        new_dois = []
+        for doi_file in s3_client.retrieve_file_type_from_bucket(
+            CONFIG.BUCKET, ".csv", "archived"
+        ):
+            new_dois.extend(depositor.ingest_spreadsheet(doi_file))
+            depositor.archive_spreadsheet(doi_file)
+        return new_dois
 
-    ses_client = SESClient(AWS_REGION_NAME)
-    ses_client.create_and_send_email(
-        subject=f"Automated Wiley deposit errors {date}",
-        attachment_content=filtered_log,
-        attachment_name=f"{date}_submission_log.txt",
-        source_email_address=CONFIG.LOG_SOURCE_EMAIL,
-        recipient_email_address=CONFIG.LOG_RECIPIENT_EMAIL,
-    )
+    send_report = True
+    worker_reports = ""
+    previous_handler = signal.signal(signal.SIGTERM, deadline.expire)
+    try:
+        if events:
+            event_sqs_client = SQSClient(
+                region=AWS_REGION_NAME,
+                base_url=CONFIG.SQS_BASE_URL,
+                queue_name=CONFIG.SQS_EVENT_QUEUE,
+            )
+            spreadsheet_count = depositor.process_spreadsheet_events(
+                event_sqs_client, wait_time_seconds=wait_time_seconds, deadline=deadline
+            )
+            logger.info("%s spreadsheets processed from S3 events", spreadsheet_count)
+            send_report = spreadsheet_count > 0
+        elif worker:
+            # errors are reported to the coordinator instead of emailed
+            send_report = False
+            depositor.process_work_queue(
+                work_sqs_client,
+                worker_id=uuid.uuid4().hex,
+                collect_errors=lambda: filter_log_stream(
+                    io.StringIO(drain_log_stream(stream))
+                ),
+                wait_time_seconds=wait_time_seconds,
+                deadline=deadline,
+                max_receives=max_work_item_receives,
+            )
+        elif coordinator:
+            run_id = f"{datetime.datetime.now(tz=datetime.UTC):%Y%m%dT%H%M%S}-"
+            run_id += uuid.uuid4().hex[:8]
+            depositor.enqueue_dois(
+                work_sqs_client,
+                depositor.schedule_unprocessed_dois(ingest_spreadsheets()),
+                run_id,
+            )
+            remaining = depositor.wait_for_work_queue(
+                work_sqs_client,
+                poll_interval,
+                deadline=deadline,
+                stall_timeout=stall_timeout,
+            )
+            if remaining:
+                logger.warning(
+                    "Stopped waiting for workers with %s work items remaining, later "
+                    "errors are left in %s",
+                    remaining,
+                    s3_client.uri(CONFIG.BUCKET, f"{WORKER_REPORT_PREFIX}/{run_id}/"),
+                )
+            worker_reports = depositor.collect_worker_reports(run_id)
+        else:
+            depositor.process_dois(
+                depositor.schedule_unprocessed_dois(ingest_spreadsheets()),
+                deadline=deadline,
+            )
+        logger.info("Submission process has completed")
+    except Exception:
+        logger.exception("Submission process stopped by an unexpected error")
+        raise
+    finally:
+        signal.signal(signal.SIGTERM, previous_handler)
+        if crossref_hedger:
+            crossref_hedger.shutdown()
+        if io_executor:
+            io_executor.shutdown()
+        # the report is sent even if the run fails so errors are not lost
+        if send_report:
+            filtered_log = filter_log_stream(stream=stream)
+            ses_client = SESClient(AWS_REGION_NAME)
+            ses_client.create_and_send_email(
+                subject=f"Automated Wiley deposit errors {date}",
+                attachment_content=filtered_log
+                + worker_reports
+                + profile_summary_attachment(ctx),
+                attachment_name=f"{date}_submission_log.txt",
+                source_email_address=CONFIG.LOG_SOURCE_EMAIL,
+                recipient_email_address=CONFIG.LOG_RECIPIENT_EMAIL,
+            )
+    logger.info("Run metrics:\n%s", RUN_METRICS.report())
     logger.info("Application exiting")
 
 
 @cli.command()
+@click.option(
+    "--workers",
+    default=1,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of result messages processed concurrently.",
+)
+@click.option(
+    "--partition-by-doi/--no-partition-by-doi",
+    default=False,
+    show_default=True,
+    help="Process result messages for the same DOI sequentially on one worker.",
+)
+@click.option(
+    "--follow/--no-follow",
+    default=False,
+    show_default=True,
+    help="Keep listening for result messages until SIGTERM instead of exiting once the "
+    "queue is empty.",
+)
+@click.option(
+    "--wait-time-seconds",
+    default=20,
+    show_default=True,
+    type=click.IntRange(min=0, max=20),
+    help="Seconds to long-poll for result messages in follow mode.",
+)
+@click.option(
+    "--visibility-timeout",
+    default=120,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Visibility timeout in seconds for in-flight messages in follow mode, "
+    "extended until the messages are deleted.",
+)
+@click.option(
+    "--flush-interval",
+    default=10,
+    show_default=True,
+    type=click.FloatRange(min=0),
+    help="Seconds between batched message deletions and status updates in follow "
+    "mode.",
+)
+@click.option(
+    "--digest-interval",
+    default=3600,
+    show_default=True,
+    type=click.FloatRange(min=0),
+    help="Seconds between result emails in follow mode.",
+)
 @click.pass_context
 def listen(
     ctx: click.Context,
+    workers: int,
+    partition_by_doi: bool,  # noqa: FBT001
+    follow: bool,  # noqa: FBT001
+    wait_time_seconds: int,
+    visibility_timeout: int,
+    flush_interval: float,
+    digest_interval: float,
 ) -> None:
     """Retrieve messages from an SQS queue and email the results to stakeholders."""
+    from awd.concurrency import batched, process_in_order
+    from awd.helpers import SESClient, SQSClient, drain_log_stream
+    from awd.metrics import RUN_METRICS
+    from awd.scheduler import BackoffSchedule
+
+    configure_aws()
     date = datetime.datetime.now(tz=datetime.UTC).strftime(DATE_FORMAT)
     stream = ctx.obj["stream"]
     sqs_client = SQSClient(
@@ -147,25 +509,220 @@ def listen(
         queue_name=CONFIG.SQS_OUTPUT_QUEUE,
     )
 
-    DoiProcessAttempt.set_table_name(CONFIG.DOI_TABLE)
+    state_store = get_state_store()
+    dss_backoff = BackoffSchedule(**CONFIG.dss_retry_settings())
+    ses_client = SESClient(AWS_REGION_NAME)
+
+    if follow:
+        from awd.listener import ResultListener
 
-    for sqs_message in sqs_client.receive():
+        def send_digest() -> None:
+            digest_date = datetime.datetime.now(tz=datetime.UTC).strftime(DATE_FORMAT)
+            ses_client.create_and_send_email(
+                subject=f"DSS results {digest_date}",
+                attachment_content=drain_log_stream(stream)
+                + profile_summary_attachment(ctx),
+                attachment_name=f"DSS results {digest_date}.txt",
+                source_email_address=CONFIG.LOG_SOURCE_EMAIL,
+                recipient_email_address=CONFIG.LOG_RECIPIENT_EMAIL,
+            )
+
+        listener = ResultListener(
+            sqs_client=sqs_client,
+            retry_threshold=CONFIG.RETRY_THRESHOLD,
+            send_digest=send_digest,
+            workers=workers,
+            partition_by_doi=partition_by_doi,
+            wait_time_seconds=wait_time_seconds,
+            visibility_timeout=visibility_timeout,
+            flush_interval=flush_interval,
+            digest_interval=digest_interval,
+            state_store=state_store,
+            dss_backoff=dss_backoff,
+        )
+        previous_handler = signal.signal(signal.SIGTERM, listener.stop)
         try:
+            listener.run()
+        finally:
+            signal.signal(signal.SIGTERM, previous_handler)
+        logger.info("Run metrics:\n%s", RUN_METRICS.report())
+        logger.info("Application exiting")
+        return
+
+    def process_result_message(sqs_message: MessageTypeDef) -> None:
+        with RUN_METRICS.timer("result_message"):
             sqs_client.process_result_message(
                 sqs_message=sqs_message,
                 retry_threshold=CONFIG.RETRY_THRESHOLD,
+                state_store=state_store,
+                dss_backoff=dss_backoff,
             )
-        except:  # noqa: E722
-            logger.exception("Error while processing SQS message: %s", sqs_message)
-            continue
+
+    # messages are processed in batches so none wait past their visibility timeout
+    for sqs_messages in batched(sqs_client.receive(), workers * 10):
+        for sqs_message, error in process_in_order(
+            process_result_message,
+            sqs_messages,
+            workers=workers,
+            partition_key=SQSClient.get_package_id if partition_by_doi else None,
+        ):
+            if error:
+                logger.error(
+                    "Error while processing SQS message: %s", sqs_message, exc_info=error
+                )
     logger.debug("Messages received and deleted from output queue")
 
-    ses_client = SESClient(AWS_REGION_NAME)
     ses_client.create_and_send_email(
         subject=f"DSS results {date}",
-        attachment_content=stream.getvalue(),
+        attachment_content=drain_log_stream(stream) + profile_summary_attachment(ctx),
         attachment_name=f"DSS results {date}.txt",
         source_email_address=CONFIG.LOG_SOURCE_EMAIL,
         recipient_email_address=CONFIG.LOG_RECIPIENT_EMAIL,
     )
+    logger.info("Run metrics:\n%s", RUN_METRICS.report())
     logger.info("Application exiting")
+
+
+@cli.command()
+@click.option(
+    "--reconcile",
+    is_flag=True,
+    default=False,
+    help="Recount the DOIs in each status with a parallel scan of the DOI table and "
+    "save the corrected counts. Run while no deposit or listen is running.",
+)
+@click.option(
+    "--segments",
+    default=4,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of scan segments read concurrently when reconciling.",
+)
+def stats(reconcile: bool, segments: int) -> None:  # noqa: FBT001
+    """Print the number of DOIs in each status without scanning the DOI table."""
+    configure_aws()
+    status_counts = get_state_store().status_counts(
+        reconcile=reconcile, segments=segments
+    )
+    for status, count in status_counts.items():
+        click.echo(f"{status}: {count}")
+    click.echo(f"TOTAL: {sum(status_counts.values())}")
+
+
+@cli.command()
+@click.option(
+    "--segments",
+    default=4,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of scan segments read concurrently.",
+)
+def migrate(segments: int) -> None:
+    """Add numeric timestamps to DOI items written before they were introduced.
+
+    Items without last_modified_ts are updated from last_modified, and unprocessed
+    items are added to the next attempt index so deposit can query them. Completion
+    is recorded in the DOI table; until then deposit scans for unprocessed DOIs.
+    """
+    from awd.database import DoiProcessAttempt
+
+    configure_aws()
+    DoiProcessAttempt.set_table_name(CONFIG.DOI_TABLE)
+    migrated_count = DoiProcessAttempt.migrate_timestamps(segments=segments)
+    click.echo(f"{migrated_count} DOI items migrated")
+
+
+@cli.command()
+@click.option(
+    "--min-age-days",
+    default=30,
+    show_default=True,
+    type=click.FloatRange(min=0),
+    help="Archive SUCCESS and FAILED DOI items last modified at least this many days "
+    "ago.",
+)
+@click.option(
+    "--segments",
+    default=4,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of scan segments read concurrently.",
+)
+def archive(min_age_days: float, segments: int) -> None:
+    """Archive old SUCCESS and FAILED DOI items to S3 and expire them from the table.
+
+    Archived items are written to the bucket under 'archived/doi-items/' and deleted
+    from the DOI table by DynamoDB TTL on the 'expires_at' attribute.
+    """
+    from awd.archive import DoiArchive
+    from awd.database import DoiProcessAttempt
+
+    configure_aws()
+    DoiProcessAttempt.set_table_name(CONFIG.DOI_TABLE)
+    archived_count = DoiArchive(get_object_store(), CONFIG.BUCKET).archive_terminal_items(
+        min_age_seconds=min_age_days * 24 * 60 * 60, segments=segments
+    )
+    click.echo(f"{archived_count} DOI items archived")
+
+
+@cli.command()
+@click.option(
+    "--output",
+    "output_path",
+    required=True,
+    help="Local directory or S3 URI prefix to write the part files to, one per scan "
+    "segment.",
+)
+@click.option(
+    "--format",
+    "export_format",
+    default="jsonl",
+    show_default=True,
+    type=click.Choice(["jsonl", "parquet"]),
+    help="Gzipped JSON lines, or Parquet, which requires pyarrow.",
+)
+@click.option(
+    "--segments",
+    default=4,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of scan segments read concurrently.",
+)
+@click.option(
+    "--rate-limit",
+    default=None,
+    type=click.FloatRange(min=0, min_open=True),
+    help="Maximum read capacity units consumed per second by the export.",
+)
+@click.option(
+    "--modified-since",
+    default=None,
+    type=click.DateTime(formats=[DATE_FORMAT, "%Y-%m-%d"]),
+    help="Only export DOI items last modified at or after this UTC time, for an "
+    "incremental export.",
+)
+def export(
+    output_path: str,
+    export_format: str,
+    segments: int,
+    rate_limit: float | None,
+    modified_since: datetime.datetime | None,
+) -> None:
+    """Export the DOI table to a snapshot with a parallel scan."""
+    from awd.database import DoiProcessAttempt
+    from awd.export import DoiTableExport, MissingExportDependencyError
+
+    configure_aws()
+    DoiProcessAttempt.set_table_name(CONFIG.DOI_TABLE)
+    table_export = DoiTableExport(
+        output_path,
+        export_format=export_format,
+        total_segments=segments,
+        rate_limit=rate_limit,
+        modified_since=modified_since.strftime(DATE_FORMAT) if modified_since else None,
+    )
+    try:
+        row_count = table_export.run()
+    except MissingExportDependencyError as e:
+        raise click.ClickException(str(e)) from e
+    click.echo(f"{row_count} DOI items exported to {output_path}")
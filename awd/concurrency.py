@@ -0,0 +1,387 @@
+from __future__ import annotations
+
+import contextvars
+import itertools
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import TYPE_CHECKING, Generic, TypeVar
+
+from awd.metrics import RUN_METRICS
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Generator, Iterable, Iterator
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_local = threading.local()
+
+
+class DeferredLogFilter(logging.Filter):
+    """A filter that holds log records created by worker threads.
+
+    While a worker thread has a record buffer, its records are appended to the buffer
+    instead of being emitted so they can be replayed in a deterministic order.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        buffer = getattr(_local, "buffer", None)
+        if buffer is None:
+            return True
+        # the same record is passed to the filter of each handler
+        if not buffer or buffer[-1] is not record:
+            buffer.append(record)
+        return False
+
+
+class ByteBudget:
+    """A budget of bytes shared by threads to bound the memory held by large buffers.
+
+    Threads acquire the size of a buffer before creating it and release it when the
+    buffer is no longer needed, blocking while the budget is exhausted. A request larger
+    than the whole budget is allowed once nothing else is held so it cannot deadlock.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        """Initialize byte budget instance.
+
+        Args:
+            capacity: The maximum number of bytes held at once.
+        """
+        self.capacity: int = capacity
+        self.in_use: int = 0
+        self.peak: int = 0
+        self.condition: threading.Condition = threading.Condition()
+
+    def acquire(self, size: int, block: bool = True) -> None:  # noqa: FBT001, FBT002
+        """Acquire bytes from the budget, waiting until enough are free.
+
+        Time spent waiting is recorded in the run metrics.
+
+        Args:
+            size: The number of bytes to acquire.
+            block: Whether to wait for free bytes. Bytes that are already held, such
+            as a body read without a known size, are only accounted for.
+        """
+        with self.condition:
+            if block and self.in_use and self.in_use + size > self.capacity:
+                start = time.perf_counter()
+                logger.debug(
+                    "Waiting for %s bytes, %s of %s in use",
+                    size,
+                    self.in_use,
+                    self.capacity,
+                )
+                self.condition.wait_for(
+                    lambda: not self.in_use or self.in_use + size <= self.capacity
+                )
+                RUN_METRICS.record("byte_budget_wait", time.perf_counter() - start)
+            self.in_use += size
+            self.peak = max(self.peak, self.in_use)
+
+    def release(self, size: int) -> None:
+        """Return bytes to the budget, waking any waiting threads.
+
+        Args:
+            size: The number of bytes to release.
+        """
+        with self.condition:
+            self.in_use -= size
+            self.condition.notify_all()
+
+
+class RequestHedger:
+    """Hedge idempotent requests to shorten their tail latency.
+
+    A request that has not completed within a percentile of the recently observed
+    request latencies is sent again, and whichever answer arrives first is used. Hedges
+    are capped at a fraction of all requests so a slow service is not sent much more
+    load, and no request is hedged until enough latencies have been observed.
+    """
+
+    def __init__(
+        self,
+        percentile: float = 95,
+        max_hedge_rate: float = 0.05,
+        window: int = 200,
+        min_observations: int = 20,
+        max_workers: int = 8,
+    ) -> None:
+        """Initialize request hedger instance.
+
+        Args:
+            percentile: The percentile of recent latencies after which a request that
+            has not completed is hedged.
+            max_hedge_rate: The maximum fraction of requests that are hedged.
+            window: The number of most recent latencies the percentile is taken from.
+            min_observations: The number of latencies observed before any request is
+            hedged.
+            max_workers: The number of threads sending requests and their hedges.
+        """
+        self.percentile: float = percentile
+        self.max_hedge_rate: float = max_hedge_rate
+        self.min_observations: int = min_observations
+        self.latencies: deque[float] = deque(maxlen=window)
+        self.requests: int = 0
+        self.hedges: int = 0
+        self.lock: threading.Lock = threading.Lock()
+        self.executor: ThreadPoolExecutor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="hedge"
+        )
+
+    def hedge_delay(self) -> float | None:
+        """The seconds after which a request is hedged, or None before enough data."""
+        with self.lock:
+            latencies = sorted(self.latencies)
+        if len(latencies) < self.min_observations:
+            return None
+        index = int(self.percentile / 100 * len(latencies))
+        return latencies[min(index, len(latencies) - 1)]
+
+    def reserve_hedge(self) -> bool:
+        """Count a hedge if it stays within the maximum hedge rate."""
+        with self.lock:
+            if self.hedges + 1 > self.max_hedge_rate * self.requests:
+                return False
+            self.hedges += 1
+            return True
+
+    def submit(
+        self,
+        func: Callable[[], T],
+        requests: dict[Future[T], list[logging.LogRecord]],
+    ) -> Future[T]:
+        """Send a request on a hedging thread, observing its latency if it succeeds.
+
+        The request runs in a copy of the caller's context, so its log records carry
+        the caller's log context fields. When the caller is a worker of
+        process_in_order, the request's log records are held for the caller to replay
+        or discard.
+
+        Args:
+            func: The function sending the request.
+            requests: The requests sent for the caller, to which this request is added
+            with its held log records.
+        """
+        buffer = getattr(_local, "buffer", None)
+        records: list[logging.LogRecord] = []
+        context = contextvars.copy_context()
+
+        def send() -> T:
+            _local.buffer = records if buffer is not None else None
+            start = time.perf_counter()
+            try:
+                result = context.run(func)
+            finally:
+                _local.buffer = None
+            with self.lock:
+                self.latencies.append(time.perf_counter() - start)
+            return result
+
+        future = self.executor.submit(send)
+        requests[future] = records
+        return future
+
+    @staticmethod
+    def answer(
+        future: Future[T], requests: dict[Future[T], list[logging.LogRecord]]
+    ) -> T:
+        """Replay the log records of the request whose answer is used and return it.
+
+        The records of any other request are discarded, including those it logs after
+        it is beaten, as the caller's records may already have been replayed.
+
+        Args:
+            future: The request whose answer is used.
+            requests: The requests sent for the caller with their held log records.
+        """
+        replay_records(requests.pop(future))
+        for records in requests.values():
+            records.clear()
+        return future.result()
+
+    def call(self, func: Callable[[], T]) -> T:
+        """Send a request, hedging it if it is slow, and return the first answer.
+
+        An exception is only raised if every request sent raises one.
+
+        Args:
+            func: The idempotent function sending the request.
+        """
+        with self.lock:
+            self.requests += 1
+        delay = self.hedge_delay()
+        requests: dict[Future[T], list[logging.LogRecord]] = {}
+        primary = self.submit(func, requests)
+        if delay is None or wait([primary], timeout=delay).done:
+            return self.answer(primary, requests)
+        if not self.reserve_hedge():
+            return self.answer(primary, requests)
+        logger.debug("Hedging request not completed after %.3f seconds", delay)
+        RUN_METRICS.increment("hedged_requests")
+        pending = {primary, self.submit(func, requests)}
+        failed = primary
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is not primary:
+                        RUN_METRICS.increment("hedge_wins")
+                    return self.answer(future, requests)
+                failed = future
+        return self.answer(failed, requests)
+
+    def shutdown(self) -> None:
+        """Stop the hedging threads without waiting for requests that were beaten."""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class BackgroundCall(Generic[T]):
+    """A function called on an executor thread while the caller does other work.
+
+    The function runs in a copy of the caller's context, so its log records carry the
+    caller's log context fields. When the caller is a worker of process_in_order, its
+    log records are held and replayed when the result is taken, in the order they
+    would have been logged had the function been called on the caller's thread. They
+    are dropped if the call is abandoned.
+    """
+
+    def __init__(self, executor: ThreadPoolExecutor, func: Callable[[], T]) -> None:
+        """Initialize background call instance, submitting the function.
+
+        Args:
+            executor: The executor whose thread calls the function.
+            func: The function to call.
+        """
+        self.records: list[logging.LogRecord] = []
+        buffer = getattr(_local, "buffer", None)
+        context = contextvars.copy_context()
+
+        def call() -> T:
+            # records are only held when the caller's records are held
+            _local.buffer = self.records if buffer is not None else None
+            try:
+                return context.run(func)
+            finally:
+                _local.buffer = None
+
+        self.future: Future[T] = executor.submit(call)
+
+    def result(self) -> T:
+        """Wait for the function, replay its log records and return its result."""
+        try:
+            return self.future.result()
+        finally:
+            replay_records(self.records)
+
+    def abandon(self) -> None:
+        """Cancel the call if it has not started, or wait for it, ignoring its outcome.
+
+        The caller should first signal a running function to stop early.
+        """
+        self.future.cancel()
+        wait([self.future])
+        self.records.clear()
+
+
+def replay_records(records: list[logging.LogRecord]) -> None:
+    """Emit buffered log records through their loggers, clearing the buffer.
+
+    Args:
+        records: The log records to be emitted, in order.
+    """
+    for record in records:
+        logging.getLogger(record.name).handle(record)
+    records.clear()
+
+
+def batched(items: Iterable[T], size: int) -> Iterator[list[T]]:
+    """Split items into lists of at most the specified size.
+
+    Args:
+        items: The items to be split, which are consumed lazily.
+        size: The maximum number of items in each list.
+    """
+    iterator = iter(items)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+def process_in_order(
+    func: Callable[[T], object],
+    items: Iterable[T],
+    workers: int,
+    partition_key: Callable[[T], str] | None = None,
+) -> Generator[tuple[T, Exception | None], None, None]:
+    """Process items with a pool of worker threads, reporting results in input order.
+
+    Each item is processed independently so an exception only affects that item. Log
+    records created while processing an item are replayed, and the item is yielded
+    with its exception (or None), in the order the items were provided. An exception
+    that is not an Exception, such as KeyboardInterrupt, is raised instead.
+
+    When the consumer stops early, for example by raising while handling an item,
+    items that have not started are cancelled and the log records of items that did
+    complete are replayed before the generator is closed.
+
+    Args:
+        func: The function used to process each item.
+        items: The items to be processed.
+        workers: The number of worker threads.
+        partition_key: An optional function returning a key for an item. Items with
+        the same key are processed sequentially by the same worker.
+    """
+    items = list(items)
+    outcomes: list[Future[tuple[list[logging.LogRecord], BaseException | None]]] = [
+        Future() for _ in items
+    ]
+    partitions: dict[str, list[int]] = defaultdict(list)
+    for index, item in enumerate(items):
+        key = partition_key(item) if partition_key else str(index)
+        partitions[key].append(index)
+    stop = threading.Event()
+
+    def process_partition(indices: list[int]) -> None:
+        for index in indices:
+            if stop.is_set():
+                return
+            records: list[logging.LogRecord] = []
+            error: BaseException | None = None
+            _local.buffer = records
+            try:
+                func(items[index])
+            except BaseException as exception:  # noqa: BLE001
+                error = exception
+            finally:
+                _local.buffer = None
+            outcomes[index].set_result((records, error))
+            if error is not None and not isinstance(error, Exception):
+                return
+
+    log_filter = DeferredLogFilter()
+    handlers = list(logging.getLogger().handlers)
+    for handler in handlers:
+        handler.addFilter(log_filter)
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        for indices in partitions.values():
+            executor.submit(process_partition, indices)
+        for item, outcome in zip(items, outcomes, strict=True):
+            records, error = outcome.result()
+            replay_records(records)
+            if error is not None and not isinstance(error, Exception):
+                raise error
+            yield item, error
+    finally:
+        stop.set()
+        executor.shutdown(cancel_futures=True)
+        # items that completed after the consumer stopped early are still logged
+        for outcome in outcomes:
+            if outcome.done():
+                replay_records(outcome.result()[0])
+        for handler in handlers:
+            handler.removeFilter(log_filter)
@@ -4,13 +4,23 @@ import os
 from collections.abc import Iterable
 from typing import Any
 
-import sentry_sdk
-
 logger = logging.getLogger(__name__)
 
 AWS_REGION_NAME = "us-east-1"
 DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
 
+AWS_MAX_POOL_CONNECTIONS = 50
+AWS_CONNECT_TIMEOUT = 10
+AWS_READ_TIMEOUT = 60
+AWS_MAX_ATTEMPTS = 5
+INFLIGHT_BYTES_BUDGET = 512 * 1024 * 1024
+DOI_LEASE_SECONDS = 900
+CONTENT_RETRY_BASE_SECONDS = 3600
+CONTENT_RETRY_MAX_SECONDS = 7 * 24 * 60 * 60
+CONTENT_RETRY_THRESHOLD = 10
+DSS_RETRY_BASE_SECONDS = 900
+DSS_RETRY_MAX_SECONDS = 24 * 60 * 60
+
 
 class Config:
     REQUIRED_ENV_VARS: Iterable[str] = [
@@ -29,7 +39,25 @@ class Config:
         "RETRY_THRESHOLD",
     ]
 
-    OPTIONAL_ENV_VARS: Iterable[str] = ["LOG_LEVEL"]
+    OPTIONAL_ENV_VARS: Iterable[str] = [
+        "LOG_LEVEL",
+        "SQS_EVENT_QUEUE",
+        "SQS_WORK_QUEUE",
+        "AWS_CLIENT_MAX_POOL_CONNECTIONS",
+        "AWS_CLIENT_CONNECT_TIMEOUT",
+        "AWS_CLIENT_READ_TIMEOUT",
+        "AWS_CLIENT_MAX_ATTEMPTS",
+        "INFLIGHT_BYTES_BUDGET",
+        "DOI_LEASE_SECONDS",
+        "STATE_STORE",
+        "OBJECT_STORE",
+        "CONTENT_RETRY_BASE_SECONDS",
+        "CONTENT_RETRY_MAX_SECONDS",
+        "CONTENT_RETRY_THRESHOLD",
+        "DSS_RETRY_BASE_SECONDS",
+        "DSS_RETRY_MAX_SECONDS",
+        "LOG_FORMAT",
+    ]
 
     def __getattr__(self, name: str) -> Any:  # noqa: ANN401
         """Provide dot notation access to configurations and env vars on this class."""
@@ -45,19 +73,60 @@ class Config:
             message = f"Missing required environment variables: {', '.join(missing_vars)}"
             raise OSError(message)
 
+    def aws_client_settings(self) -> dict[str, int]:
+        """Connection settings for AWS clients, using defaults for unset env vars."""
+        return {
+            "max_pool_connections": int(
+                self.AWS_CLIENT_MAX_POOL_CONNECTIONS or AWS_MAX_POOL_CONNECTIONS
+            ),
+            "connect_timeout": int(
+                self.AWS_CLIENT_CONNECT_TIMEOUT or AWS_CONNECT_TIMEOUT
+            ),
+            "read_timeout": int(self.AWS_CLIENT_READ_TIMEOUT or AWS_READ_TIMEOUT),
+            "max_attempts": int(self.AWS_CLIENT_MAX_ATTEMPTS or AWS_MAX_ATTEMPTS),
+        }
+
+    def inflight_bytes_budget(self) -> int:
+        """Bytes of article content held at once, using the default if unset."""
+        return int(self.INFLIGHT_BYTES_BUDGET or INFLIGHT_BYTES_BUDGET)
+
+    def doi_lease_seconds(self) -> int:
+        """Seconds a DOI is leased to a deposit process, using the default if unset."""
+        return int(self.DOI_LEASE_SECONDS or DOI_LEASE_SECONDS)
+
+    def content_retry_settings(self) -> dict[str, int]:
+        """Backoff settings for DOIs whose PDF is unavailable, using unset defaults."""
+        return {
+            "base_seconds": int(
+                self.CONTENT_RETRY_BASE_SECONDS or CONTENT_RETRY_BASE_SECONDS
+            ),
+            "max_seconds": int(
+                self.CONTENT_RETRY_MAX_SECONDS or CONTENT_RETRY_MAX_SECONDS
+            ),
+            "threshold": int(self.CONTENT_RETRY_THRESHOLD or CONTENT_RETRY_THRESHOLD),
+        }
+
+    def dss_retry_settings(self) -> dict[str, int]:
+        """Backoff settings for DOIs with a retryable DSS error, using unset defaults."""
+        return {
+            "base_seconds": int(self.DSS_RETRY_BASE_SECONDS or DSS_RETRY_BASE_SECONDS),
+            "max_seconds": int(self.DSS_RETRY_MAX_SECONDS or DSS_RETRY_MAX_SECONDS),
+            "threshold": int(self.RETRY_THRESHOLD),
+        }
+
     def configure_logger(self, stream: io.StringIO) -> str:
+        from awd.logs import configure_logging
+
         log_level = getattr(logging, self.LOG_LEVEL) if self.LOG_LEVEL else logging.INFO
-        logging.basicConfig(
-            format="%(levelname)-8s %(asctime)s %(message)s",
-            level=log_level,
-            handlers=[logging.StreamHandler(), logging.StreamHandler(stream)],
-        )
+        configure_logging(stream, log_level, log_format=self.LOG_FORMAT or "text")
         return f"Logger 'root' configured with level={logging.getLevelName(log_level)}"
 
     def configure_sentry(self) -> str:
         env = self.WORKSPACE
         sentry_dsn = self.SENTRY_DSN
         if sentry_dsn and sentry_dsn.lower() != "none":
+            import sentry_sdk
+
             sentry_sdk.init(sentry_dsn, environment=env)
             return f"Sentry DSN found, exceptions will be sent to Sentry with env={env}"
         return "No Sentry DSN found, exceptions will not be sent to Sentry"
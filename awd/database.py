@@ -2,68 +2,173 @@ from __future__ import annotations
 
 import datetime
 import logging
-from typing import Any
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any
 
-from pynamodb.attributes import NumberAttribute, UnicodeAttribute
-from pynamodb.exceptions import DoesNotExist
+from pynamodb.attributes import NumberAttribute, TTLAttribute, UnicodeAttribute
+from pynamodb.exceptions import DoesNotExist, PutError, PynamoDBException, UpdateError
+from pynamodb.indexes import AllProjection, GlobalSecondaryIndex
 from pynamodb.models import Model
 
 from awd.config import DATE_FORMAT
 from awd.status import Status
 
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+
+    from pynamodb.expressions.update import Action
+
+    from awd.archive import DoiArchive
+
 logger = logging.getLogger(__name__)
 
+# hash key of the item in the DOI table holding the number of DOIs in each status
+STATUS_COUNTS_KEY = "#status-counts"
+
+# hash key of the item in the DOI table recording that migrate_timestamps completed
+TIMESTAMPS_MIGRATED_KEY = "#timestamps-migrated"
+
+
+class StatusNextAttemptIndex(GlobalSecondaryIndex):  # type: ignore[no-untyped-call]
+    """An index of the DOIs waiting for an attempt by status and next attempt time.
+
+    Only items with a next attempt time are indexed, which are the unprocessed DOIs.
+    """
+
+    class Meta:  # noqa: D106
+        index_name = "status-next-attempt-index"
+        projection = AllProjection()
+
+    status_code = NumberAttribute(hash_key=True)
+    next_attempt_at = NumberAttribute(range_key=True)
+
 
 class DoiProcessAttempt(Model):
     """A class modeling an item in the DynamoDB table."""
 
     class Meta:  # noqa: D106
         table_name = "None"
+        max_pool_connections = 10
+        connect_timeout_seconds = 15
+        read_timeout_seconds = 30
+        max_retry_attempts = 3
 
     doi = UnicodeAttribute(hash_key=True)
     process_attempts = NumberAttribute()
     last_modified = UnicodeAttribute()
     status_code = NumberAttribute()
+    # epoch seconds of last_modified and of the earliest time to attempt the DOI
+    last_modified_ts = NumberAttribute(null=True)
+    next_attempt_at = NumberAttribute(null=True)
+    status_next_attempt_index = StatusNextAttemptIndex()
+    # set once the item is archived, after which DynamoDB deletes it
+    expires_at = TTLAttribute(null=True)
+    # the process holding the DOI while it is processed, until the epoch seconds expiry
+    lease_owner = UnicodeAttribute(null=True)
+    lease_expires_at = NumberAttribute(null=True)
+    # attempts ending without a PDF from Wiley, which have their own retry budget
+    content_attempts = NumberAttribute(null=True)
+
+    def acquire_lease(self, owner: str, lease_seconds: float) -> bool:
+        """Acquire the lease for processing an unprocessed DOI item.
+
+        The lease is acquired with a conditional write, so only one process can hold
+        it, and an expired lease left by a stopped process is reclaimed. Returns False
+        if the lease is held by another process or the DOI is no longer unprocessed.
+
+        Args:
+            owner: A unique identifier of the process acquiring the lease.
+            lease_seconds: The number of seconds until the lease expires.
+        """
+        cls = type(self)
+        now = time.time()
+        previous_owner = self.lease_owner
+        try:
+            self.update(
+                actions=[
+                    cls.lease_owner.set(owner),
+                    cls.lease_expires_at.set(now + lease_seconds),
+                ],
+                condition=(cls.status_code == Status.UNPROCESSED.value)
+                & (cls.lease_owner.does_not_exist() | (cls.lease_expires_at < now)),
+            )
+        except UpdateError as e:
+            if e.cause_response_code == "ConditionalCheckFailedException":
+                logger.debug("Lease on %s not acquired by %s", self.doi, owner)
+                return False
+            raise
+        if previous_owner is not None:
+            logger.info(
+                "Expired lease on %s reclaimed from %s by %s",
+                self.doi,
+                previous_owner,
+                owner,
+            )
+        logger.debug("Lease on %s acquired by %s", self.doi, owner)
+        return True
 
     @classmethod
     def add_item(cls, doi: str) -> dict[str, Any]:
-        """Add DOI item to DOI table.
+        """Add DOI item to DOI table and count it as unprocessed.
+
+        A DOI already in the table, for example one added by a concurrent deposit
+        process, is left unchanged.
 
         Args:
             doi: The DOI to be added to the DOI table.
         """
-        response = cls(
-            doi=doi,
-            process_attempts=0,
-            last_modified=datetime.datetime.now(tz=datetime.UTC).strftime(DATE_FORMAT),
-            status_code=Status.UNPROCESSED.value,
-        ).save()
+        doi_process_attempt = cls(doi=doi, process_attempts=0)
+        doi_process_attempt.set_status(status_code=Status.UNPROCESSED.value)
+        try:
+            response = doi_process_attempt.save(condition=cls.doi.does_not_exist())
+        except PutError as e:
+            if e.cause_response_code != "ConditionalCheckFailedException":
+                raise
+            logger.debug("%s already in table", doi)
+            return {}
+        StatusCounts.apply([(Status.UNPROCESSED.value, 1)])
         logger.debug("%s added to table", doi)
         return response
 
     @classmethod
-    def check_doi_and_add_to_table(cls, doi: str) -> None:
+    def check_doi_and_add_to_table(
+        cls, doi: str, archive: DoiArchive | None = None
+    ) -> bool:
         """Check if DOI should be added to table.
 
-        If not present, add the DOI to the table.
+        If not present in the table or the archive, add the DOI to the table. Returns
+        whether the DOI was added.
 
         Args:
             doi: The DOI to be checked and possibly added to the DOI table.
+            archive: An optional archive of DOI items expired from the table.
         """
         try:
             cls.get(doi)
         except DoesNotExist:
+            if archive is not None and archive.contains(doi):
+                logger.debug("%s already archived, not added to table", doi)
+                return False
             cls.add_item(doi)
+            return True
+        return False
 
     def has_unprocessed_status(self) -> bool:
         """Validate that a DOI has unprocessed status in the DOI table."""
         return self.get(self.doi).status_code == Status.UNPROCESSED.value
 
-    def increment_process_attempts(self) -> None:
-        """Increment process attempts for DOI item in DOI table."""
+    def increment_process_attempts(self, lease_owner: str | None = None) -> None:
+        """Increment process attempts for DOI item in DOI table.
+
+        Args:
+            lease_owner: The identifier of the process holding the DOI's lease, if
+            any, which must still hold it for the item to be saved.
+        """
         self.process_attempts += 1
-        self.last_modified = datetime.datetime.now(tz=datetime.UTC).strftime(DATE_FORMAT)
-        self.save()
+        self.set_last_modified()
+        self.save_leased(lease_owner)
         logger.debug(
             "%s process attempts updated to: %s", self.doi, self.process_attempts
         )
@@ -80,15 +185,154 @@ class DoiProcessAttempt(Model):
             process_attempts_exceeded = True
         return process_attempts_exceeded
 
+    def release_lease(self, owner: str) -> None:
+        """Release the lease on a DOI item if it is still held by the owner.
+
+        Args:
+            owner: The identifier of the process that acquired the lease.
+        """
+        cls = type(self)
+        try:
+            self.update(
+                actions=[cls.lease_owner.remove(), cls.lease_expires_at.remove()],
+                condition=cls.lease_owner == owner,
+            )
+        except UpdateError as e:
+            if e.cause_response_code != "ConditionalCheckFailedException":
+                raise
+            logger.warning("Lease on %s was no longer held by %s", self.doi, owner)
+            return
+        logger.debug("Lease on %s released by %s", self.doi, owner)
+
     @classmethod
     def retrieve_unprocessed_dois(cls) -> list[str]:
-        """Retrieve all unprocessed DOI items from database table."""
+        """Retrieve all unprocessed DOI items from database table.
+
+        Until migrate_timestamps has completed, unprocessed items written before
+        next_attempt_at was introduced are missing from the index, so the table is
+        scanned instead.
+        """
+        if not TimestampsMigration.completed():
+            return [item.doi for item in cls.scan_unprocessed()]
         return [
             item.doi
-            for item in cls.scan()
-            if item.status_code == Status.UNPROCESSED.value
+            for item in cls.status_next_attempt_index.query(Status.UNPROCESSED.value)
         ]
 
+    @classmethod
+    def retrieve_due_doi_process_attempts(
+        cls, now: float | None = None
+    ) -> Iterator[DoiProcessAttempt]:
+        """Query the unprocessed DOI items whose next attempt is due.
+
+        Only the index entries of the due DOIs are read, in next attempt order. Until
+        migrate_timestamps has completed, the unprocessed items are scanned instead
+        and items without next_attempt_at are due from their last modification.
+
+        Args:
+            now: The epoch seconds at which attempts are due, defaulting to now.
+        """
+        now = time.time() if now is None else now
+        if not TimestampsMigration.completed():
+            due_items = [
+                (next_attempt_at, item)
+                for item in cls.scan_unprocessed()
+                if (
+                    next_attempt_at := item.next_attempt_at
+                    or parse_last_modified(item.last_modified)
+                )
+                <= now
+            ]
+            due_items.sort(key=lambda due_item: due_item[0])
+            return iter([item for _, item in due_items])
+        return cls.status_next_attempt_index.query(
+            Status.UNPROCESSED.value, cls.next_attempt_at <= now
+        )
+
+    @classmethod
+    def scan_unprocessed(cls) -> Iterator[DoiProcessAttempt]:
+        """Scan the table for unprocessed DOI items, including unmigrated items."""
+        logger.warning(
+            "Timestamps have not been migrated in %s, scanning for unprocessed DOIs; "
+            "run 'awd migrate' so they can be queried from the next attempt index",
+            cls.Meta.table_name,
+        )
+        return cls.scan(
+            filter_condition=(cls.status_code == Status.UNPROCESSED.value)
+            & cls.expires_at.does_not_exist()
+        )
+
+    @classmethod
+    def migrate_timestamps(cls, segments: int = 4) -> int:
+        """Add the numeric timestamps to items written before they were introduced.
+
+        last_modified_ts is parsed from last_modified, and unprocessed items are due
+        from their last modification. Items are updated conditionally, so items
+        written during the migration are left unchanged. Completion is recorded in the
+        table, after which unprocessed items are queried from the next attempt index.
+        Returns the number of items migrated.
+
+        Args:
+            segments: The number of scan segments read concurrently.
+        """
+
+        def migrate_segment(segment: int) -> int:
+            migrated_count = 0
+            for item in cls.scan(
+                segment=segment,
+                total_segments=segments,
+                filter_condition=cls.status_code.exists()
+                & cls.last_modified_ts.does_not_exist(),
+            ):
+                last_modified_ts = parse_last_modified(item.last_modified)
+                actions: list[Action] = [cls.last_modified_ts.set(last_modified_ts)]
+                if item.status_code == Status.UNPROCESSED.value:
+                    actions.append(cls.next_attempt_at.set(last_modified_ts))
+                try:
+                    item.update(
+                        actions=actions, condition=cls.last_modified_ts.does_not_exist()
+                    )
+                except UpdateError as e:
+                    if e.cause_response_code != "ConditionalCheckFailedException":
+                        raise
+                    continue
+                migrated_count += 1
+            return migrated_count
+
+        with ThreadPoolExecutor(max_workers=segments) as executor:
+            migrated_count = sum(executor.map(migrate_segment, range(segments)))
+        TimestampsMigration(completed_at=time.time()).save()
+        logger.info("Timestamps added to %s DOI items", migrated_count)
+        return migrated_count
+
+    @classmethod
+    def configure_connection(
+        cls,
+        max_pool_connections: int,
+        connect_timeout: int,
+        read_timeout: int,
+        max_attempts: int,
+    ) -> None:
+        """Set connection settings for the DynamoDB table.
+
+        pynamodb manages its own botocore session, so the settings used by the other
+        AWS clients are applied through the Meta class. The cached connection is
+        discarded so the settings take effect on the next request.
+
+        Args:
+            max_pool_connections: The maximum number of pooled HTTP connections.
+            connect_timeout: The number of seconds to wait for a connection.
+            read_timeout: The number of seconds to wait for a response.
+            max_attempts: The total number of attempts made for a request.
+        """
+        cls.Meta.max_pool_connections = max_pool_connections
+        cls.Meta.connect_timeout_seconds = connect_timeout
+        cls.Meta.read_timeout_seconds = read_timeout
+        cls.Meta.max_retry_attempts = max_attempts - 1
+        cls._connection = None
+        StatusCounts._connection = None  # noqa: SLF001
+        TimestampsMigration._connection = None  # noqa: SLF001
+
     @classmethod
     def set_table_name(cls, table_name: str) -> None:
         """Set table_name attribute.
@@ -100,31 +344,269 @@ class DoiProcessAttempt(Model):
             table_name: The name of the DynamoDB table.
         """
         cls.Meta.table_name = table_name
+        cls._connection = None
+        StatusCounts._connection = None  # noqa: SLF001
+        TimestampsMigration._connection = None  # noqa: SLF001
 
-    def sqs_error_update_status(self, retry_threshold: int) -> None:
-        """Update status for error result message.
+    def save_leased(self, lease_owner: str | None) -> None:
+        """Save the DOI item, on condition that its lease is still held by the owner.
+
+        A process that stalls past its lease's expiry could otherwise overwrite the
+        item of a process that has since reclaimed the lease. Raises DoiLeaseLostError
+        if the lease is held by another process or has been released.
+
+        Args:
+            lease_owner: The identifier of the process holding the DOI's lease, or None
+            to save the item unconditionally.
+        """
+        if lease_owner is None:
+            self.save()
+            return
+        try:
+            self.save(condition=type(self).lease_owner == lease_owner)
+        except PutError as e:
+            if e.cause_response_code != "ConditionalCheckFailedException":
+                raise
+            logger.warning(
+                "Lease on %s was lost by %s, the item was not saved",
+                self.doi,
+                lease_owner,
+            )
+            raise DoiLeaseLostError from e
+
+    @classmethod
+    def save_batch(cls, doi_process_attempts: Iterable[DoiProcessAttempt]) -> None:
+        """Save multiple DOI items to the DOI table with batched writes.
+
+        Args:
+            doi_process_attempts: The DOI items to be saved.
+        """
+        with cls.batch_write() as batch:
+            for doi_process_attempt in doi_process_attempts:
+                batch.save(doi_process_attempt)
+
+    def set_status(self, status_code: int, next_attempt_at: float | None = None) -> None:
+        """Set status for DOI item without saving it to the DOI table.
+
+        Args:
+            status_code: The status code to be set for the item.
+            next_attempt_at: The epoch seconds of the earliest next attempt of an
+            unprocessed DOI, defaulting to now.
+        """
+        self.status_code = status_code
+        self.set_last_modified()
+        # only unprocessed DOIs are indexed for their next attempt
+        self.next_attempt_at = (
+            next_attempt_at or self.last_modified_ts
+            if status_code == Status.UNPROCESSED.value
+            else None
+        )
+
+    def set_last_modified(self) -> None:
+        """Set the last modified date and timestamp to now without saving the item."""
+        now = datetime.datetime.now(tz=datetime.UTC)
+        self.last_modified = now.strftime(DATE_FORMAT)
+        self.last_modified_ts = now.timestamp()
+
+    def sqs_error_status_code(
+        self, retry_threshold: int, *, retryable: bool = True
+    ) -> int:
+        """Get the status code for an error result message.
 
         Args:
             retry_threshold: The number of process attempts that should be
             made before setting the item to a failed status.
+            retryable: Whether the DSS error could succeed if the DOI is attempted
+            again, as a DOI with a non-retryable error is set to a failed status.
         """
+        if not retryable:
+            logger.error(
+                "DOI: '%s' has a DSS error that is not retryable and will not be "
+                "attempted again.",
+                self.doi,
+            )
+            return Status.FAILED.value
         if self.process_attempts_exceeded(retry_threshold=retry_threshold):
-            self.update_status(status_code=Status.FAILED.value)
             logger.exception(
                 "DOI: '%s' has exceeded the retry threshold and will not be "
                 "attempted again.",
                 self.doi,
             )
-        else:
-            self.update_status(status_code=Status.UNPROCESSED.value)
+            return Status.FAILED.value
+        return Status.UNPROCESSED.value
 
-    def update_status(self, status_code: int) -> None:
-        """Update status for DOI item in DOI table.
+    def sqs_error_update_status(
+        self,
+        retry_threshold: int,
+        *,
+        retryable: bool = True,
+        next_attempt_at: float | None = None,
+    ) -> None:
+        """Update status for error result message.
+
+        Args:
+            retry_threshold: The number of process attempts that should be
+            made before setting the item to a failed status.
+            retryable: Whether the DSS error could succeed if the DOI is attempted
+            again.
+            next_attempt_at: The epoch seconds of the earliest next attempt if the
+            DOI is set to an unprocessed status, defaulting to now.
+        """
+        self.update_status(
+            status_code=self.sqs_error_status_code(
+                retry_threshold=retry_threshold, retryable=retryable
+            ),
+            next_attempt_at=next_attempt_at,
+        )
+
+    def update_status(
+        self,
+        status_code: int,
+        next_attempt_at: float | None = None,
+        lease_owner: str | None = None,
+    ) -> None:
+        """Update status for DOI item in DOI table and in the status counts.
 
         Args:
             status_code: The status code to be set for the item.
+            next_attempt_at: The epoch seconds of the earliest next attempt of an
+            unprocessed DOI, defaulting to now.
+            lease_owner: The identifier of the process holding the DOI's lease, if
+            any, which must still hold it for the item to be saved.
         """
-        self.status_code = status_code
-        self.last_modified = datetime.datetime.now(tz=datetime.UTC).strftime(DATE_FORMAT)
-        self.save()
+        previous_status_code = self.status_code
+        self.set_status(status_code=status_code, next_attempt_at=next_attempt_at)
+        self.save_leased(lease_owner)
+        StatusCounts.apply([(previous_status_code, -1), (status_code, 1)])
         logger.debug("%s status updated to: %s", self.doi, self.status_code)
+
+
+class StatusCounts(Model):
+    """A class modeling the item in the DOI table that counts the DOIs in each status.
+
+    The counts are updated atomically whenever a DOI's status changes, so they can be
+    read without scanning the table. A status change that is not counted, for example
+    when a process stops between saving a DOI and updating the counts, is corrected by
+    reconciling the counts with a scan.
+    """
+
+    class Meta(DoiProcessAttempt.Meta):  # noqa: D106
+        pass
+
+    doi = UnicodeAttribute(hash_key=True, default=STATUS_COUNTS_KEY)
+    unprocessed = NumberAttribute(default=0)
+    message_sent = NumberAttribute(default=0)
+    success = NumberAttribute(default=0)
+    failed = NumberAttribute(default=0)
+
+    @classmethod
+    def apply(cls, status_code_changes: Iterable[tuple[float | None, int]]) -> None:
+        """Atomically add the changes in the number of DOIs per status to the counts.
+
+        A failed update is logged rather than raised, as the DOI items have already
+        been saved and the counts can be reconciled.
+
+        Args:
+            status_code_changes: Pairs of a status code and the change in its number
+            of DOIs. Changes without a status code are ignored.
+        """
+        changes: Counter[int] = Counter()
+        for status_code, change in status_code_changes:
+            if status_code is not None:
+                changes[int(status_code)] += change
+        actions = [
+            getattr(cls, Status(status_code).name.lower()).add(change)
+            for status_code, change in changes.items()
+            if change
+        ]
+        if not actions:
+            return
+        try:
+            cls(STATUS_COUNTS_KEY).update(actions=actions)
+        except PynamoDBException:
+            logger.warning(
+                "Unable to update status counts: %s", dict(changes), exc_info=True
+            )
+
+    @classmethod
+    def read(cls) -> dict[str, int]:
+        """Read the number of DOIs in each status, keyed by status name."""
+        try:
+            status_counts = cls.get(STATUS_COUNTS_KEY)
+        except DoesNotExist:
+            status_counts = cls()
+        return {
+            status.name: int(getattr(status_counts, status.name.lower()))
+            for status in Status
+        }
+
+    @classmethod
+    def reconcile(cls, segments: int = 4) -> dict[str, int]:
+        """Recount the DOIs in each status with a parallel scan and save the counts.
+
+        Archived items waiting to expire are not counted. Status changes made during
+        the scan may be counted incorrectly, so counts
+        should be reconciled while no deposit or listen is running.
+
+        Args:
+            segments: The number of scan segments read concurrently.
+        """
+
+        def count_segment(segment: int) -> Counter[int]:
+            return Counter(
+                int(item.status_code)
+                for item in DoiProcessAttempt.scan(
+                    segment=segment,
+                    total_segments=segments,
+                    filter_condition=DoiProcessAttempt.status_code.exists()
+                    & DoiProcessAttempt.expires_at.does_not_exist(),
+                )
+            )
+
+        counts: Counter[int] = Counter()
+        with ThreadPoolExecutor(max_workers=segments) as executor:
+            for segment_counts in executor.map(count_segment, range(segments)):
+                counts.update(segment_counts)
+        status_counts = cls(STATUS_COUNTS_KEY)
+        for status in Status:
+            setattr(status_counts, status.name.lower(), counts[status.value])
+        status_counts.save()
+        logger.info("Status counts reconciled from a scan of %s segments", segments)
+        return cls.read()
+
+
+class TimestampsMigration(Model):
+    """A class modeling the item in the DOI table recording that timestamps migrated.
+
+    Items written before the numeric timestamps were introduced are not in the next
+    attempt index, so unprocessed DOIs are scanned for until the item is saved by
+    DoiProcessAttempt.migrate_timestamps.
+    """
+
+    class Meta(DoiProcessAttempt.Meta):  # noqa: D106
+        pass
+
+    doi = UnicodeAttribute(hash_key=True, default=TIMESTAMPS_MIGRATED_KEY)
+    completed_at = NumberAttribute()
+
+    @classmethod
+    def completed(cls) -> bool:
+        """Return whether the timestamps of the DOI table have been migrated."""
+        try:
+            cls.get(TIMESTAMPS_MIGRATED_KEY)
+        except DoesNotExist:
+            return False
+        return True
+
+
+def parse_last_modified(last_modified: str) -> float:
+    """Convert a last_modified string of a DOI item to epoch seconds."""
+    return (
+        datetime.datetime.strptime(last_modified, DATE_FORMAT)
+        .replace(tzinfo=datetime.UTC)
+        .timestamp()
+    )
+
+
+class DoiLeaseLostError(Exception):
+    pass
@@ -0,0 +1,597 @@
+from __future__ import annotations
+
+import json
+import logging
+import time
+from contextlib import closing
+from typing import TYPE_CHECKING
+
+from botocore.exceptions import ClientError
+from pynamodb.exceptions import DoesNotExist, GetError
+
+from awd.article import (
+    Article,
+    DoiAttemptNotDueError,
+    DoiLeaseUnavailableError,
+    InvalidArticleContentResponseError,
+    InvalidCrossrefMetadataError,
+    InvalidDSpaceMetadataError,
+    UnprocessedStatusFalseError,
+)
+from awd.concurrency import process_in_order
+from awd.config import DOI_LEASE_SECONDS
+from awd.database import DoiLeaseLostError
+from awd.helpers import get_dois_from_spreadsheet, get_s3_keys_from_event_message
+from awd.listener import VisibilityHeartbeat
+from awd.metrics import RUN_METRICS
+from awd.scheduler import BackoffSchedule, DoiScheduler, unprocessed_doi_candidates
+from awd.state import DynamoDBStateStore
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable
+    from concurrent.futures import ThreadPoolExecutor
+
+    from mypy_boto3_sqs.type_defs import MessageTypeDef
+
+    from awd.archive import DoiArchive
+    from awd.concurrency import ByteBudget, RequestHedger
+    from awd.helpers import SQSClient
+    from awd.scheduler import RunDeadline
+    from awd.state import StateStore
+    from awd.storage import ObjectStore
+
+logger = logging.getLogger(__name__)
+
+# key prefix in the bucket for the error reports written by deposit workers
+WORKER_REPORT_PREFIX = "reports"
+
+
+class Depositor:
+    """Depositor class.
+
+    Class ingests DOIs from Wiley-provided spreadsheets and processes DOIs into DSpace
+    Submission Service messages.
+    """
+
+    def __init__(
+        self,
+        s3_client: ObjectStore,
+        sqs_client: SQSClient,
+        bucket: str,
+        metadata_url: str,
+        content_url: str,
+        sqs_base_url: str,
+        sqs_input_queue: str,
+        sqs_output_queue: str,
+        collection_handle: str,
+        workers: int = 1,
+        byte_budget: ByteBudget | None = None,
+        scheduler: DoiScheduler | None = None,
+        lease_seconds: float = DOI_LEASE_SECONDS,
+        archive: DoiArchive | None = None,
+        state_store: StateStore | None = None,
+        content_backoff: BackoffSchedule | None = None,
+        crossref_hedger: RequestHedger | None = None,
+        io_executor: ThreadPoolExecutor | None = None,
+    ) -> None:
+        """Initialize depositor instance.
+
+        Args:
+            s3_client: A configured S3 client or another object store.
+            sqs_client: A configured SQS client for the DSS input queue.
+            bucket: The S3 bucket for spreadsheets, metadata and article content.
+            metadata_url: The URL for retrieving metadata records.
+            content_url: The URL for retrieving article content.
+            sqs_base_url: The SQS base URL to use.
+            sqs_input_queue: The SQS input queue to use.
+            sqs_output_queue: The SQS output queue to use.
+            collection_handle: The handle of the DSpace collection to which items
+            will be uploaded.
+            workers: The number of DOIs processed concurrently.
+            byte_budget: An optional budget bounding the article content held in
+            memory by concurrently processed DOIs.
+            scheduler: The scheduler ordering unprocessed DOIs, which defaults to
+            processing the oldest DOIs first.
+            lease_seconds: The number of seconds a DOI is leased to this process while
+            it is processed, after which another deposit process may reclaim it.
+            archive: An optional archive of DOI items expired from the DOI table, so
+            archived DOIs in spreadsheets are not added again.
+            state_store: The store of the DOIs' processing state, which defaults to
+            the DynamoDB table.
+            content_backoff: The schedule for retrying DOIs whose PDF is not available
+            from Wiley, which defaults to the CONTENT_RETRY settings' defaults.
+            crossref_hedger: An optional request hedger shared by the DOIs' Crossref
+            requests.
+            io_executor: An optional executor shared by the DOIs, on which each DOI's
+            Wiley content and metadata upload run alongside its Crossref request and
+            content upload.
+        """
+        self.s3_client: ObjectStore = s3_client
+        self.sqs_client: SQSClient = sqs_client
+        self.bucket: str = bucket
+        self.metadata_url: str = metadata_url
+        self.content_url: str = content_url
+        self.sqs_base_url: str = sqs_base_url
+        self.sqs_input_queue: str = sqs_input_queue
+        self.sqs_output_queue: str = sqs_output_queue
+        self.collection_handle: str = collection_handle
+        self.workers: int = workers
+        self.byte_budget: ByteBudget | None = byte_budget
+        self.scheduler: DoiScheduler = scheduler or DoiScheduler({"oldest": 1})
+        self.lease_seconds: float = lease_seconds
+        self.archive: DoiArchive | None = archive
+        self.state_store: StateStore = state_store or DynamoDBStateStore()
+        self.content_backoff: BackoffSchedule | None = content_backoff
+        self.crossref_hedger: RequestHedger | None = crossref_hedger
+        self.io_executor: ThreadPoolExecutor | None = io_executor
+
+    def ingest_spreadsheet(self, key: str) -> list[str]:
+        """Add the DOIs from a spreadsheet to the DOI table and return those added.
+
+        DOIs already in the DOI table or the archive are not returned, so a
+        resubmitted spreadsheet does not schedule DOIs that were already processed.
+
+        Args:
+            key: The key of the spreadsheet in the bucket.
+        """
+        with RUN_METRICS.timer("ingest_spreadsheet"):
+            dois = list(get_dois_from_spreadsheet(self.s3_client.uri(self.bucket, key)))
+            added_dois = self.state_store.add_batch(dois, archive=self.archive)
+        logger.debug(
+            "%s DOIs ingested from %s, %s added", len(dois), key, len(added_dois)
+        )
+        return added_dois
+
+    def schedule_unprocessed_dois(self, new_dois: Iterable[str]) -> list[str]:
+        """Order the unprocessed DOIs in the DOI table that are due for processing.
+
+        Args:
+            new_dois: The DOIs added to the DOI table from spreadsheets during this run.
+        """
+        new_dois = set(new_dois)
+        candidates = unprocessed_doi_candidates(self.state_store.retrieve_due(), new_dois)
+        scheduled_dois = self.scheduler.order(candidates, new_dois)
+        logger.debug(
+            "%s unprocessed DOIs scheduled with policies: %s",
+            len(scheduled_dois),
+            self.scheduler.weights,
+        )
+        return scheduled_dois
+
+    def archive_spreadsheet(self, key: str) -> None:
+        """Archive a spreadsheet so it is not ingested again.
+
+        Args:
+            key: The key of the spreadsheet in the bucket.
+        """
+        self.s3_client.archive_file_with_new_key(
+            bucket=self.bucket, key=key, archived_key_prefix="archived"
+        )
+
+    def create_article(self, doi: str) -> Article:
+        """Create an article for a DOI.
+
+        Args:
+            doi: The DOI of the article.
+        """
+        return Article(
+            doi=doi,
+            metadata_url=self.metadata_url,
+            content_url=self.content_url,
+            s3_client=self.s3_client,
+            bucket=self.bucket,
+            sqs_client=self.sqs_client,
+            sqs_base_url=self.sqs_base_url,
+            sqs_input_queue=self.sqs_input_queue,
+            sqs_output_queue=self.sqs_output_queue,
+            collection_handle=self.collection_handle,
+            byte_budget=self.byte_budget,
+            lease_seconds=self.lease_seconds,
+            state_store=self.state_store,
+            content_backoff=self.content_backoff,
+            crossref_hedger=self.crossref_hedger,
+            io_executor=self.io_executor,
+        )
+
+    def process_doi(self, doi: str) -> None:
+        """Process a DOI, logging errors that should not stop the deposit.
+
+        Args:
+            doi: The DOI to be processed.
+        """
+        article = self.create_article(doi)
+        try:
+            article.process()
+        except (
+            DoiAttemptNotDueError,
+            DoiLeaseLostError,
+            DoiLeaseUnavailableError,
+            InvalidArticleContentResponseError,
+            InvalidCrossrefMetadataError,
+            InvalidDSpaceMetadataError,
+            UnprocessedStatusFalseError,
+        ):
+            return
+        except (
+            ClientError,
+            DoesNotExist,
+            GetError,
+        ):
+            logger.exception("AWS exception for %s, skipped processing", doi)
+
+    def process_dois(
+        self, dois: Iterable[str], deadline: RunDeadline | None = None
+    ) -> None:
+        """Process DOIs with the configured number of workers.
+
+        Log records are emitted in the order the DOIs were provided. With a deadline,
+        DOIs that are not predicted to finish in time are left for the next run while
+        DOIs in progress are completed.
+
+        Args:
+            dois: The DOIs to be processed.
+            deadline: An optional deadline for starting DOIs.
+        """
+        skipped_dois: list[str] = []
+
+        def process_doi(doi: str) -> None:
+            if deadline is None:
+                self.process_doi(doi)
+                return
+            if not deadline.allows_start():
+                skipped_dois.append(doi)
+                return
+            start = time.perf_counter()
+            self.process_doi(doi)
+            deadline.observe(time.perf_counter() - start)
+
+        # closing the outcomes cancels the DOIs not yet started when an error is raised
+        with closing(
+            process_in_order(process_doi, dois, workers=self.workers)
+        ) as outcomes:
+            for _, error in outcomes:
+                if error:
+                    raise error
+        if skipped_dois:
+            logger.warning(
+                "Deadline reached, %s DOIs left for the next run", len(skipped_dois)
+            )
+
+    def process_spreadsheet_events(
+        self,
+        event_sqs_client: SQSClient,
+        wait_time_seconds: int = 20,
+        visibility_timeout: int = 300,
+        deadline: RunDeadline | None = None,
+    ) -> int:
+        """Ingest, process and archive spreadsheets from S3 event notifications.
+
+        Messages are received until the event queue is empty. A message is deleted
+        once its spreadsheets are archived, while a message that fails is left on the
+        queue to be retried by a later run. Returns the number of spreadsheets processed.
+
+        Args:
+            event_sqs_client: The SQS client for the S3 event notification queue.
+            wait_time_seconds: The number of seconds to long-poll for messages.
+            visibility_timeout: The visibility timeout in seconds for in-flight
+            messages, which is extended while their spreadsheets are processed.
+            deadline: An optional deadline after which no further messages are
+            received and no further DOIs are started.
+        """
+        spreadsheet_count = 0
+        failed_message_ids: set[str] = set()
+        heartbeat = VisibilityHeartbeat(
+            event_sqs_client, visibility_timeout, interval=visibility_timeout / 3
+        )
+        heartbeat.start()
+        try:
+            while deadline is None or deadline.allows_start():
+                sqs_messages = event_sqs_client.receive_batch(
+                    wait_time_seconds=wait_time_seconds,
+                    visibility_timeout=visibility_timeout,
+                )
+                # failed messages are left for a later run rather than retried here
+                new_messages = [
+                    message
+                    for message in sqs_messages
+                    if message["MessageId"] not in failed_message_ids
+                ]
+                if not new_messages:
+                    break
+                heartbeat.add(message["ReceiptHandle"] for message in new_messages)
+                for sqs_message in new_messages:
+                    try:
+                        spreadsheet_count += self.process_spreadsheet_event(
+                            sqs_message, deadline=deadline
+                        )
+                    except (ClientError, KeyError, OSError, ValueError):
+                        logger.exception(
+                            "Error while processing S3 event message: %s", sqs_message
+                        )
+                        failed_message_ids.add(sqs_message["MessageId"])
+                    else:
+                        event_sqs_client.delete(sqs_message["ReceiptHandle"])
+                    heartbeat.remove([sqs_message["ReceiptHandle"]])
+        finally:
+            heartbeat.stop()
+        return spreadsheet_count
+
+    def process_spreadsheet_event(
+        self, sqs_message: MessageTypeDef, deadline: RunDeadline | None = None
+    ) -> int:
+        """Ingest, process and archive the spreadsheets from an S3 event notification.
+
+        Returns the number of spreadsheets processed. DOIs left unprocessed by the
+        deadline remain in the DOI table for the scheduled deposit.
+
+        Args:
+            sqs_message: An SQS message containing an S3 event notification.
+            deadline: An optional deadline for starting DOIs.
+        """
+        spreadsheet_count = 0
+        for key in get_s3_keys_from_event_message(
+            sqs_message,
+            bucket=self.bucket,
+            file_type=".csv",
+            excluded_key_prefix="archived",
+        ):
+            if not self.s3_client.file_exists(self.bucket, key):
+                logger.info("Spreadsheet already archived, skipping: %s", key)
+                continue
+            logger.info("Processing spreadsheet from S3 event: %s", key)
+            self.process_dois(self.ingest_spreadsheet(key), deadline=deadline)
+            self.archive_spreadsheet(key)
+            spreadsheet_count += 1
+        return spreadsheet_count
+
+    def enqueue_dois(
+        self, work_sqs_client: SQSClient, dois: Iterable[str], run_id: str
+    ) -> int:
+        """Send DOIs as work items to the work queue and return the number sent.
+
+        Work items are sent in the order the DOIs are provided.
+
+        Args:
+            work_sqs_client: The SQS client for the work queue.
+            dois: The DOIs to be processed by deposit workers.
+            run_id: The identifier of the coordinator run, under which workers write
+            their error reports.
+        """
+        message_bodies = [json.dumps({"doi": doi, "run_id": run_id}) for doi in dois]
+        sent_count = work_sqs_client.send_batch(message_bodies)
+        logger.info("%s DOIs sent to the work queue for run %s", sent_count, run_id)
+        return sent_count
+
+    def process_work_queue(
+        self,
+        work_sqs_client: SQSClient,
+        worker_id: str,
+        collect_errors: Callable[[], str],
+        wait_time_seconds: int = 20,
+        visibility_timeout: int = 300,
+        deadline: RunDeadline | None = None,
+        max_receives: int = 5,
+    ) -> int:
+        """Process DOI work items from the work queue until it is empty.
+
+        Work items are received in batches of at least one message per worker. After
+        each batch, the errors logged while processing it are written as a report for
+        the coordinator, and only then are the completed work items deleted, so a
+        drained queue means every report has been written. A work item that fails is
+        left on the queue and retried once its visibility timeout expires. Returns the
+        number of work items completed.
+
+        Args:
+            work_sqs_client: The SQS client for the work queue.
+            worker_id: A unique identifier of this worker, used in report keys.
+            collect_errors: A function returning the errors logged since it was last
+            called.
+            wait_time_seconds: The number of seconds to long-poll for work items.
+            visibility_timeout: The visibility timeout in seconds for in-flight work
+            items, which is extended while they are processed.
+            deadline: An optional deadline after which no further work items are
+            started. Work items that are not started are made visible to other
+            workers immediately.
+            max_receives: The number of times a work item is received before it is
+            given up on, logging an error for the report, so a DOI that always fails
+            cannot keep the queue from draining.
+        """
+        completed_count = 0
+        batch_count = 0
+        heartbeat = VisibilityHeartbeat(
+            work_sqs_client, visibility_timeout, interval=visibility_timeout / 3
+        )
+        heartbeat.start()
+        try:
+            while deadline is None or deadline.allows_start():
+                sqs_messages = self.receive_work_items(
+                    work_sqs_client, wait_time_seconds, visibility_timeout
+                )
+                if not sqs_messages:
+                    break
+                receipt_handles = [message["ReceiptHandle"] for message in sqs_messages]
+                heartbeat.add(receipt_handles)
+                completed, skipped = self.process_work_items(
+                    sqs_messages, deadline, max_receives=max_receives
+                )
+                batch_count += 1
+                self.write_worker_report(
+                    {self.get_run_id(message) for message in sqs_messages} - {""},
+                    f"{worker_id}-{batch_count:06d}",
+                    collect_errors(),
+                )
+                work_sqs_client.delete_batch(completed)
+                if skipped:
+                    work_sqs_client.change_visibility_batch(skipped, 0)
+                heartbeat.remove(receipt_handles)
+                completed_count += len(completed)
+        finally:
+            heartbeat.stop()
+        logger.info("%s work items completed by worker %s", completed_count, worker_id)
+        return completed_count
+
+    @staticmethod
+    def get_run_id(sqs_message: MessageTypeDef) -> str:
+        """Get the run ID of a work item, or an empty string if malformed.
+
+        Args:
+            sqs_message: A work item message.
+        """
+        try:
+            return str(json.loads(sqs_message["Body"])["run_id"])
+        except (KeyError, TypeError, ValueError):
+            return ""
+
+    def receive_work_items(
+        self, work_sqs_client: SQSClient, wait_time_seconds: int, visibility_timeout: int
+    ) -> list[MessageTypeDef]:
+        """Receive enough work items to keep every worker busy, if available.
+
+        Only the first receive long-polls, so a partial batch is not delayed.
+
+        Args:
+            work_sqs_client: The SQS client for the work queue.
+            wait_time_seconds: The number of seconds to long-poll for work items.
+            visibility_timeout: The visibility timeout in seconds for the work items.
+        """
+        sqs_messages = work_sqs_client.receive_batch(
+            wait_time_seconds=wait_time_seconds, visibility_timeout=visibility_timeout
+        )
+        while sqs_messages and len(sqs_messages) < self.workers:
+            more_messages = work_sqs_client.receive_batch(
+                wait_time_seconds=0, visibility_timeout=visibility_timeout
+            )
+            if not more_messages:
+                break
+            sqs_messages.extend(more_messages)
+        return sqs_messages
+
+    def process_work_items(
+        self,
+        sqs_messages: list[MessageTypeDef],
+        deadline: RunDeadline | None = None,
+        max_receives: int | None = None,
+    ) -> tuple[list[str], list[str]]:
+        """Process work items and return the handles of completed and skipped items.
+
+        A work item received more than the maximum number of times is not processed
+        again. An error is logged for it and it is completed, so it is deleted.
+
+        Args:
+            sqs_messages: The work item messages to be processed.
+            deadline: An optional deadline for starting work items.
+            max_receives: The optional number of receives after which work items are
+            given up on.
+        """
+        completed: list[str] = []
+        skipped: list[str] = []
+
+        def process_work_item(sqs_message: MessageTypeDef) -> None:
+            if deadline is not None and not deadline.allows_start():
+                skipped.append(sqs_message["ReceiptHandle"])
+                return
+            receive_count = int(
+                sqs_message.get("Attributes", {}).get("ApproximateReceiveCount", 1)
+            )
+            if max_receives is not None and receive_count > max_receives:
+                logger.error(
+                    "Work item %s was received %s times without completing and will "
+                    "not be attempted again by workers",
+                    sqs_message["Body"],
+                    receive_count,
+                )
+                return
+            start = time.perf_counter()
+            self.process_doi(json.loads(sqs_message["Body"])["doi"])
+            if deadline is not None:
+                deadline.observe(time.perf_counter() - start)
+
+        for sqs_message, error in process_in_order(
+            process_work_item, sqs_messages, workers=self.workers
+        ):
+            if error:
+                logger.error(
+                    "Error while processing work item %s, left on the queue for retry",
+                    sqs_message["Body"],
+                    exc_info=error,
+                )
+            elif sqs_message["ReceiptHandle"] not in skipped:
+                completed.append(sqs_message["ReceiptHandle"])
+        return completed, skipped
+
+    def write_worker_report(self, run_ids: Iterable[str], name: str, errors: str) -> None:
+        """Write the errors logged by a worker to the bucket for the coordinator runs.
+
+        Args:
+            run_ids: The coordinator runs of the processed work items.
+            name: The name of the report, unique per worker and batch.
+            errors: The errors logged while processing the work items.
+        """
+        if not errors:
+            return
+        for run_id in run_ids:
+            self.s3_client.put_file(
+                errors, self.bucket, f"{WORKER_REPORT_PREFIX}/{run_id}/{name}.txt"
+            )
+
+    def wait_for_work_queue(
+        self,
+        work_sqs_client: SQSClient,
+        poll_interval: float,
+        deadline: RunDeadline | None = None,
+        stall_timeout: float | None = 3600,
+    ) -> int:
+        """Wait until the workers have drained the work queue.
+
+        Returns the approximate number of work items remaining, which is 0 unless the
+        deadline was reached or the queue stalled first. The queue has stalled when
+        the number of work items remaining has not fallen for the stall timeout, for
+        example because no workers are running.
+
+        Args:
+            work_sqs_client: The SQS client for the work queue.
+            poll_interval: The number of seconds between checks of the queue.
+            deadline: An optional deadline after which waiting stops.
+            stall_timeout: The number of seconds without progress after which waiting
+            stops, or None to wait until the queue is drained or the deadline.
+        """
+        lowest_remaining = None
+        last_progress = time.monotonic()
+        while remaining := work_sqs_client.approximate_message_count():
+            logger.debug("%s work items remaining on the work queue", remaining)
+            if lowest_remaining is None or remaining < lowest_remaining:
+                lowest_remaining = remaining
+                last_progress = time.monotonic()
+            elif (
+                stall_timeout is not None
+                and time.monotonic() - last_progress >= stall_timeout
+            ):
+                logger.warning(
+                    "Work queue has made no progress for %d seconds with %s work items "
+                    "remaining, check that workers are running",
+                    stall_timeout,
+                    remaining,
+                )
+                return remaining
+            if deadline is None:
+                time.sleep(poll_interval)
+            elif not deadline.allows_start() or deadline.expired.wait(poll_interval):
+                return remaining
+        return 0
+
+    def collect_worker_reports(self, run_id: str) -> str:
+        """Combine and delete the error reports written by workers for a run.
+
+        Args:
+            run_id: The identifier of the coordinator run.
+        """
+        keys = sorted(
+            self.s3_client.list_keys(self.bucket, f"{WORKER_REPORT_PREFIX}/{run_id}/")
+        )
+        reports = "".join(
+            self.s3_client.get_file(self.bucket, key).decode() for key in keys
+        )
+        if keys:
+            self.s3_client.delete_files(self.bucket, keys)
+        logger.debug("%s worker reports collected for run %s", len(keys), run_id)
+        return reports
@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+import smart_open
+
+from awd.database import DoiProcessAttempt
+from awd.status import Status
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+    from pynamodb.expressions.condition import Condition
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ("jsonl", "parquet")
+# columns of an exported row, in order, with their Parquet types
+EXPORT_COLUMNS = {
+    "doi": "string",
+    "status_code": "int64",
+    "status": "string",
+    "process_attempts": "int64",
+    "last_modified": "string",
+    "last_modified_ts": "float64",
+    "next_attempt_at": "float64",
+}
+PARQUET_ROW_GROUP_SIZE = 10000
+
+
+class MissingExportDependencyError(Exception):
+    pass
+
+
+def export_row(item: DoiProcessAttempt) -> dict[str, Any]:
+    """Create an export row from a DOI item.
+
+    Args:
+        item: The DOI item to export.
+    """
+    return {
+        "doi": item.doi,
+        "status_code": int(item.status_code),
+        "status": Status(item.status_code).name,
+        "process_attempts": int(item.process_attempts),
+        "last_modified": item.last_modified,
+        "last_modified_ts": item.last_modified_ts,
+        "next_attempt_at": item.next_attempt_at,
+    }
+
+
+class DoiTableExport:
+    """Export the DOI table to a snapshot with a parallel scan.
+
+    Each scan segment streams its rows to its own part file under the output path,
+    so segments never wait for each other and memory use does not grow with the table.
+    """
+
+    def __init__(
+        self,
+        output_path: str,
+        export_format: str = "jsonl",
+        total_segments: int = 4,
+        rate_limit: float | None = None,
+        modified_since: str | None = None,
+    ) -> None:
+        """Initialize DOI table export instance.
+
+        Args:
+            output_path: The local directory or S3 URI prefix for the part files.
+            export_format: 'jsonl' for gzipped JSON lines or 'parquet'.
+            total_segments: The number of scan segments read concurrently.
+            rate_limit: An optional limit on the read capacity units consumed per
+            second by the whole export, shared equally by the segments.
+            modified_since: An optional last_modified value in DATE_FORMAT, so only
+            items modified since then are exported.
+        """
+        if export_format not in EXPORT_FORMATS:
+            message = f"Unknown export format: {export_format}"
+            raise ValueError(message)
+        self.output_path: str = output_path.rstrip("/")
+        self.export_format: str = export_format
+        self.total_segments: int = total_segments
+        self.rate_limit: float | None = rate_limit
+        self.modified_since: str | None = modified_since
+
+    def filter_condition(self) -> Condition:
+        """The scan filter selecting the DOI items to export."""
+        condition = DoiProcessAttempt.status_code.exists()
+        if self.modified_since is not None:
+            # DATE_FORMAT sorts chronologically as a string
+            condition &= DoiProcessAttempt.last_modified >= self.modified_since
+        return condition
+
+    def part_path(self, segment: int) -> str:
+        """The path of the part file for a scan segment.
+
+        Args:
+            segment: The scan segment.
+        """
+        suffix = "jsonl.gz" if self.export_format == "jsonl" else "parquet"
+        return f"{self.output_path}/part-{segment:05d}.{suffix}"
+
+    def scan_segment(self, segment: int) -> Iterator[dict[str, Any]]:
+        """Scan a segment of the DOI table for export rows.
+
+        Args:
+            segment: The scan segment.
+        """
+        for item in DoiProcessAttempt.scan(
+            segment=segment,
+            total_segments=self.total_segments,
+            filter_condition=self.filter_condition(),
+            rate_limit=(
+                self.rate_limit / self.total_segments
+                if self.rate_limit is not None
+                else None
+            ),
+        ):
+            yield export_row(item)
+
+    def export_segment(self, segment: int) -> int:
+        """Write the rows of a scan segment to its part file and return the row count.
+
+        Args:
+            segment: The scan segment.
+        """
+        rows = self.scan_segment(segment)
+        path = self.part_path(segment)
+        if self.export_format == "parquet":
+            row_count = write_parquet(rows, path)
+        else:
+            row_count = write_jsonl(rows, path)
+        logger.debug("%s rows exported to %s", row_count, path)
+        return row_count
+
+    def run(self) -> int:
+        """Export the DOI table and return the number of rows exported."""
+        if self.export_format == "parquet":
+            check_parquet_dependency()
+        if "://" not in self.output_path:
+            Path(self.output_path).mkdir(parents=True, exist_ok=True)
+        with ThreadPoolExecutor(max_workers=self.total_segments) as executor:
+            row_count = sum(executor.map(self.export_segment, range(self.total_segments)))
+        logger.info(
+            "%s DOI items exported to %s in %s parts",
+            row_count,
+            self.output_path,
+            self.total_segments,
+        )
+        return row_count
+
+
+def write_jsonl(rows: Iterator[dict[str, Any]], path: str) -> int:
+    """Stream rows to a gzipped JSON lines file and return the row count.
+
+    Args:
+        rows: The rows to write.
+        path: The local path or S3 URI of the file, compressed as it ends in '.gz'.
+    """
+    row_count = 0
+    with smart_open.open(path, "w") as jsonl_file:
+        for row in rows:
+            jsonl_file.write(f"{json.dumps(row)}\n")
+            row_count += 1
+    return row_count
+
+
+def check_parquet_dependency() -> None:
+    """Raise an error if pyarrow, which is needed to write Parquet, is not installed."""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as e:
+        message = "Exporting to Parquet requires pyarrow to be installed"
+        raise MissingExportDependencyError(message) from e
+
+
+def write_parquet(rows: Iterator[dict[str, Any]], path: str) -> int:
+    """Stream rows to a Parquet file in row groups and return the row count.
+
+    Args:
+        rows: The rows to write.
+        path: The local path or S3 URI of the file.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema(
+        [(column, pa.type_for_alias(type_)) for column, type_ in EXPORT_COLUMNS.items()]
+    )
+    row_count = 0
+    with (
+        smart_open.open(path, "wb") as parquet_file,
+        pq.ParquetWriter(parquet_file, schema) as writer,
+    ):
+        batch: list[dict[str, Any]] = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == PARQUET_ROW_GROUP_SIZE:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                row_count += len(batch)
+                batch = []
+        # an empty part still gets a row group so it can be read with the schema
+        writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+        row_count += len(batch)
+    return row_count
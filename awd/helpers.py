@@ -2,22 +2,30 @@ from __future__ import annotations
 
 import json
 import logging
-from email.mime.application import MIMEApplication
-from email.mime.multipart import MIMEMultipart
-from typing import TYPE_CHECKING, Any
+import re
+import threading
+import time
+from http import HTTPStatus
+from typing import TYPE_CHECKING, Any, BinaryIO, ClassVar
 
-import requests
-import smart_open
-from boto3 import client
+import boto3
+from botocore.config import Config as BotocoreConfig
+from botocore.exceptions import ClientError
 
+from awd.config import DSS_RETRY_BASE_SECONDS, DSS_RETRY_MAX_SECONDS
 from awd.database import DoiProcessAttempt
+from awd.logs import flush_logs, log_context
+from awd.scheduler import BackoffSchedule
+from awd.state import DynamoDBStateStore
 from awd.status import Status
+from awd.storage import ObjectStore
 
 if TYPE_CHECKING:
     from collections.abc import Iterator, Mapping
+    from email.mime.multipart import MIMEMultipart
     from io import StringIO
 
-    from mypy_boto3_s3.type_defs import PutObjectOutputTypeDef
+    import requests
     from mypy_boto3_ses.type_defs import SendRawEmailResponseTypeDef
     from mypy_boto3_sqs.type_defs import (
         EmptyResponseMetadataTypeDef,
@@ -26,6 +34,10 @@ if TYPE_CHECKING:
         SendMessageResultTypeDef,
     )
 
+    from awd.concurrency import RequestHedger
+    from awd.listener import ResultBatch
+    from awd.state import StateStore
+
 
 logger = logging.getLogger(__name__)
 
@@ -33,82 +45,202 @@ WILEY_HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
     "(KHTML, like Gecko) Chrome/70.0.3538.77 Safari/537.36"
 }
+# DSS reports a failed DSpace request with the exception message of requests, which
+# starts with the HTTP status code and whether it is a client or server error
+DSS_HTTP_ERROR_PATTERN = re.compile(r"\b([45]\d\d) (?:Client|Server) Error\b")
+# client errors that can succeed when the request is made again later
+RETRYABLE_CLIENT_ERROR_CODES = frozenset({408, 409, 423, 425, 429})
+
+
+class ClientFactory:
+    """A factory for boto3 clients that share a session and connection settings.
+
+    Sharing a session avoids reloading service models for each client, and the
+    botocore config sizes connection pools for concurrent use.
+    """
+
+    max_pool_connections: ClassVar[int] = 10
+    connect_timeout: ClassVar[int] = 60
+    read_timeout: ClassVar[int] = 60
+    max_attempts: ClassVar[int] = 3
+    session: ClassVar[boto3.session.Session | None] = None
+    lock: ClassVar[threading.Lock] = threading.Lock()
+
+    @classmethod
+    def configure(
+        cls,
+        max_pool_connections: int,
+        connect_timeout: int,
+        read_timeout: int,
+        max_attempts: int,
+    ) -> None:
+        """Set connection settings for clients created by the factory.
+
+        Args:
+            max_pool_connections: The maximum number of pooled HTTP connections.
+            connect_timeout: The number of seconds to wait for a connection.
+            read_timeout: The number of seconds to wait for a response.
+            max_attempts: The total number of attempts made for a request.
+        """
+        cls.max_pool_connections = max_pool_connections
+        cls.connect_timeout = connect_timeout
+        cls.read_timeout = read_timeout
+        cls.max_attempts = max_attempts
+
+    @classmethod
+    def botocore_config(cls) -> BotocoreConfig:
+        """Create a botocore config from the factory's connection settings."""
+        return BotocoreConfig(
+            max_pool_connections=cls.max_pool_connections,
+            connect_timeout=cls.connect_timeout,
+            read_timeout=cls.read_timeout,
+            retries={"mode": "adaptive", "total_max_attempts": cls.max_attempts},
+            tcp_keepalive=True,
+        )
+
+    @classmethod
+    def client(
+        cls, service_name: str, region_name: str | None = None
+    ) -> Any:  # noqa: ANN401
+        """Create a client for an AWS service from the shared session.
+
+        Args:
+            service_name: The name of the AWS service, e.g. 's3'.
+            region_name: The AWS region of the client.
+        """
+        with cls.lock:
+            if cls.session is None:
+                cls.session = boto3.session.Session()
+            return cls.session.client(
+                service_name,  # type: ignore[call-overload]
+                region_name=region_name,
+                config=cls.botocore_config(),
+            )
+
+    @classmethod
+    def reset(cls) -> None:
+        """Discard the shared session so the next client uses a new session."""
+        with cls.lock:
+            cls.session = None
+
 
+def configure_aws_clients(
+    max_pool_connections: int,
+    connect_timeout: int,
+    read_timeout: int,
+    max_attempts: int,
+) -> None:
+    """Apply connection settings to the boto3 clients and the DynamoDB table.
 
-class S3Client:
+    Args:
+        max_pool_connections: The maximum number of pooled HTTP connections.
+        connect_timeout: The number of seconds to wait for a connection.
+        read_timeout: The number of seconds to wait for a response.
+        max_attempts: The total number of attempts made for a request.
+    """
+    ClientFactory.configure(
+        max_pool_connections, connect_timeout, read_timeout, max_attempts
+    )
+    DoiProcessAttempt.configure_connection(
+        max_pool_connections, connect_timeout, read_timeout, max_attempts
+    )
+
+
+class S3Client(ObjectStore):
     """An S3 class that provides a generic boto3 s3 client.
 
     Includes specific S3 functionality necessary for Wiley deposits.
     """
 
     def __init__(self) -> None:
-        self.client = client("s3")
+        self.client = ClientFactory.client("s3")
+
+    def uri(self, bucket: str, key: str) -> str:
+        return f"s3://{bucket}/{key}"
+
+    def check_bucket_access(self, bucket: str) -> bool:
+        try:
+            self.client.list_objects_v2(Bucket=bucket, MaxKeys=1)
+        except ClientError as e:
+            logger.exception(
+                "Error accessing bucket: %s, %s", bucket, e.response["Error"]["Message"]
+            )
+            return False
+        return True
 
     def archive_file_with_new_key(
         self, bucket: str, key: str, archived_key_prefix: str
     ) -> None:
-        """Update the key of the specified file to archive it from processing.
-
-        Args:
-            bucket: The S3 bucket containing the files to be archived.
-            key: The key of the file to archive.
-            archived_key_prefix: The prefix to be applied to the archived file.
-        """
-        self.client.copy_object(
-            Bucket=bucket,
-            CopySource=f"{bucket}/{key}",
-            Key=f"{archived_key_prefix}/{key}",
-        )
+        self.copy_file(bucket, key, f"{archived_key_prefix}/{key}")
         self.client.delete_object(
             Bucket=bucket,
             Key=key,
         )
 
-    def put_file(
-        self, file_content: str | bytes, bucket: str, key: str
-    ) -> PutObjectOutputTypeDef:
-        """Put a file in a specified S3 bucket with a specified key.
-
-        Args:
-            file_content: The content of the file to be uploaded.
-            bucket: The S3 bucket where the file will be uploaded.
-            key: The key to be used for the uploaded file.
-        """
-        response = self.client.put_object(
-            Body=file_content,
+    def copy_file(self, bucket: str, key: str, new_key: str) -> None:
+        self.client.copy_object(
             Bucket=bucket,
-            Key=key,
+            CopySource=f"{bucket}/{key}",
+            Key=new_key,
         )
-        logger.debug("%s uploaded to S3", key)
-        return response
 
-    def retrieve_file_type_from_bucket(
-        self, bucket: str, file_type: str, excluded_key_prefix: str
-    ) -> Iterator[str]:
-        """Retrieve file based on file type, bucket, and without excluded prefix.
+    def delete_files(self, bucket: str, keys: list[str]) -> None:
+        for start in range(0, len(keys), 1000):
+            self.client.delete_objects(
+                Bucket=bucket,
+                Delete={
+                    "Objects": [{"Key": key} for key in keys[start : start + 1000]],
+                    "Quiet": True,
+                },
+            )
+        logger.debug("%s files deleted from S3 bucket: %s", len(keys), bucket)
 
-        Args:
-            bucket: The S3 bucket to search.
-            file_type: The file type to retrieve.
-            excluded_key_prefix: Files with this key prefix will not be retrieved.
-        """
+    def file_exists(self, bucket: str, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=bucket, Key=key)
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+                return False
+            raise
+        return True
+
+    def get_file(self, bucket: str, key: str) -> bytes:
+        return self.client.get_object(Bucket=bucket, Key=key)["Body"].read()
+
+    def list_keys(self, bucket: str, prefix: str) -> Iterator[str]:
         paginator = self.client.get_paginator("list_objects_v2")
-        pages = paginator.paginate(Bucket=bucket)
-        for s3_object in [
-            s3_object
-            for page in pages
-            for s3_object in page["Contents"]
-            if s3_object["Key"].endswith(file_type)
-            and excluded_key_prefix not in s3_object["Key"]
-        ]:
-            yield s3_object["Key"]
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            for s3_object in page.get("Contents", []):
+                yield s3_object["Key"]
+
+    def list_children(self, bucket: str, prefix: str) -> Iterator[str]:
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix, Delimiter="/"):
+            for common_prefix in page.get("CommonPrefixes", []):
+                yield common_prefix["Prefix"]
+            for s3_object in page.get("Contents", []):
+                yield s3_object["Key"]
+
+    def put_file(
+        self, file_content: str | bytes | BinaryIO, bucket: str, key: str
+    ) -> None:
+        if isinstance(file_content, str | bytes):
+            self.client.put_object(
+                Body=file_content,
+                Bucket=bucket,
+                Key=key,
+            )
+        else:
+            # streamed in parts, so a large file is never held in memory whole
+            self.client.upload_fileobj(file_content, bucket, key)
+        logger.debug("%s uploaded to S3", key)
 
 
 class SESClient:
     """An SES class that provides a generic boto3 SES client."""
 
     def __init__(self, region: str) -> None:
-        self.client = client("ses", region_name=region)
+        self.client = ClientFactory.client("ses", region_name=region)
 
     def create_email(
         self,
@@ -123,6 +255,9 @@ class SESClient:
             attachment_content: The content of the email attachment.
             attachment_name: The name of the email attachment.
         """
+        from email.mime.application import MIMEApplication
+        from email.mime.multipart import MIMEMultipart
+
         message = MIMEMultipart()
         message["Subject"] = subject
         attachment_object = MIMEApplication(attachment_content)
@@ -179,7 +314,7 @@ class SQSClient:
     """An SQS class that provides a generic boto3 SQS client."""
 
     def __init__(self, region: str, base_url: str, queue_name: str) -> None:
-        self.client = client("sqs", region_name=region)
+        self.client = ClientFactory.client("sqs", region_name=region)
         self.base_url: str = base_url
         self.queue_name: str = queue_name
 
@@ -247,31 +382,161 @@ class SQSClient:
         logger.debug("Message deleted from SQS queue: %s", response)
         return response
 
+    def approximate_message_count(self) -> int:
+        """Approximate number of messages on the SQS queue, including in-flight messages.
+
+        Delayed messages and messages hidden by their visibility timeout are included.
+        """
+        response = self.client.get_queue_attributes(
+            QueueUrl=f"{self.base_url}{self.queue_name}",
+            AttributeNames=[
+                "ApproximateNumberOfMessages",
+                "ApproximateNumberOfMessagesNotVisible",
+                "ApproximateNumberOfMessagesDelayed",
+            ],
+        )
+        return sum(int(value) for value in response["Attributes"].values())
+
+    @staticmethod
+    def get_package_id(sqs_message: MessageTypeDef) -> str:
+        """Get the PackageID (DOI) of an SQS message, or an empty string if missing.
+
+        Args:
+            sqs_message: An SQS message.
+        """
+        message_attributes = sqs_message.get("MessageAttributes", {})
+        if "PackageID" not in message_attributes:
+            return ""
+        return message_attributes["PackageID"].get("StringValue", "")
+
+    def delete_batch(self, receipt_handles: list[str]) -> None:
+        """Delete messages from SQS queue in batches of up to 10.
+
+        Args:
+            receipt_handles: The receipt handles of the messages to be deleted.
+        """
+        for start in range(0, len(receipt_handles), 10):
+            response = self.client.delete_message_batch(
+                QueueUrl=f"{self.base_url}{self.queue_name}",
+                Entries=[
+                    {"Id": str(index), "ReceiptHandle": receipt_handle}
+                    for index, receipt_handle in enumerate(
+                        receipt_handles[start : start + 10]
+                    )
+                ],
+            )
+            for failure in response.get("Failed", []):
+                logger.error(
+                    "Failed to delete message from SQS queue %s: %s",
+                    self.queue_name,
+                    failure,
+                )
+        logger.debug(
+            "%s messages deleted from SQS queue: %s",
+            len(receipt_handles),
+            self.queue_name,
+        )
+
+    def change_visibility_batch(
+        self, receipt_handles: list[str], visibility_timeout: int
+    ) -> None:
+        """Change the visibility timeout of messages in batches of up to 10.
+
+        Args:
+            receipt_handles: The receipt handles of the messages to be changed.
+            visibility_timeout: The new visibility timeout in seconds.
+        """
+        for start in range(0, len(receipt_handles), 10):
+            self.client.change_message_visibility_batch(
+                QueueUrl=f"{self.base_url}{self.queue_name}",
+                Entries=[
+                    {
+                        "Id": str(index),
+                        "ReceiptHandle": receipt_handle,
+                        "VisibilityTimeout": visibility_timeout,
+                    }
+                    for index, receipt_handle in enumerate(
+                        receipt_handles[start : start + 10]
+                    )
+                ],
+            )
+        logger.debug(
+            "Visibility timeout of %s messages extended to %s seconds",
+            len(receipt_handles),
+            visibility_timeout,
+        )
+
     def process_result_message(
         self,
         sqs_message: MessageTypeDef,
         retry_threshold: str,
+        result_batch: ResultBatch | None = None,
+        state_store: StateStore | None = None,
+        dss_backoff: BackoffSchedule | None = None,
     ) -> None:
         """Validate and then process an SQS result message based on content.
 
+        A DOI with a retryable DSS error is set to an unprocessed status that is not
+        due until its backoff delay has passed, and a DOI with a non-retryable DSS
+        error is set to a failed status.
+
         Args:
             sqs_message: An SQS result message to be processed.
             retry_threshold: The number of times to attempt processing an article.
+            result_batch: An optional batch collecting the message deletion and the
+            status update so they can be flushed together later.
+            state_store: The store of the DOI's processing state, which defaults to
+            the DynamoDB table.
+            dss_backoff: The schedule for retrying DOIs with a retryable DSS error,
+            which defaults to the DSS_RETRY settings' defaults.
         """
         if not self.valid_sqs_message(sqs_message):
             raise InvalidSQSMessageError
+        state_store = state_store or DynamoDBStateStore()
         doi = sqs_message["MessageAttributes"]["PackageID"]["StringValue"]
-        doi_process_attempt = DoiProcessAttempt.get(doi)
-
-        message_body = json.loads(str(sqs_message["Body"]))
-        receipt_handle = sqs_message["ReceiptHandle"]
-        self.delete(receipt_handle)
-        logger.info("DOI: %s, Result: %s", doi, message_body)
-
-        if message_body["ResultType"] == "error":
-            doi_process_attempt.sqs_error_update_status(int(retry_threshold))
-        else:
-            doi_process_attempt.update_status(status_code=Status.SUCCESS.value)
+        with log_context(doi=doi):
+            doi_process_attempt = state_store.get(doi)
+
+            message_body = json.loads(str(sqs_message["Body"]))
+            receipt_handle = sqs_message["ReceiptHandle"]
+            if result_batch is None:
+                self.delete(receipt_handle)
+            logger.info("DOI: %s, Result: %s", doi, message_body)
+
+            next_attempt_at = None
+            if message_body["ResultType"] == "error":
+                status_code = doi_process_attempt.sqs_error_status_code(
+                    int(retry_threshold), retryable=dss_error_is_retryable(message_body)
+                )
+                if status_code == Status.UNPROCESSED.value:
+                    dss_backoff = dss_backoff or BackoffSchedule(
+                        DSS_RETRY_BASE_SECONDS,
+                        DSS_RETRY_MAX_SECONDS,
+                        int(retry_threshold),
+                    )
+                    delay = dss_backoff.delay(int(doi_process_attempt.process_attempts))
+                    next_attempt_at = time.time() + delay
+                    logger.info(
+                        "DOI: %s, DSS error is retryable, next attempt in %d seconds",
+                        doi,
+                        delay,
+                    )
+            else:
+                status_code = Status.SUCCESS.value
+            if result_batch is None:
+                state_store.update_status(
+                    doi_process_attempt,
+                    status_code=status_code,
+                    next_attempt_at=next_attempt_at,
+                )
+            else:
+                previous_status_code = doi_process_attempt.status_code
+                doi_process_attempt.set_status(
+                    status_code=status_code, next_attempt_at=next_attempt_at
+                )
+                result_batch.add(
+                    receipt_handle, doi_process_attempt, previous_status_code
+                )
 
     def receive(self) -> Iterator[MessageTypeDef]:
         """Receive messages from SQS queue."""
@@ -294,6 +559,31 @@ class SQSClient:
                 logger.debug("No more messages from SQS queue: %s", self.queue_name)
                 break
 
+    def receive_batch(
+        self, wait_time_seconds: int, visibility_timeout: int
+    ) -> list[MessageTypeDef]:
+        """Long-poll the SQS queue for a single batch of up to 10 messages.
+
+        Each message's ApproximateReceiveCount is included in its attributes.
+
+        Args:
+            wait_time_seconds: The maximum number of seconds to wait for messages.
+            visibility_timeout: The visibility timeout for the received messages.
+        """
+        response = self.client.receive_message(
+            QueueUrl=f"{self.base_url}{self.queue_name}",
+            AttributeNames=["ApproximateReceiveCount"],
+            MaxNumberOfMessages=10,
+            MessageAttributeNames=["All"],
+            WaitTimeSeconds=wait_time_seconds,
+            VisibilityTimeout=visibility_timeout,
+        )
+        messages = response.get("Messages", [])
+        logger.debug(
+            "%s messages retrieved from SQS queue: %s", len(messages), self.queue_name
+        )
+        return messages
+
     def send(
         self,
         message_attributes: Mapping[str, MessageAttributeValueTypeDef],
@@ -314,6 +604,33 @@ class SQSClient:
         logger.debug("Response from SQS queue: %s", response)
         return response
 
+    def send_batch(self, message_bodies: list[str]) -> int:
+        """Send messages via SQS in batches of up to 10 and return the number sent.
+
+        Args:
+            message_bodies: The bodies of the messages to send.
+        """
+        sent_count = 0
+        for start in range(0, len(message_bodies), 10):
+            response = self.client.send_message_batch(
+                QueueUrl=f"{self.base_url}{self.queue_name}",
+                Entries=[
+                    {"Id": str(index), "MessageBody": message_body}
+                    for index, message_body in enumerate(
+                        message_bodies[start : start + 10]
+                    )
+                ],
+            )
+            sent_count += len(response.get("Successful", []))
+            for failure in response.get("Failed", []):
+                logger.error(
+                    "Failed to send message to SQS queue %s: %s",
+                    self.queue_name,
+                    failure,
+                )
+        logger.debug("%s messages sent to SQS queue: %s", sent_count, self.queue_name)
+        return sent_count
+
     @staticmethod
     def valid_result_message_attributes(sqs_message: MessageTypeDef) -> bool:
         """Validate that "MessageAttributes" field is formatted as expected.
@@ -369,41 +686,121 @@ class SQSClient:
         return valid
 
 
+def dss_error_is_retryable(message_body: Mapping[str, Any]) -> bool:
+    """Whether a DSS error result could succeed if the DOI is deposited again.
+
+    Client errors from DSpace, such as invalid metadata or a missing collection, fail
+    the same way on every attempt. Server errors, timeouts, and errors without an HTTP
+    status are treated as transient.
+
+    Args:
+        message_body: The body of a DSS error result message.
+    """
+    for field in ("ExceptionMessage", "ErrorInfo"):
+        match = DSS_HTTP_ERROR_PATTERN.search(str(message_body.get(field) or ""))
+        if match:
+            status_code = int(match.group(1))
+            return (
+                status_code >= HTTPStatus.INTERNAL_SERVER_ERROR
+                or status_code in RETRYABLE_CLIENT_ERROR_CODES
+            )
+    return True
+
+
 def filter_log_stream(stream: StringIO) -> str:
     """Filter log stream to only ERROR messages for stakeholder email.
 
     Args:
         stream: A log stream used to generate an attachment for the stakeholder email.
     """
+    flush_logs()
     stream.seek(0)
     return "".join([line for line in stream if line.startswith("ERROR")])
 
 
+def drain_log_stream(stream: StringIO) -> str:
+    """Return the contents of a log stream and clear it for the next email.
+
+    Args:
+        stream: A log stream used to generate an attachment for the stakeholder email.
+    """
+    flush_logs()
+    content = stream.getvalue()
+    stream.seek(0)
+    stream.truncate()
+    return content
+
+
+def get_s3_keys_from_event_message(
+    sqs_message: MessageTypeDef, bucket: str, file_type: str, excluded_key_prefix: str
+) -> list[str]:
+    """Get keys of created files from an S3 event notification message.
+
+    Notifications delivered directly from S3 and through SNS are supported. Test
+    events and events for other buckets are ignored.
+
+    Args:
+        sqs_message: An SQS message containing an S3 event notification.
+        bucket: The S3 bucket of the files to retrieve.
+        file_type: The file type to retrieve.
+        excluded_key_prefix: Files with this key prefix will not be retrieved.
+    """
+    from urllib.parse import unquote_plus
+
+    body = json.loads(str(sqs_message["Body"]))
+    if isinstance(body.get("Message"), str):
+        body = json.loads(body["Message"])
+    keys = []
+    for record in body.get("Records", []):
+        if not record.get("eventName", "").startswith("ObjectCreated"):
+            continue
+        if record["s3"]["bucket"]["name"] != bucket:
+            logger.warning(
+                "Ignoring event for bucket: %s", record["s3"]["bucket"]["name"]
+            )
+            continue
+        key = unquote_plus(record["s3"]["object"]["key"])
+        if key.endswith(file_type) and excluded_key_prefix not in key:
+            keys.append(key)
+    return keys
+
+
 def get_dois_from_spreadsheet(doi_csv_file: str) -> Iterator[str]:
     """Retriev DOIs from the Wiley-provided CSV file.
 
     Args:
         doi_csv_file: A CSV file provided by Wiley with DOIs for articles to be processed.
     """
+    import smart_open
+
     with smart_open.open(doi_csv_file, encoding="utf-8-sig") as csvfile:
         yield from csvfile.read().splitlines()
 
 
-def get_crossref_response_from_doi(url: str, doi: str) -> requests.Response:
+def get_crossref_response_from_doi(
+    url: str, doi: str, hedger: RequestHedger | None = None
+) -> requests.Response:
     """Retrieve Crossref response containing work record based on a DOI.
 
     Args:
         url: The URL used to request metadata responses.
         doi: The DOI used to request metadata.
+        hedger: An optional request hedger, which sends the request again if it is
+        slower than most recent Crossref requests.
     """
+    import requests
+
+    def get_work() -> requests.Response:
+        return requests.get(
+            f"{url}{doi}",
+            params={
+                "mailto": "dspace-lib@mit.edu",
+            },
+            timeout=30,
+        )
+
     logger.debug("Requesting metadata for %s%s", url, doi)
-    response = requests.get(
-        f"{url}{doi}",
-        params={
-            "mailto": "dspace-lib@mit.edu",
-        },
-        timeout=30,
-    )
+    response = hedger.call(get_work) if hedger else get_work()
     logger.debug("Response code retrieved from Crossref for %s: %s", doi, response)
     return response
 
@@ -411,12 +808,17 @@ def get_crossref_response_from_doi(url: str, doi: str) -> requests.Response:
 def get_wiley_response(url: str, doi: str) -> requests.Response:
     """Get response from Wiley server based on a DOI.
 
+    The response is streamed, so its body is downloaded as it is read and the caller
+    should close the response.
+
     Args:
         url: The URL used to request article content responses.
         doi: The DOI used to request article content.
     """
+    import requests
+
     logger.debug("Requesting PDF for %s%s", url, doi)
-    response = requests.get(f"{url}{doi}", headers=WILEY_HEADERS, timeout=30)
+    response = requests.get(f"{url}{doi}", headers=WILEY_HEADERS, timeout=30, stream=True)
     logger.debug("Response code retrieved from Wiley server for %s: %s", doi, response)
     return response
 
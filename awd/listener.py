@@ -0,0 +1,304 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import TYPE_CHECKING
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+from awd.concurrency import process_in_order
+from awd.helpers import SQSClient
+from awd.metrics import RUN_METRICS
+from awd.state import DynamoDBStateStore
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable
+
+    from mypy_boto3_sqs.type_defs import MessageTypeDef
+
+    from awd.database import DoiProcessAttempt
+    from awd.scheduler import BackoffSchedule
+    from awd.state import StateStore
+
+logger = logging.getLogger(__name__)
+
+
+class ResultBatch:
+    """Result message deletions and status updates waiting to be flushed.
+
+    Status updates are saved with batched writes before the messages are deleted, so a
+    failed flush leaves the messages to be received and processed again.
+    """
+
+    def __init__(
+        self, sqs_client: SQSClient, state_store: StateStore | None = None
+    ) -> None:
+        self.sqs_client: SQSClient = sqs_client
+        self.state_store: StateStore = state_store or DynamoDBStateStore()
+        self.receipt_handles: list[str] = []
+        self.doi_process_attempts: dict[str, DoiProcessAttempt] = {}
+        self.previous_status_codes: dict[str, float] = {}
+        self.lock: threading.Lock = threading.Lock()
+
+    def add(
+        self,
+        receipt_handle: str,
+        doi_process_attempt: DoiProcessAttempt,
+        previous_status_code: float,
+    ) -> None:
+        """Add a processed result message to the batch.
+
+        Args:
+            receipt_handle: The receipt handle of the result message.
+            doi_process_attempt: The DOI item with its updated status.
+            previous_status_code: The status code of the DOI item before the update,
+            used to update the status counts.
+        """
+        with self.lock:
+            self.receipt_handles.append(receipt_handle)
+            self.doi_process_attempts[doi_process_attempt.doi] = doi_process_attempt
+            self.previous_status_codes.setdefault(
+                doi_process_attempt.doi, previous_status_code
+            )
+
+    def flush(self) -> list[str]:
+        """Save the status updates and delete the messages in the batch.
+
+        Returns the receipt handles of the messages that were in the batch. If the batch
+        cannot be flushed, a ResultBatchFlushError with the receipt handles is raised.
+        """
+        with self.lock:
+            receipt_handles, self.receipt_handles = self.receipt_handles, []
+            doi_process_attempts = list(self.doi_process_attempts.values())
+            self.doi_process_attempts = {}
+            previous_status_codes, self.previous_status_codes = (
+                self.previous_status_codes,
+                {},
+            )
+        if receipt_handles:
+            try:
+                with RUN_METRICS.timer("result_flush"):
+                    self.state_store.save_batch(
+                        doi_process_attempts, previous_status_codes
+                    )
+                    self.sqs_client.delete_batch(receipt_handles)
+            except Exception as exception:
+                raise ResultBatchFlushError(receipt_handles) from exception
+            logger.debug("%s result messages flushed", len(receipt_handles))
+        return receipt_handles
+
+
+class ResultBatchFlushError(Exception):
+    def __init__(self, receipt_handles: list[str]) -> None:
+        super().__init__(f"Unable to flush {len(receipt_handles)} result messages")
+        self.receipt_handles: list[str] = receipt_handles
+
+
+class VisibilityHeartbeat:
+    """A background thread that extends the visibility timeout of in-flight messages."""
+
+    def __init__(
+        self, sqs_client: SQSClient, visibility_timeout: int, interval: float
+    ) -> None:
+        """Initialize visibility heartbeat instance.
+
+        Args:
+            sqs_client: The SQS client for the queue the messages were received from.
+            visibility_timeout: The visibility timeout in seconds set on each extension.
+            interval: The number of seconds between extensions.
+        """
+        self.sqs_client: SQSClient = sqs_client
+        self.visibility_timeout: int = visibility_timeout
+        self.interval: float = interval
+        self.receipt_handles: set[str] = set()
+        self.lock: threading.Lock = threading.Lock()
+        self.stop_event: threading.Event = threading.Event()
+        self.thread: threading.Thread = threading.Thread(target=self.run, daemon=True)
+
+    def add(self, receipt_handles: Iterable[str]) -> None:
+        with self.lock:
+            self.receipt_handles.update(receipt_handles)
+
+    def remove(self, receipt_handles: Iterable[str]) -> None:
+        with self.lock:
+            self.receipt_handles.difference_update(receipt_handles)
+
+    def extend(self) -> None:
+        """Extend the visibility timeout of all in-flight messages."""
+        with self.lock:
+            receipt_handles = list(self.receipt_handles)
+        if not receipt_handles:
+            return
+        try:
+            self.sqs_client.change_visibility_batch(
+                receipt_handles, self.visibility_timeout
+            )
+        except (BotoCoreError, ClientError):
+            logger.exception("Unable to extend visibility timeout of in-flight messages")
+
+    def run(self) -> None:
+        while not self.stop_event.wait(self.interval):
+            self.extend()
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        self.thread.join()
+
+
+class ResultListener:
+    """Continuously process result messages from an SQS queue until stopped.
+
+    Deletions and status updates are flushed in batches on an interval, and a digest
+    of the results is sent on a separate interval and when the listener stops.
+    """
+
+    def __init__(
+        self,
+        sqs_client: SQSClient,
+        retry_threshold: str,
+        send_digest: Callable[[], None],
+        workers: int = 1,
+        partition_by_doi: bool = False,  # noqa: FBT001, FBT002
+        wait_time_seconds: int = 20,
+        visibility_timeout: int = 120,
+        flush_interval: float = 10,
+        digest_interval: float = 3600,
+        state_store: StateStore | None = None,
+        dss_backoff: BackoffSchedule | None = None,
+    ) -> None:
+        """Initialize result listener instance.
+
+        Args:
+            sqs_client: The SQS client for the result message queue.
+            retry_threshold: The number of times to attempt processing an article.
+            send_digest: A function that sends the digest of the results.
+            workers: The number of result messages processed concurrently.
+            partition_by_doi: Whether result messages for the same DOI are processed
+            sequentially on one worker.
+            wait_time_seconds: The number of seconds to long-poll for messages.
+            visibility_timeout: The visibility timeout in seconds for in-flight
+            messages.
+            flush_interval: The number of seconds between flushes of the result batch.
+            digest_interval: The number of seconds between digests.
+            state_store: The store of the DOIs' processing state, which defaults to
+            the DynamoDB table.
+            dss_backoff: The schedule for retrying DOIs with a retryable DSS error,
+            which defaults to the DSS_RETRY settings' defaults.
+        """
+        self.sqs_client: SQSClient = sqs_client
+        self.retry_threshold: str = retry_threshold
+        self.send_digest: Callable[[], None] = send_digest
+        self.workers: int = workers
+        self.partition_by_doi: bool = partition_by_doi
+        self.wait_time_seconds: int = wait_time_seconds
+        self.visibility_timeout: int = visibility_timeout
+        self.flush_interval: float = flush_interval
+        self.digest_interval: float = digest_interval
+        self.stop_event: threading.Event = threading.Event()
+        self.state_store: StateStore = state_store or DynamoDBStateStore()
+        self.dss_backoff: BackoffSchedule | None = dss_backoff
+        self.result_batch: ResultBatch = ResultBatch(sqs_client, self.state_store)
+        self.heartbeat: VisibilityHeartbeat = VisibilityHeartbeat(
+            sqs_client, visibility_timeout, interval=visibility_timeout / 3
+        )
+        self.results_since_digest: int = 0
+
+    def stop(self, *_: object) -> None:
+        """Request a graceful shutdown, usable as a signal handler."""
+        logger.info("Shutdown requested, finishing in-flight result messages")
+        self.stop_event.set()
+
+    def process(self, sqs_messages: list[MessageTypeDef]) -> None:
+        """Process a batch of result messages, adding the results to the batch.
+
+        Args:
+            sqs_messages: The result messages to be processed.
+        """
+
+        def process_result_message(sqs_message: MessageTypeDef) -> None:
+            with RUN_METRICS.timer("result_message"):
+                self.sqs_client.process_result_message(
+                    sqs_message=sqs_message,
+                    retry_threshold=self.retry_threshold,
+                    result_batch=self.result_batch,
+                    state_store=self.state_store,
+                    dss_backoff=self.dss_backoff,
+                )
+
+        for sqs_message, error in process_in_order(
+            process_result_message,
+            sqs_messages,
+            workers=self.workers,
+            partition_key=SQSClient.get_package_id if self.partition_by_doi else None,
+        ):
+            if error:
+                logger.error(
+                    "Error while processing SQS message: %s", sqs_message, exc_info=error
+                )
+                # let the message become visible again instead of holding it
+                self.heartbeat.remove([sqs_message.get("ReceiptHandle", "")])
+            else:
+                self.results_since_digest += 1
+
+    def flush(self) -> None:
+        """Flush the result batch, logging any failure.
+
+        The messages of a batch that cannot be flushed are no longer kept in flight,
+        so they are received and processed again once their visibility timeout expires.
+        """
+        try:
+            receipt_handles = self.result_batch.flush()
+        except ResultBatchFlushError as error:
+            logger.exception("Unable to flush result messages")
+            receipt_handles = error.receipt_handles
+        self.heartbeat.remove(receipt_handles)
+
+    def digest(self) -> None:
+        """Send a digest if any results were processed since the last digest.
+
+        A digest that cannot be sent is logged and attempted again at the next interval.
+        """
+        if not self.results_since_digest:
+            return
+        try:
+            self.send_digest()
+        except Exception:
+            logger.exception("Unable to send the digest of result messages")
+            return
+        self.results_since_digest = 0
+
+    def run(self) -> None:
+        """Process result messages until a shutdown is requested."""
+        logger.info("Listening for result messages on: %s", self.sqs_client.queue_name)
+        self.heartbeat.start()
+        last_flush = last_digest = time.monotonic()
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    sqs_messages = self.sqs_client.receive_batch(
+                        wait_time_seconds=self.wait_time_seconds,
+                        visibility_timeout=self.visibility_timeout,
+                    )
+                except (BotoCoreError, ClientError):
+                    logger.exception("Unable to receive result messages")
+                    self.stop_event.wait(self.wait_time_seconds)
+                    continue
+                self.heartbeat.add(message["ReceiptHandle"] for message in sqs_messages)
+                self.process(sqs_messages)
+                now = time.monotonic()
+                if now - last_flush >= self.flush_interval:
+                    self.flush()
+                    last_flush = now
+                if now - last_digest >= self.digest_interval:
+                    self.flush()
+                    self.digest()
+                    last_digest = now
+        finally:
+            self.flush()
+            self.heartbeat.stop()
+            self.digest()
+        logger.info("Stopped listening for result messages")
@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import atexit
+import contextvars
+import copy
+import datetime
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import io
+    from collections.abc import Iterator
+
+logger = logging.getLogger(__name__)
+
+LOG_FORMATS = ("text", "json")
+TEXT_FORMAT = "%(levelname)-8s %(asctime)s %(message)s"
+# fields added to every record from the context of the thread that logged it
+CONTEXT_FIELDS = ("doi", "stage")
+
+_context: contextvars.ContextVar[dict[str, str]] = contextvars.ContextVar(
+    "log_context", default={}  # noqa: B039
+)
+_lock = threading.Lock()
+_listener: logging.handlers.QueueListener | None = None
+_queue_handler: logging.handlers.QueueHandler | None = None
+
+
+@contextmanager
+def log_context(**fields: str) -> Iterator[None]:
+    """Add fields, such as the DOI or stage, to records logged in the enclosed block.
+
+    Args:
+        fields: The values of the fields in CONTEXT_FIELDS to add.
+    """
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """A filter adding the fields of the logging thread's log context to records.
+
+    Fields already set on a record, such as a record replayed by process_in_order from
+    the thread that created it, are kept.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = _context.get()
+        for field in CONTEXT_FIELDS:
+            if not hasattr(record, field):
+                setattr(record, field, context.get(field))
+        return True
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """A queue handler that leaves formatting to the queue listener's thread.
+
+    The logging thread only copies the record, so message dumps and tracebacks are
+    formatted off the hot path. As with the records buffered by process_in_order,
+    arguments must not be mutated after they are logged.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # the record is shared with any other handlers, which format it themselves
+        return copy.copy(record)
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as JSON objects with the log context fields, one per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.datetime.fromtimestamp(
+                record.created, tz=datetime.UTC
+            ).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(stream: io.StringIO, level: int, log_format: str = "text") -> None:
+    """Log to the console and to the stream for the email reports through a queue.
+
+    Records are put on a queue by the logging thread and written by a listener thread,
+    so worker threads never wait on the handlers. The email stream is always written as
+    text, as the reports are filtered by level name. Like logging.basicConfig, a root
+    logger that already has other handlers is left unchanged.
+
+    Args:
+        stream: The stream collecting the log for the email reports.
+        level: The level of the root logger.
+        log_format: 'text', or 'json' for one JSON object per console record.
+    """
+    global _listener, _queue_handler  # noqa: PLW0603
+
+    if log_format not in LOG_FORMATS:
+        message = f"Unknown log format: {log_format}"
+        raise ValueError(message)
+    root = logging.getLogger()
+    with _lock:
+        if _queue_handler in root.handlers:
+            stop_logging()
+            root.removeHandler(_queue_handler)
+        if root.handlers:
+            return
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(
+            JsonFormatter() if log_format == "json" else logging.Formatter(TEXT_FORMAT)
+        )
+        stream_handler = logging.StreamHandler(stream)
+        stream_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+        log_queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+        _queue_handler = DeferredQueueHandler(log_queue)
+        _queue_handler.addFilter(ContextFilter())
+        _listener = logging.handlers.QueueListener(
+            log_queue, console_handler, stream_handler, respect_handler_level=True
+        )
+        _listener.start()
+        root.addHandler(_queue_handler)
+        root.setLevel(level)
+
+
+def flush_logs() -> None:
+    """Wait until the records logged so far are written by the queue listener."""
+    with _lock:
+        if _listener is not None and _listener._thread is not None:  # noqa: SLF001
+            _listener.stop()
+            _listener.start()
+
+
+def stop_logging() -> None:
+    """Write the queued records and stop the queue listener."""
+    if _listener is not None and _listener._thread is not None:  # noqa: SLF001
+        _listener.stop()
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,99 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class RunMetrics:
+    """Thread-safe stage timings and counters collected during a CLI command run.
+
+    Stage timings are kept in full so that percentiles can be reported. A run processes
+    at most tens of thousands of DOIs, so the samples remain small.
+    """
+
+    def __init__(self) -> None:
+        self.lock: threading.Lock = threading.Lock()
+        self.timings: dict[str, list[float]] = defaultdict(list)
+        self.counters: dict[str, int] = defaultdict(int)
+
+    def record(self, stage: str, seconds: float) -> None:
+        """Record the duration of a stage.
+
+        Args:
+            stage: The name of the stage.
+            seconds: The duration of the stage in seconds.
+        """
+        with self.lock:
+            self.timings[stage].append(seconds)
+
+    def increment(self, counter: str, value: int = 1) -> None:
+        """Increment a counter.
+
+        Args:
+            counter: The name of the counter.
+            value: The amount to add to the counter.
+        """
+        with self.lock:
+            self.counters[counter] += value
+
+    @contextmanager
+    def timer(self, stage: str) -> Iterator[None]:
+        """Record the duration of the enclosed block as a stage, even if it raises.
+
+        Args:
+            stage: The name of the stage.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def reset(self) -> None:
+        """Discard all recorded timings and counters."""
+        with self.lock:
+            self.timings.clear()
+            self.counters.clear()
+
+    def stage_summary(self) -> dict[str, dict[str, float]]:
+        """Summarize the count and the total, mean, p50, p95 and max seconds per stage."""
+        with self.lock:
+            timings = {stage: sorted(values) for stage, values in self.timings.items()}
+        summary = {}
+        for stage, values in sorted(timings.items()):
+            summary[stage] = {
+                "count": len(values),
+                "total": sum(values),
+                "mean": sum(values) / len(values),
+                "p50": values[int(0.5 * (len(values) - 1))],
+                "p95": values[int(0.95 * (len(values) - 1))],
+                "max": values[-1],
+            }
+        return summary
+
+    def report(self) -> str:
+        """Create a plain text report of the stage timings and counters."""
+        lines = [
+            (
+                f"{'stage':<24}{'count':>8}{'total s':>10}{'mean ms':>10}"
+                f"{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}"
+            )
+        ]
+        lines.extend(
+            f"{stage:<24}{int(stats['count']):>8}{stats['total']:>10.2f}"
+            f"{stats['mean'] * 1000:>10.1f}{stats['p50'] * 1000:>10.1f}"
+            f"{stats['p95'] * 1000:>10.1f}{stats['max'] * 1000:>10.1f}"
+            for stage, stats in self.stage_summary().items()
+        )
+        with self.lock:
+            counters = sorted(self.counters.items())
+        lines.extend(f"{counter}: {value}" for counter, value in counters)
+        return "\n".join(lines)
+
+
+# metrics for the current run, shared by all threads
+RUN_METRICS = RunMetrics()
@@ -0,0 +1,110 @@
+import cProfile
+import io
+import logging
+import marshal
+import pstats
+import threading
+from types import FrameType
+
+logger = logging.getLogger(__name__)
+
+
+class ThreadProfile(cProfile.Profile):
+    """A profile of a thread other than the one reading its stats.
+
+    A profiler can only be disabled by its own thread, so its stats are taken as a
+    snapshot while it keeps running.
+    """
+
+    def create_stats(self) -> None:
+        self.snapshot_stats()
+
+
+class RunProfiler:
+    """A cProfile wrapper for profiling a complete CLI command run.
+
+    The raw profile and a summary of the top functions by cumulative time are written
+    to a local path or an S3 URI so slow runs can be diagnosed after the fact. Threads
+    started while the run is profiled, such as the workers processing DOIs, result
+    messages and article I/O, have their own profiles, which are merged with the
+    calling thread's profile. Threads started before profiling, like the log queue
+    listener, are not profiled.
+    """
+
+    def __init__(self, output_path: str, top: int = 25) -> None:
+        """Initialize run profiler instance.
+
+        Args:
+            output_path: The local path or S3 URI for the raw profile. The summary is
+            written alongside it with a '.txt' suffix.
+            top: The number of functions to include in the summary.
+        """
+        self.output_path: str = output_path
+        self.top: int = top
+        self.profiler: cProfile.Profile = cProfile.Profile()
+        self.thread_profiles: list[ThreadProfile] = []
+        self.lock: threading.Lock = threading.Lock()
+        self.running: bool = False
+
+    def profile_thread(self, _frame: FrameType, _event: str, _arg: object) -> None:
+        """Start profiling a new thread, called by threading when the thread starts."""
+        thread_profile = ThreadProfile()
+        with self.lock:
+            self.thread_profiles.append(thread_profile)
+        thread_profile.enable()
+
+    def start(self) -> None:
+        """Start collecting profile data."""
+        threading.setprofile(self.profile_thread)
+        self.profiler.enable()
+        self.running = True
+
+    def stop(self) -> None:
+        """Stop collecting profile data.
+
+        Threads started later are no longer profiled, while threads that are still
+        running, such as idle pool workers, are left to stop on their own.
+        """
+        self.profiler.disable()
+        threading.setprofile(None)
+        self.running = False
+
+    def stats(self) -> pstats.Stats:
+        """Create a snapshot of the profile data collected by all profiled threads.
+
+        Creating stats disables the calling thread's profiler, so it is re-enabled if
+        the run is still being profiled.
+        """
+        with self.lock:
+            thread_profiles = list(self.thread_profiles)
+        stats = pstats.Stats(self.profiler, *thread_profiles)
+        if self.running:
+            self.profiler.enable()
+        return stats
+
+    def summary(self) -> str:
+        """Create a summary of the top functions sorted by cumulative time."""
+        stream = io.StringIO()
+        stats = self.stats()
+        stats.stream = stream  # type: ignore[attr-defined]
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top)
+        return stream.getvalue()
+
+    def write(self) -> None:
+        """Write the raw profile and the summary to the output path."""
+        import smart_open
+
+        stats = self.stats()
+        with smart_open.open(self.output_path, "wb") as profile_file:
+            profile_file.write(marshal.dumps(stats.stats))  # type: ignore[attr-defined]
+        with smart_open.open(f"{self.output_path}.txt", "w") as summary_file:
+            summary_file.write(self.summary())
+        logger.info("Profile written to %s", self.output_path)
+
+    def stop_and_write(self) -> None:
+        """Stop the profiler and write the results, logging any write failure."""
+        self.stop()
+        try:
+            self.write()
+        except Exception:
+            logger.exception("Unable to write profile to %s", self.output_path)
@@ -0,0 +1,251 @@
+from __future__ import annotations
+
+import datetime
+import functools
+import logging
+import statistics
+import threading
+import time
+from collections import deque
+from typing import TYPE_CHECKING
+
+from awd.config import DATE_FORMAT
+from awd.database import DoiProcessAttempt
+from awd.status import Status
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Collection, Iterable, Mapping
+
+logger = logging.getLogger(__name__)
+
+SortKey = tuple[str | float, ...]
+
+# seconds reserved at the end of a time budget for the reporting and email tail
+TIME_BUDGET_RESERVE_SECONDS = 60
+# predicted DOI latency in seconds until enough DOIs have been observed
+INITIAL_DOI_LATENCY_SECONDS = 30.0
+MIN_LATENCY_OBSERVATIONS = 5
+
+
+def oldest_first(_new_dois: Collection[str], item: DoiProcessAttempt) -> SortKey:
+    # last_modified uses DATE_FORMAT, which sorts chronologically as a string
+    return (item.last_modified,)
+
+
+def fewest_attempts_first(_new_dois: Collection[str], item: DoiProcessAttempt) -> SortKey:
+    return (item.process_attempts, item.last_modified)
+
+
+def new_first(new_dois: Collection[str], item: DoiProcessAttempt) -> SortKey:
+    return (int(item.doi not in new_dois), item.last_modified)
+
+
+# each policy returns a sort key for a DOI item given the newly ingested DOIs
+POLICIES: dict[str, Callable[[Collection[str], DoiProcessAttempt], SortKey]] = {
+    "oldest": oldest_first,
+    "fewest-attempts": fewest_attempts_first,
+    "new": new_first,
+}
+
+
+class DoiScheduler:
+    """Order unprocessed DOIs so the DOIs that most need attention are processed first.
+
+    Each policy orders all DOIs by its own key. With multiple policies, DOIs are taken
+    from each ordering in turn, as many as the policy's weight, skipping DOIs already
+    scheduled, so every policy receives its share of the run's throughput.
+    """
+
+    def __init__(self, weights: Mapping[str, int]) -> None:
+        """Initialize DOI scheduler instance.
+
+        Args:
+            weights: The weight of each policy, keyed by policy name.
+        """
+        unknown_policies = set(weights) - set(POLICIES)
+        if unknown_policies:
+            message = (
+                f"Unknown scheduling policies: {', '.join(sorted(unknown_policies))}. "
+                f"Valid policies: {', '.join(POLICIES)}"
+            )
+            raise ValueError(message)
+        if not weights or any(weight < 1 for weight in weights.values()):
+            message = "At least one policy is required and weights must be at least 1"
+            raise ValueError(message)
+        self.weights: dict[str, int] = dict(weights)
+
+    @classmethod
+    def from_spec(cls, spec: str) -> DoiScheduler:
+        """Create a scheduler from a specification such as 'oldest:2,new:1'.
+
+        A policy without a weight has a weight of 1.
+
+        Args:
+            spec: Comma-separated policy names with optional ':<weight>' suffixes.
+        """
+        weights = {}
+        for policy_spec in spec.split(","):
+            policy, _, weight = policy_spec.strip().partition(":")
+            weights[policy] = int(weight) if weight else 1
+        return cls(weights)
+
+    def order(
+        self, doi_process_attempts: Iterable[DoiProcessAttempt], new_dois: Collection[str]
+    ) -> list[str]:
+        """Order DOIs for processing.
+
+        Args:
+            doi_process_attempts: The DOI items to be ordered.
+            new_dois: The DOIs added to the DOI table from spreadsheets during this run.
+        """
+        items = list(doi_process_attempts)
+        orderings = [
+            (
+                weight,
+                deque(sorted(items, key=functools.partial(POLICIES[policy], new_dois))),
+            )
+            for policy, weight in self.weights.items()
+        ]
+        scheduled: list[str] = []
+        seen: set[str] = set()
+        while len(scheduled) < len(items):
+            for weight, ordering in orderings:
+                taken = 0
+                while ordering and taken < weight:
+                    doi = ordering.popleft().doi
+                    if doi not in seen:
+                        seen.add(doi)
+                        scheduled.append(doi)
+                        taken += 1
+        return scheduled
+
+
+def unprocessed_doi_candidates(
+    doi_process_attempts: Iterable[DoiProcessAttempt], new_dois: Iterable[str]
+) -> list[DoiProcessAttempt]:
+    """Select the unprocessed DOI items to be scheduled.
+
+    Newly added DOIs missing from the items, as a read of the index may not yet
+    include recent writes, are added as unprocessed items with no attempts. DOIs that
+    were already in the DOI table must not be passed as new DOIs, as they may have
+    been processed or not be due.
+
+    Args:
+        doi_process_attempts: The due unprocessed DOI items in the DOI table.
+        new_dois: The DOIs added to the DOI table from spreadsheets during this run.
+    """
+    items = {item.doi: item for item in doi_process_attempts}
+    candidates = [
+        item for item in items.values() if item.status_code == Status.UNPROCESSED.value
+    ]
+    now = datetime.datetime.now(tz=datetime.UTC).strftime(DATE_FORMAT)
+    candidates.extend(
+        DoiProcessAttempt(
+            doi=doi,
+            process_attempts=0,
+            last_modified=now,
+            status_code=Status.UNPROCESSED.value,
+        )
+        for doi in dict.fromkeys(new_dois)
+        if doi not in items
+    )
+    return candidates
+
+
+class RunDeadline:
+    """Decide whether a run can start another DOI and still finish within its budget.
+
+    A DOI is only started if it is predicted to finish before the deadline, using the
+    95th percentile of the latencies observed so far. The deadline can also be expired
+    early, for example when the task receives SIGTERM.
+    """
+
+    def __init__(
+        self,
+        time_budget: float | None,
+        reserve: float = TIME_BUDGET_RESERVE_SECONDS,
+        initial_latency: float = INITIAL_DOI_LATENCY_SECONDS,
+    ) -> None:
+        """Initialize run deadline instance.
+
+        Args:
+            time_budget: The number of seconds the run may take from now, or None for
+            no limit.
+            reserve: The number of seconds at the end of the budget reserved for work
+            after the DOIs are processed.
+            initial_latency: The predicted DOI latency in seconds until enough DOIs
+            have been observed.
+        """
+        self.deadline: float | None = (
+            time.monotonic() + time_budget - reserve if time_budget is not None else None
+        )
+        self.initial_latency: float = initial_latency
+        self.latencies: list[float] = []
+        self.lock: threading.Lock = threading.Lock()
+        self.expired: threading.Event = threading.Event()
+
+    def expire(self, *_: object) -> None:
+        """Stop starting DOIs, usable as a signal handler."""
+        logger.info("Deadline expired, finishing in-flight DOIs")
+        self.expired.set()
+
+    def observe(self, seconds: float) -> None:
+        """Record the latency of a processed DOI.
+
+        Args:
+            seconds: The number of seconds the DOI took to process.
+        """
+        with self.lock:
+            self.latencies.append(seconds)
+
+    def predicted_latency(self) -> float:
+        """Predict the latency of the next DOI in seconds."""
+        with self.lock:
+            latencies = list(self.latencies)
+        if len(latencies) < MIN_LATENCY_OBSERVATIONS:
+            return max([self.initial_latency, *latencies])
+        return statistics.quantiles(latencies, n=20)[-1]
+
+    def allows_start(self) -> bool:
+        """Whether a DOI started now is predicted to finish before the deadline."""
+        if self.expired.is_set():
+            return False
+        if self.deadline is None:
+            return True
+        return time.monotonic() + self.predicted_latency() <= self.deadline
+
+
+class BackoffSchedule:
+    """An exponential backoff schedule for retrying a DOI after a failure.
+
+    The delay doubles with each attempt up to a maximum, and the DOI is given up on
+    once its attempts reach the threshold.
+    """
+
+    def __init__(self, base_seconds: float, max_seconds: float, threshold: int) -> None:
+        """Initialize backoff schedule instance.
+
+        Args:
+            base_seconds: The number of seconds to wait after the first attempt.
+            max_seconds: The maximum number of seconds to wait after an attempt.
+            threshold: The number of attempts after which the DOI is given up on.
+        """
+        self.base_seconds: float = base_seconds
+        self.max_seconds: float = max_seconds
+        self.threshold: int = threshold
+
+    def delay(self, attempts: int) -> float:
+        """Get the number of seconds to wait after an attempt.
+
+        Args:
+            attempts: The number of attempts made so far, including the last one.
+        """
+        return min(self.base_seconds * 2 ** max(attempts - 1, 0), self.max_seconds)
+
+    def exhausted(self, attempts: int) -> bool:
+        """Whether no further attempt should be made.
+
+        Args:
+            attempts: The number of attempts made so far, including the last one.
+        """
+        return attempts >= self.threshold
@@ -0,0 +1,533 @@
+from __future__ import annotations
+
+import datetime
+import logging
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING
+
+from pynamodb.exceptions import DoesNotExist, PynamoDBException
+
+from awd.config import DATE_FORMAT
+from awd.database import DoiLeaseLostError, DoiProcessAttempt, StatusCounts
+from awd.status import Status
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator, Mapping
+
+    from awd.archive import DoiArchive
+
+logger = logging.getLogger(__name__)
+
+# errors raised by a state store when it cannot be read or written
+STATE_STORE_ERRORS = (PynamoDBException, sqlite3.Error)
+
+SQLITE_COLUMNS = (
+    "doi",
+    "process_attempts",
+    "last_modified",
+    "status_code",
+    "last_modified_ts",
+    "next_attempt_at",
+    "lease_owner",
+    "lease_expires_at",
+    "content_attempts",
+)
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS doi_process_attempts (
+    doi TEXT PRIMARY KEY,
+    process_attempts INTEGER NOT NULL,
+    last_modified TEXT NOT NULL,
+    status_code INTEGER NOT NULL,
+    last_modified_ts REAL,
+    next_attempt_at REAL,
+    lease_owner TEXT,
+    lease_expires_at REAL,
+    content_attempts INTEGER
+);
+CREATE INDEX IF NOT EXISTS status_next_attempt_index
+    ON doi_process_attempts (status_code, next_attempt_at);
+"""
+SQLITE_SELECT = (
+    f"SELECT {', '.join(SQLITE_COLUMNS)} FROM doi_process_attempts"  # noqa: S608
+)
+SQLITE_ASSIGNMENTS = ", ".join(f"{column} = ?" for column in SQLITE_COLUMNS[1:])
+SQLITE_REPLACE = (
+    f"INSERT OR REPLACE INTO doi_process_attempts ({', '.join(SQLITE_COLUMNS)}) "  # noqa: S608
+    f"VALUES ({', '.join('?' * len(SQLITE_COLUMNS))})"
+)
+
+
+class StateStore(ABC):
+    """The store of the processing state of each DOI.
+
+    DOI items are DoiProcessAttempt instances whatever the backend, but they are only
+    read and written through the store, so the DOI table can be replaced, for example
+    by a local SQLite database for load tests and dry runs.
+    """
+
+    name: str
+
+    @abstractmethod
+    def exists(self) -> bool:
+        """Check whether the store can be read."""
+
+    @abstractmethod
+    def add(self, doi: str, archive: DoiArchive | None = None) -> bool:
+        """Add a DOI as unprocessed unless it is in the store or the archive.
+
+        Returns whether the DOI was added.
+
+        Args:
+            doi: The DOI to be added.
+            archive: An optional archive of DOI items expired from the store.
+        """
+
+    def add_batch(
+        self, dois: Iterable[str], archive: DoiArchive | None = None
+    ) -> list[str]:
+        """Add DOIs as unprocessed unless they are in the store or the archive.
+
+        Returns the DOIs that were added.
+
+        Args:
+            dois: The DOIs to be added.
+            archive: An optional archive of DOI items expired from the store.
+        """
+        return [doi for doi in dois if self.add(doi, archive=archive)]
+
+    @abstractmethod
+    def get(self, doi: str) -> DoiProcessAttempt:
+        """Get the item of a DOI, raising DoesNotExist if it is not in the store.
+
+        Args:
+            doi: The DOI of the item.
+        """
+
+    @abstractmethod
+    def acquire_lease(
+        self, item: DoiProcessAttempt, owner: str, lease_seconds: float
+    ) -> bool:
+        """Acquire the lease for processing an unprocessed DOI item.
+
+        Returns False if the lease is held by another process or the DOI is no longer
+        unprocessed.
+
+        Args:
+            item: The DOI item.
+            owner: A unique identifier of the process acquiring the lease.
+            lease_seconds: The number of seconds until the lease expires.
+        """
+
+    @abstractmethod
+    def release_lease(self, item: DoiProcessAttempt, owner: str) -> None:
+        """Release the lease on a DOI item if it is still held by the owner.
+
+        Args:
+            item: The DOI item.
+            owner: The identifier of the process that acquired the lease.
+        """
+
+    @abstractmethod
+    def increment_process_attempts(
+        self, item: DoiProcessAttempt, lease_owner: str | None = None
+    ) -> None:
+        """Increment and save the process attempts of a DOI item.
+
+        Args:
+            item: The DOI item.
+            lease_owner: The identifier of the process holding the DOI's lease, if
+            any. DoiLeaseLostError is raised if it no longer holds the lease.
+        """
+
+    @abstractmethod
+    def update_status(
+        self,
+        item: DoiProcessAttempt,
+        status_code: int,
+        next_attempt_at: float | None = None,
+        lease_owner: str | None = None,
+    ) -> None:
+        """Set and save the status of a DOI item.
+
+        Args:
+            item: The DOI item.
+            status_code: The status code to be set for the item.
+            next_attempt_at: The epoch seconds of the earliest next attempt of an
+            unprocessed DOI, defaulting to now.
+            lease_owner: The identifier of the process holding the DOI's lease, if
+            any. DoiLeaseLostError is raised if it no longer holds the lease.
+        """
+
+    @abstractmethod
+    def save_batch(
+        self,
+        items: Iterable[DoiProcessAttempt],
+        previous_status_codes: Mapping[str, float],
+    ) -> None:
+        """Save DOI items whose status was set without saving them.
+
+        Args:
+            items: The DOI items to be saved.
+            previous_status_codes: The status code of each DOI before it was set.
+        """
+
+    @abstractmethod
+    def retrieve_due(self, now: float | None = None) -> Iterator[DoiProcessAttempt]:
+        """Retrieve the unprocessed DOI items whose next attempt is due.
+
+        Args:
+            now: The epoch seconds at which attempts are due, defaulting to now.
+        """
+
+    @abstractmethod
+    def retrieve_unprocessed_dois(self) -> list[str]:
+        """Retrieve all unprocessed DOIs."""
+
+    @abstractmethod
+    def status_counts(
+        self, *, reconcile: bool = False, segments: int = 4
+    ) -> dict[str, int]:
+        """Get the number of DOIs in each status, keyed by status name.
+
+        Args:
+            reconcile: Whether to recount the DOIs in each status and save the counts.
+            segments: The number of scan segments read concurrently when reconciling.
+        """
+
+
+class DynamoDBStateStore(StateStore):
+    """A state store backed by the DynamoDB DOI table."""
+
+    def __init__(self, table_name: str | None = None) -> None:
+        """Initialize DynamoDB state store instance.
+
+        Args:
+            table_name: The name of the DynamoDB table, if not already set.
+        """
+        if table_name is not None:
+            DoiProcessAttempt.set_table_name(table_name)
+        self.name: str = f"DynamoDB table {DoiProcessAttempt.Meta.table_name}"
+
+    def exists(self) -> bool:
+        return DoiProcessAttempt.exists()
+
+    def add(self, doi: str, archive: DoiArchive | None = None) -> bool:
+        return DoiProcessAttempt.check_doi_and_add_to_table(doi, archive=archive)
+
+    def get(self, doi: str) -> DoiProcessAttempt:
+        return DoiProcessAttempt.get(doi)
+
+    def acquire_lease(
+        self, item: DoiProcessAttempt, owner: str, lease_seconds: float
+    ) -> bool:
+        return item.acquire_lease(owner, lease_seconds)
+
+    def release_lease(self, item: DoiProcessAttempt, owner: str) -> None:
+        item.release_lease(owner)
+
+    def increment_process_attempts(
+        self, item: DoiProcessAttempt, lease_owner: str | None = None
+    ) -> None:
+        item.increment_process_attempts(lease_owner=lease_owner)
+
+    def update_status(
+        self,
+        item: DoiProcessAttempt,
+        status_code: int,
+        next_attempt_at: float | None = None,
+        lease_owner: str | None = None,
+    ) -> None:
+        item.update_status(
+            status_code=status_code,
+            next_attempt_at=next_attempt_at,
+            lease_owner=lease_owner,
+        )
+
+    def save_batch(
+        self,
+        items: Iterable[DoiProcessAttempt],
+        previous_status_codes: Mapping[str, float],
+    ) -> None:
+        items = list(items)
+        DoiProcessAttempt.save_batch(items)
+        StatusCounts.apply(
+            change
+            for item in items
+            for change in (
+                (previous_status_codes[item.doi], -1),
+                (item.status_code, 1),
+            )
+        )
+
+    def retrieve_due(self, now: float | None = None) -> Iterator[DoiProcessAttempt]:
+        return DoiProcessAttempt.retrieve_due_doi_process_attempts(now=now)
+
+    def retrieve_unprocessed_dois(self) -> list[str]:
+        return DoiProcessAttempt.retrieve_unprocessed_dois()
+
+    def status_counts(
+        self, *, reconcile: bool = False, segments: int = 4
+    ) -> dict[str, int]:
+        if reconcile:
+            return StatusCounts.reconcile(segments=segments)
+        return StatusCounts.read()
+
+
+class SQLiteStateStore(StateStore):
+    """A state store backed by an indexed SQLite database, in memory or in a file.
+
+    The database has no network round trips, so it is suited to load tests and dry
+    runs. A file database can be shared by the deposit and listen commands on one
+    host, and the leases keep concurrent deposit processes from processing the same
+    DOI. Status counts are always exact, as they are counted with the status index.
+    """
+
+    def __init__(self, path: str = ":memory:") -> None:
+        """Initialize SQLite state store instance, creating the database if needed.
+
+        Args:
+            path: The path of the database file, or ':memory:' for a database that
+            only lasts as long as the store.
+        """
+        self.name: str = f"SQLite database {path}"
+        # one connection is shared by the worker threads, serialized by the lock
+        self.connection: sqlite3.Connection = sqlite3.connect(
+            path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self.lock: threading.Lock = threading.Lock()
+        with self.lock:
+            if path != ":memory:":
+                self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.executescript(SQLITE_SCHEMA)
+
+    @staticmethod
+    def item_from_row(row: tuple) -> DoiProcessAttempt:
+        """Create a DOI item from a database row.
+
+        Args:
+            row: The values of the SQLITE_COLUMNS of the row.
+        """
+        return DoiProcessAttempt(**dict(zip(SQLITE_COLUMNS, row, strict=True)))
+
+    def save(self, items: Iterable[DoiProcessAttempt]) -> None:
+        """Write DOI items to the database in one transaction.
+
+        Args:
+            items: The DOI items to be saved.
+        """
+        rows = [
+            tuple(getattr(item, column) for column in SQLITE_COLUMNS) for item in items
+        ]
+        with self.lock, self.connection:
+            self.connection.executemany(SQLITE_REPLACE, rows)
+
+    def exists(self) -> bool:
+        return True
+
+    def add(self, doi: str, archive: DoiArchive | None = None) -> bool:
+        return bool(self.add_batch([doi], archive=archive))
+
+    def add_batch(
+        self, dois: Iterable[str], archive: DoiArchive | None = None
+    ) -> list[str]:
+        dois = list(dict.fromkeys(dois))
+        with self.lock:
+            existing_dois = {
+                doi
+                for doi in dois
+                if self.connection.execute(
+                    "SELECT 1 FROM doi_process_attempts WHERE doi = ?", (doi,)
+                ).fetchone()
+            }
+        new_dois = []
+        for doi in dois:
+            if doi in existing_dois:
+                logger.debug("%s already in table", doi)
+            elif archive is not None and archive.contains(doi):
+                logger.debug("%s already archived, not added to table", doi)
+            else:
+                new_dois.append(doi)
+        now = datetime.datetime.now(tz=datetime.UTC)
+        last_modified, last_modified_ts = now.strftime(DATE_FORMAT), now.timestamp()
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO doi_process_attempts "
+                "(doi, process_attempts, last_modified, status_code, last_modified_ts, "
+                "next_attempt_at) VALUES (?, 0, ?, ?, ?, ?)",
+                [
+                    (
+                        doi,
+                        last_modified,
+                        Status.UNPROCESSED.value,
+                        last_modified_ts,
+                        last_modified_ts,
+                    )
+                    for doi in new_dois
+                ],
+            )
+        logger.debug("%s DOIs added to table", len(new_dois))
+        return new_dois
+
+    def get(self, doi: str) -> DoiProcessAttempt:
+        with self.lock:
+            row = self.connection.execute(
+                f"{SQLITE_SELECT} WHERE doi = ?", (doi,)
+            ).fetchone()
+        if row is None:
+            raise DoesNotExist
+        return self.item_from_row(row)
+
+    def acquire_lease(
+        self, item: DoiProcessAttempt, owner: str, lease_seconds: float
+    ) -> bool:
+        now = time.time()
+        with self.lock, self.connection:
+            row = self.connection.execute(
+                "SELECT lease_owner FROM doi_process_attempts WHERE doi = ?", (item.doi,)
+            ).fetchone()
+            acquired = self.connection.execute(
+                "UPDATE doi_process_attempts SET lease_owner = ?, lease_expires_at = ? "
+                "WHERE doi = ? AND status_code = ? "
+                "AND (lease_owner IS NULL OR lease_expires_at < ?)",
+                (owner, now + lease_seconds, item.doi, Status.UNPROCESSED.value, now),
+            ).rowcount
+        if not acquired:
+            logger.debug("Lease on %s not acquired by %s", item.doi, owner)
+            return False
+        if row is not None and row[0] is not None:
+            logger.info(
+                "Expired lease on %s reclaimed from %s by %s", item.doi, row[0], owner
+            )
+        item.lease_owner = owner
+        item.lease_expires_at = now + lease_seconds
+        logger.debug("Lease on %s acquired by %s", item.doi, owner)
+        return True
+
+    def release_lease(self, item: DoiProcessAttempt, owner: str) -> None:
+        with self.lock, self.connection:
+            released = self.connection.execute(
+                "UPDATE doi_process_attempts "
+                "SET lease_owner = NULL, lease_expires_at = NULL "
+                "WHERE doi = ? AND lease_owner = ?",
+                (item.doi, owner),
+            ).rowcount
+        if not released:
+            logger.warning("Lease on %s was no longer held by %s", item.doi, owner)
+            return
+        item.lease_owner = None
+        item.lease_expires_at = None
+        logger.debug("Lease on %s released by %s", item.doi, owner)
+
+    def save_leased(self, item: DoiProcessAttempt, lease_owner: str | None) -> None:
+        """Save a DOI item, on condition that its lease is still held by the owner.
+
+        Args:
+            item: The DOI item to be saved.
+            lease_owner: The identifier of the process holding the DOI's lease, or None
+            to save the item unconditionally.
+        """
+        if lease_owner is None:
+            self.save([item])
+            return
+        with self.lock:
+            updated = self.connection.execute(
+                f"UPDATE doi_process_attempts SET {SQLITE_ASSIGNMENTS} "  # noqa: S608
+                "WHERE doi = ? AND lease_owner = ?",
+                (
+                    *(getattr(item, column) for column in SQLITE_COLUMNS[1:]),
+                    item.doi,
+                    lease_owner,
+                ),
+            ).rowcount
+        if not updated:
+            logger.warning(
+                "Lease on %s was lost by %s, the item was not saved",
+                item.doi,
+                lease_owner,
+            )
+            raise DoiLeaseLostError
+
+    def increment_process_attempts(
+        self, item: DoiProcessAttempt, lease_owner: str | None = None
+    ) -> None:
+        item.process_attempts += 1
+        item.set_last_modified()
+        self.save_leased(item, lease_owner)
+        logger.debug(
+            "%s process attempts updated to: %s", item.doi, item.process_attempts
+        )
+
+    def update_status(
+        self,
+        item: DoiProcessAttempt,
+        status_code: int,
+        next_attempt_at: float | None = None,
+        lease_owner: str | None = None,
+    ) -> None:
+        item.set_status(status_code=status_code, next_attempt_at=next_attempt_at)
+        self.save_leased(item, lease_owner)
+        logger.debug("%s status updated to: %s", item.doi, item.status_code)
+
+    def save_batch(
+        self,
+        items: Iterable[DoiProcessAttempt],
+        previous_status_codes: Mapping[str, float],  # noqa: ARG002
+    ) -> None:
+        self.save(items)
+
+    def retrieve_due(self, now: float | None = None) -> Iterator[DoiProcessAttempt]:
+        with self.lock:
+            rows = self.connection.execute(
+                f"{SQLITE_SELECT} WHERE status_code = ? AND next_attempt_at <= ? "
+                "ORDER BY next_attempt_at",
+                (Status.UNPROCESSED.value, time.time() if now is None else now),
+            ).fetchall()
+        return (self.item_from_row(row) for row in rows)
+
+    def retrieve_unprocessed_dois(self) -> list[str]:
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT doi FROM doi_process_attempts WHERE status_code = ?",
+                (Status.UNPROCESSED.value,),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def status_counts(
+        self,
+        *,
+        reconcile: bool = False,  # noqa: ARG002
+        segments: int = 4,  # noqa: ARG002
+    ) -> dict[str, int]:
+        with self.lock:
+            counts = dict(
+                self.connection.execute(
+                    "SELECT status_code, COUNT(*) FROM doi_process_attempts "
+                    "GROUP BY status_code"
+                ).fetchall()
+            )
+        return {status.name: counts.get(status.value, 0) for status in Status}
+
+
+def create_state_store(url: str | None, table_name: str) -> StateStore:
+    """Create the state store selected by a STATE_STORE URL.
+
+    SQLite URLs have an empty host, so the path follows a third slash:
+    'sqlite:///state.db' is relative to the working directory and
+    'sqlite:////tmp/state.db' is absolute.
+
+    Args:
+        url: 'dynamodb' or None for the DynamoDB table, 'sqlite:///<path>' for an
+        SQLite database file, or 'sqlite://' for an in-memory SQLite database.
+        table_name: The name of the DynamoDB table.
+    """
+    if not url or url == "dynamodb":
+        return DynamoDBStateStore(table_name)
+    if url == "sqlite://":
+        return SQLiteStateStore(":memory:")
+    if url.startswith("sqlite:///") and url != "sqlite:///":
+        return SQLiteStateStore(url.removeprefix("sqlite:///"))
+    message = f"Unknown state store: {url}"
+    raise ValueError(message)
@@ -0,0 +1,298 @@
+from __future__ import annotations
+
+import io
+import logging
+import os
+import shutil
+import tempfile
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+logger = logging.getLogger(__name__)
+
+# prefix of the temporary files written before they are renamed to their key
+LOCAL_TEMP_PREFIX = ".awd-tmp-"
+LOCAL_CHUNK_BYTES = 1024 * 1024
+
+
+class ObjectStore(ABC):
+    """A store of files by bucket and key, such as S3 or a local directory."""
+
+    @abstractmethod
+    def uri(self, bucket: str, key: str) -> str:
+        """Get the URI of a file, which can be opened with smart_open.
+
+        Args:
+            bucket: The bucket containing the file.
+            key: The key of the file.
+        """
+
+    @abstractmethod
+    def check_bucket_access(self, bucket: str) -> bool:
+        """Check whether a bucket can be read, logging the error if it cannot.
+
+        Args:
+            bucket: The bucket to check.
+        """
+
+    @abstractmethod
+    def archive_file_with_new_key(
+        self, bucket: str, key: str, archived_key_prefix: str
+    ) -> None:
+        """Update the key of the specified file to archive it from processing.
+
+        Args:
+            bucket: The bucket containing the files to be archived.
+            key: The key of the file to archive.
+            archived_key_prefix: The prefix to be applied to the archived file.
+        """
+
+    @abstractmethod
+    def copy_file(self, bucket: str, key: str, new_key: str) -> None:
+        """Copy a file to a new key in the same bucket.
+
+        Args:
+            bucket: The bucket containing the file.
+            key: The key of the file to copy.
+            new_key: The key of the copy.
+        """
+
+    @abstractmethod
+    def delete_files(self, bucket: str, keys: list[str]) -> None:
+        """Delete files from a specified bucket.
+
+        Args:
+            bucket: The bucket containing the files.
+            keys: The keys of the files to delete.
+        """
+
+    @abstractmethod
+    def file_exists(self, bucket: str, key: str) -> bool:
+        """Check whether a file exists in a specified bucket.
+
+        Args:
+            bucket: The bucket to check.
+            key: The key of the file.
+        """
+
+    @abstractmethod
+    def get_file(self, bucket: str, key: str) -> bytes:
+        """Get the content of a file in a specified bucket.
+
+        Args:
+            bucket: The bucket containing the file.
+            key: The key of the file.
+        """
+
+    @abstractmethod
+    def list_keys(self, bucket: str, prefix: str) -> Iterator[str]:
+        """List the keys of the files with a prefix in a specified bucket.
+
+        Args:
+            bucket: The bucket to search.
+            prefix: The key prefix of the files to list.
+        """
+
+    @abstractmethod
+    def list_children(self, bucket: str, prefix: str) -> Iterator[str]:
+        """List the keys and subprefixes directly under a prefix in a bucket.
+
+        Subprefixes end with '/', as in an S3 listing with the delimiter '/', so the
+        files below them can be listed separately or skipped.
+
+        Args:
+            bucket: The bucket to search.
+            prefix: The key prefix to list, which is empty or ends with '/'.
+        """
+
+    @abstractmethod
+    def put_file(
+        self, file_content: str | bytes | BinaryIO, bucket: str, key: str
+    ) -> None:
+        """Put a file in a specified bucket with a specified key.
+
+        Args:
+            file_content: The content of the file to be uploaded, or a binary file
+            object that is streamed to the bucket.
+            bucket: The bucket where the file will be uploaded.
+            key: The key to be used for the uploaded file.
+        """
+
+    def retrieve_file_type_from_bucket(
+        self, bucket: str, file_type: str, excluded_key_prefix: str
+    ) -> Iterator[str]:
+        """Retrieve file based on file type, bucket, and without excluded prefix.
+
+        Args:
+            bucket: The bucket to search.
+            file_type: The file type to retrieve.
+            excluded_key_prefix: Files with this key prefix will not be retrieved.
+        """
+
+        def retrieve_under(prefix: str) -> Iterator[str]:
+            for child in self.list_children(bucket, prefix):
+                if excluded_key_prefix in child:
+                    continue
+                if child.endswith("/"):
+                    yield from retrieve_under(child)
+                elif child.endswith(file_type):
+                    yield child
+
+        # excluded prefixes are skipped rather than listed, as the archived
+        # spreadsheets and DOI items under them grow with every run
+        return retrieve_under("")
+
+
+class LocalObjectStore(ObjectStore):
+    """An object store in a local directory, with a subdirectory for each bucket.
+
+    The layout mirrors S3, so a bucket directory staged locally can be copied to S3
+    with 'aws s3 sync'. Files are written to a temporary file and renamed, so readers
+    never see a partial file, and files are copied and archived without passing their
+    content through Python where the operating system allows it.
+    """
+
+    def __init__(self, root: str) -> None:
+        """Initialize local object store instance.
+
+        Args:
+            root: The directory containing a directory for each bucket.
+        """
+        self.root: Path = Path(root).resolve()
+
+    def path(self, bucket: str, key: str) -> Path:
+        """Get the path of a file.
+
+        Args:
+            bucket: The bucket containing the file.
+            key: The key of the file.
+        """
+        return self.root / bucket / key
+
+    def uri(self, bucket: str, key: str) -> str:
+        return self.path(bucket, key).as_uri()
+
+    def check_bucket_access(self, bucket: str) -> bool:
+        if not (self.root / bucket).is_dir():
+            logger.error(
+                "Error accessing bucket: %s, %s is not a directory",
+                bucket,
+                self.root / bucket,
+            )
+            return False
+        return True
+
+    def archive_file_with_new_key(
+        self, bucket: str, key: str, archived_key_prefix: str
+    ) -> None:
+        archived_path = self.path(bucket, f"{archived_key_prefix}/{key}")
+        archived_path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(self.path(bucket, key), archived_path)
+
+    def copy_file(self, bucket: str, key: str, new_key: str) -> None:
+        with self.path(bucket, key).open("rb") as source:
+            self.put_file(source, bucket, new_key)
+
+    def delete_files(self, bucket: str, keys: list[str]) -> None:
+        for key in keys:
+            self.path(bucket, key).unlink(missing_ok=True)
+        logger.debug("%s files deleted from local bucket: %s", len(keys), bucket)
+
+    def file_exists(self, bucket: str, key: str) -> bool:
+        return self.path(bucket, key).is_file()
+
+    def get_file(self, bucket: str, key: str) -> bytes:
+        return self.path(bucket, key).read_bytes()
+
+    def list_keys(self, bucket: str, prefix: str) -> Iterator[str]:
+        bucket_path = self.root / bucket
+        # only the deepest directory of the prefix is walked
+        start = bucket_path / prefix.rpartition("/")[0]
+        for directory, directory_names, file_names in os.walk(start):
+            directory_names.sort()
+            for file_name in sorted(file_names):
+                if file_name.startswith(LOCAL_TEMP_PREFIX):
+                    continue
+                key = Path(directory, file_name).relative_to(bucket_path).as_posix()
+                if key.startswith(prefix):
+                    yield key
+
+    def list_children(self, bucket: str, prefix: str) -> Iterator[str]:
+        try:
+            entries = sorted(os.scandir(self.path(bucket, prefix)), key=lambda e: e.name)
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            if entry.is_dir():
+                yield f"{prefix}{entry.name}/"
+            elif not entry.name.startswith(LOCAL_TEMP_PREFIX):
+                yield f"{prefix}{entry.name}"
+
+    def put_file(
+        self, file_content: str | bytes | BinaryIO, bucket: str, key: str
+    ) -> None:
+        path = self.path(bucket, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        file_descriptor, temp_path = tempfile.mkstemp(
+            prefix=LOCAL_TEMP_PREFIX, dir=path.parent
+        )
+        try:
+            with open(file_descriptor, "wb") as temp_file:
+                if isinstance(file_content, str):
+                    temp_file.write(file_content.encode())
+                elif isinstance(file_content, bytes):
+                    temp_file.write(file_content)
+                else:
+                    copy_stream(file_content, temp_file)
+            os.replace(temp_path, path)
+        except BaseException:
+            Path(temp_path).unlink(missing_ok=True)
+            raise
+        logger.debug("%s written to %s", key, path)
+
+
+def copy_stream(source: BinaryIO, destination: BinaryIO) -> None:
+    """Copy the rest of a binary stream to a file.
+
+    A source backed by a file is copied by the kernel with sendfile, so its content is
+    not read into Python; other sources are copied in chunks.
+
+    Args:
+        source: The binary stream to copy from its current position.
+        destination: The file to write to.
+    """
+    try:
+        source_descriptor = source.fileno()
+        offset = source.tell()
+        size = os.fstat(source_descriptor).st_size
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        shutil.copyfileobj(source, destination, LOCAL_CHUNK_BYTES)
+        return
+    destination.flush()
+    while offset < size:
+        sent = os.sendfile(destination.fileno(), source_descriptor, offset, size - offset)
+        if not sent:
+            break
+        offset += sent
+    source.seek(offset)
+
+
+def create_object_store(url: str | None) -> ObjectStore:
+    """Create the object store selected by an OBJECT_STORE URL.
+
+    Args:
+        url: 's3' or None for S3, or 'file://<path>' for a local directory with a
+        subdirectory for each bucket.
+    """
+    if not url or url == "s3":
+        from awd.helpers import S3Client
+
+        return S3Client()
+    if url.startswith("file://"):
+        return LocalObjectStore(url.removeprefix("file://"))
+    message = f"Unknown object store: {url}"
+    raise ValueError(message)
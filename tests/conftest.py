@@ -1,5 +1,6 @@
 import datetime
 import json
+from concurrent.futures import ThreadPoolExecutor
 
 import boto3
 import pytest
@@ -10,6 +11,7 @@ from moto import mock_aws
 
 from awd import config
 from awd.article import Article
+from awd.concurrency import ByteBudget
 from awd.config import Config
 from awd.database import DoiProcessAttempt
 from awd.helpers import (
@@ -38,6 +40,8 @@ def _test_environment(monkeypatch):
     monkeypatch.setenv("SQS_BASE_URL", "https://queue.amazonaws.com/123456789012/")
     monkeypatch.setenv("SQS_INPUT_QUEUE", "mock-input-queue")
     monkeypatch.setenv("SQS_OUTPUT_QUEUE", "mock-output-queue")
+    monkeypatch.setenv("SQS_EVENT_QUEUE", "mock-event-queue")
+    monkeypatch.setenv("SQS_WORK_QUEUE", "mock-work-queue")
     monkeypatch.setenv("COLLECTION_HANDLE", "123.4/5678")
     monkeypatch.setenv("LOG_SOURCE_EMAIL", "noreply@example.com")
     monkeypatch.setenv("LOG_RECIPIENT_EMAIL", "mock@mock.mock")
@@ -102,14 +106,37 @@ def sample_article():
     )
 
 
+@pytest.fixture
+def parallel_io_article(mocked_s3, mocked_sqs_input, s3_client, sqs_client):
+    sqs_client.queue_name = "mock-input-queue"
+    with ThreadPoolExecutor(max_workers=2) as io_executor:
+        yield Article(
+            doi="10.1002/term.3131",
+            metadata_url="http://example.com/works/",
+            content_url="http://example.com/doi/",
+            s3_client=s3_client,
+            bucket="awd",
+            sqs_client=sqs_client,
+            sqs_base_url="https://queue.amazonaws.com/123456789012/",
+            sqs_input_queue="mock-input-queue",
+            sqs_output_queue="mock-output-queue",
+            collection_handle="123.4/5678",
+            byte_budget=ByteBudget(capacity=10_000_000),
+            io_executor=io_executor,
+        )
+
+
 @pytest.fixture
 @freeze_time("2023-08-21")
 def sample_doiprocessattempt(mocked_dynamodb):
+    now = datetime.datetime.now(tz=datetime.UTC)
     return DoiProcessAttempt(
         process_attempts=0,
         doi="10.1002/term.3131",
-        last_modified=datetime.datetime.now(tz=datetime.UTC).strftime(config.DATE_FORMAT),
+        last_modified=now.strftime(config.DATE_FORMAT),
         status_code=1,
+        last_modified_ts=now.timestamp(),
+        next_attempt_at=now.timestamp(),
     )
 
 
@@ -144,6 +171,18 @@ def mocked_dynamodb():
             ],
             AttributeDefinitions=[
                 {"AttributeName": "doi", "AttributeType": "S"},
+                {"AttributeName": "status_code", "AttributeType": "N"},
+                {"AttributeName": "next_attempt_at", "AttributeType": "N"},
+            ],
+            GlobalSecondaryIndexes=[
+                {
+                    "IndexName": "status-next-attempt-index",
+                    "KeySchema": [
+                        {"AttributeName": "status_code", "KeyType": "HASH"},
+                        {"AttributeName": "next_attempt_at", "KeyType": "RANGE"},
+                    ],
+                    "Projection": {"ProjectionType": "ALL"},
+                }
             ],
         )
         DoiProcessAttempt.set_table_name("wiley-test")
@@ -201,6 +240,70 @@ def mocked_sqs_output():
         yield sqs
 
 
+@pytest.fixture
+def mocked_sqs_event(mocked_s3):
+    sqs = boto3.resource("sqs", region_name="us-east-1")
+    queue = sqs.create_queue(QueueName="mock-event-queue")
+    mocked_s3.put_bucket_notification_configuration(
+        Bucket="awd",
+        NotificationConfiguration={
+            "QueueConfigurations": [
+                {
+                    "QueueArn": queue.attributes["QueueArn"],
+                    "Events": ["s3:ObjectCreated:*"],
+                    "Filter": {
+                        "Key": {"FilterRules": [{"Name": "suffix", "Value": ".csv"}]}
+                    },
+                }
+            ]
+        },
+    )
+    # discard the test event sent when the notification configuration is created
+    queue.purge()
+    return queue
+
+
+@pytest.fixture
+def s3_event_message_body():
+    return json.dumps(
+        {
+            "Records": [
+                {
+                    "eventName": "ObjectCreated:Put",
+                    "s3": {
+                        "bucket": {"name": "awd"},
+                        "object": {"key": "new+folder/doi_success%282%29.csv"},
+                    },
+                }
+            ]
+        }
+    )
+
+
+@pytest.fixture
+def sqs_event_client():
+    return SQSClient(
+        region=config.AWS_REGION_NAME,
+        base_url="https://queue.amazonaws.com/123456789012/",
+        queue_name="mock-event-queue",
+    )
+
+
+@pytest.fixture
+def mocked_sqs_work(mocked_s3):
+    sqs = boto3.resource("sqs", region_name="us-east-1")
+    return sqs.create_queue(QueueName="mock-work-queue")
+
+
+@pytest.fixture
+def sqs_work_client():
+    return SQSClient(
+        region=config.AWS_REGION_NAME,
+        base_url="https://queue.amazonaws.com/123456789012/",
+        queue_name="mock-work-queue",
+    )
+
+
 @pytest.fixture
 def mocked_web(crossref_work_record_full, wiley_pdf):
     with requests_mock.Mocker() as m:
@@ -0,0 +1,382 @@
+"""End-to-end load test of the deposit and listen commands.
+
+The Crossref and Wiley APIs are replaced by local HTTP simulators and AWS services are
+mocked with moto, so throughput can be measured without touching real services. Run
+from the repository root with 'make loadtest' or 'pipenv run python -m tests.loadtest'.
+"""
+
+import json
+import os
+import random
+import resource
+import shlex
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import boto3
+import click
+from moto import mock_aws
+
+from awd.config import AWS_REGION_NAME
+from awd.database import DoiProcessAttempt
+from awd.metrics import RUN_METRICS
+from awd.state import create_state_store
+from awd.storage import create_object_store
+
+LOADTEST_ENV = {
+    "WORKSPACE": "loadtest",
+    "SENTRY_DSN": "None",
+    "DOI_TABLE": "wiley-loadtest",
+    "BUCKET": "awd-loadtest",
+    "SQS_BASE_URL": "https://queue.amazonaws.com/123456789012/",
+    "SQS_INPUT_QUEUE": "loadtest-input-queue",
+    "SQS_OUTPUT_QUEUE": "loadtest-output-queue",
+    "COLLECTION_HANDLE": "123.4/5678",
+    "LOG_SOURCE_EMAIL": "noreply@example.com",
+    "LOG_RECIPIENT_EMAIL": "loadtest@example.com",
+    "RETRY_THRESHOLD": "10",
+    "AWS_ACCESS_KEY_ID": "testing",
+    "AWS_SECRET_ACCESS_KEY": "testing",
+    "AWS_DEFAULT_REGION": AWS_REGION_NAME,
+}
+
+
+class SimulatorSettings:
+    """Response behavior shared by the Crossref and Wiley simulators."""
+
+    def __init__(
+        self,
+        latency_ms: float,
+        latency_jitter_ms: float,
+        error_rate: float,
+        non_pdf_rate: float,
+        pdf_size_kb: int,
+        pdf_size_sigma: float,
+        seed: int,
+    ) -> None:
+        """Initialize simulator settings.
+
+        Args:
+            latency_ms: The mean response latency in milliseconds.
+            latency_jitter_ms: The standard deviation of the response latency.
+            error_rate: The fraction of requests answered with a 503 error.
+            non_pdf_rate: The fraction of Wiley requests answered with an HTML page.
+            pdf_size_kb: The median PDF size in kilobytes.
+            pdf_size_sigma: The sigma of the log-normal PDF size distribution.
+            seed: The seed for the random number generator.
+        """
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.error_rate = error_rate
+        self.non_pdf_rate = non_pdf_rate
+        self.pdf_size_kb = pdf_size_kb
+        self.pdf_size_sigma = pdf_size_sigma
+        self.random = random.Random(seed)  # noqa: S311
+        self.lock = threading.Lock()
+        with open("tests/fixtures/crossref_work_record_full.json", "rb") as record:
+            self.crossref_record = record.read()
+        # PDFs are slices of one buffer so responses do not allocate per request
+        self.pdf_buffer = b"%PDF-1.4\n" + bytes(self.pdf_size_kb * 1024 * 20)
+
+    def sample(self) -> tuple[float, float, float, int]:
+        """Sample a latency in seconds, two uniform draws and a PDF size in bytes."""
+        with self.lock:
+            latency = self.random.gauss(self.latency_ms, self.latency_jitter_ms)
+            pdf_size = self.random.lognormvariate(0, self.pdf_size_sigma)
+            return (
+                max(latency, 0) / 1000,
+                self.random.random(),
+                self.random.random(),
+                min(int(pdf_size * self.pdf_size_kb * 1024), len(self.pdf_buffer)),
+            )
+
+
+class SimulatorHandler(BaseHTTPRequestHandler):
+    """Serve Crossref work records under '/works/' and Wiley PDFs under '/doi/'."""
+
+    server: "SimulatorServer"
+
+    def do_GET(self) -> None:
+        settings = self.server.settings
+        latency, error_draw, content_draw, pdf_size = settings.sample()
+        time.sleep(latency)
+        path = urlparse(self.path).path
+        if error_draw < settings.error_rate:
+            self.respond(503, "text/plain", b"Service Unavailable")
+        elif path.startswith("/works/"):
+            self.respond(200, "application/json", settings.crossref_record)
+        elif path.startswith("/doi/") and content_draw < settings.non_pdf_rate:
+            self.respond(200, "text/html", b"<html><body>Access denied</body></html>")
+        elif path.startswith("/doi/"):
+            self.respond(200, "application/pdf", settings.pdf_buffer[:pdf_size])
+        else:
+            self.respond(404, "text/plain", b"Resource not found.")
+
+    def respond(self, status: int, content_type: str, body: bytes) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *_) -> None:
+        pass
+
+
+class SimulatorServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, settings: SimulatorSettings) -> None:
+        super().__init__(("127.0.0.1", 0), SimulatorHandler)
+        self.settings = settings
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+def create_aws_resources(*, create_table: bool) -> None:
+    s3 = boto3.client("s3", region_name=AWS_REGION_NAME)
+    s3.create_bucket(Bucket=os.environ["BUCKET"])
+    sqs = boto3.client("sqs", region_name=AWS_REGION_NAME)
+    sqs.create_queue(QueueName=os.environ["SQS_INPUT_QUEUE"])
+    sqs.create_queue(QueueName=os.environ["SQS_OUTPUT_QUEUE"])
+    ses = boto3.client("ses", region_name=AWS_REGION_NAME)
+    ses.verify_email_identity(EmailAddress=os.environ["LOG_SOURCE_EMAIL"])
+    if create_table:
+        DoiProcessAttempt.set_table_name(os.environ["DOI_TABLE"])
+        DoiProcessAttempt.create_table(billing_mode="PAY_PER_REQUEST", wait=True)
+
+
+def upload_spreadsheet(doi_count: int) -> None:
+    dois = "\n".join(f"10.9999/load.{index}" for index in range(doi_count))
+    create_object_store(os.environ.get("OBJECT_STORE")).put_file(
+        dois, os.environ["BUCKET"], "loadtest.csv"
+    )
+
+
+def simulate_dss(dss_error_rate: float, seed: int) -> int:
+    """Answer every submission message on the input queue with a result message.
+
+    Returns the number of result messages sent.
+
+    Args:
+        dss_error_rate: The fraction of submissions answered with an error result.
+        seed: The seed for the random number generator.
+    """
+    rng = random.Random(seed)  # noqa: S311
+    sqs = boto3.client("sqs", region_name=AWS_REGION_NAME)
+    input_queue_url = sqs.get_queue_url(QueueName=os.environ["SQS_INPUT_QUEUE"])
+    output_queue_url = sqs.get_queue_url(QueueName=os.environ["SQS_OUTPUT_QUEUE"])
+    sent = 0
+    while messages := sqs.receive_message(
+        QueueUrl=input_queue_url["QueueUrl"],
+        MaxNumberOfMessages=10,
+        MessageAttributeNames=["All"],
+    ).get("Messages", []):
+        entries = []
+        for message in messages:
+            if rng.random() < dss_error_rate:
+                body = {"ResultType": "error", "ErrorInfo": "Simulated DSS error"}
+            else:
+                body = {"ResultType": "success", "ItemHandle": "1721.1/131022"}
+            entries.append(
+                {
+                    "Id": message["MessageId"],
+                    "MessageBody": json.dumps(body),
+                    "MessageAttributes": {
+                        "PackageID": message["MessageAttributes"]["PackageID"],
+                        "SubmissionSource": {
+                            "DataType": "String",
+                            "StringValue": "DSS",
+                        },
+                    },
+                }
+            )
+        sqs.send_message_batch(QueueUrl=output_queue_url["QueueUrl"], Entries=entries)
+        sqs.delete_message_batch(
+            QueueUrl=input_queue_url["QueueUrl"],
+            Entries=[
+                {"Id": message["MessageId"], "ReceiptHandle": message["ReceiptHandle"]}
+                for message in messages
+            ],
+        )
+        sent += len(messages)
+    return sent
+
+
+def run_command(args: list[str]) -> float:
+    """Run a CLI command and return its duration in seconds.
+
+    Args:
+        args: The command line arguments passed to the CLI.
+    """
+    from awd.cli import cli
+
+    RUN_METRICS.reset()
+    start = time.perf_counter()
+    cli.main(args, standalone_mode=False)
+    return time.perf_counter() - start
+
+
+def peak_rss_mib() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def status_counts() -> dict[str, int]:
+    state_store = create_state_store(
+        os.environ.get("STATE_STORE"), os.environ["DOI_TABLE"]
+    )
+    return {
+        status: count for status, count in state_store.status_counts().items() if count
+    }
+
+
+@click.command()
+@click.option("--dois", default=500, show_default=True, help="Number of DOIs.")
+@click.option("--latency-ms", default=50.0, show_default=True)
+@click.option("--latency-jitter-ms", default=20.0, show_default=True)
+@click.option(
+    "--error-rate",
+    default=0.01,
+    show_default=True,
+    help="Fraction of Crossref and Wiley requests answered with a 503 error.",
+)
+@click.option(
+    "--non-pdf-rate",
+    default=0.02,
+    show_default=True,
+    help="Fraction of Wiley requests answered with an HTML page.",
+)
+@click.option("--pdf-size-kb", default=1024, show_default=True, help="Median PDF size.")
+@click.option(
+    "--pdf-size-sigma",
+    default=0.75,
+    show_default=True,
+    help="Sigma of the log-normal PDF size distribution.",
+)
+@click.option(
+    "--dss-error-rate",
+    default=0.05,
+    show_default=True,
+    help="Fraction of submissions answered with an error result.",
+)
+@click.option("--seed", default=0, show_default=True)
+@click.option(
+    "--state-store",
+    type=click.Choice(["dynamodb", "sqlite"]),
+    default="dynamodb",
+    show_default=True,
+    help="State store of the DOIs, either the mocked DynamoDB table or an SQLite "
+    "database in a temporary directory.",
+)
+@click.option(
+    "--object-store",
+    type=click.Choice(["s3", "local"]),
+    default="s3",
+    show_default=True,
+    help="Object store of the spreadsheets, metadata and PDFs, either the mocked S3 "
+    "bucket or a temporary directory.",
+)
+@click.option(
+    "--log-level",
+    default="WARNING",
+    show_default=True,
+    help="LOG_LEVEL for the commands under test.",
+)
+@click.option(
+    "--deposit-args",
+    default="",
+    help="Additional arguments for 'deposit', e.g. '--workers 8'.",
+)
+@click.option(
+    "--listen-args",
+    default="",
+    help="Additional arguments for 'listen', e.g. '--workers 8'.",
+)
+def main(
+    dois: int,
+    latency_ms: float,
+    latency_jitter_ms: float,
+    error_rate: float,
+    non_pdf_rate: float,
+    pdf_size_kb: int,
+    pdf_size_sigma: float,
+    dss_error_rate: float,
+    seed: int,
+    state_store: str,
+    object_store: str,
+    log_level: str,
+    deposit_args: str,
+    listen_args: str,
+) -> None:
+    """Measure deposit and listen throughput against simulated services.
+
+    Peak RSS includes the moto backends, which keep every uploaded PDF in memory.
+    """
+    settings = SimulatorSettings(
+        latency_ms=latency_ms,
+        latency_jitter_ms=latency_jitter_ms,
+        error_rate=error_rate,
+        non_pdf_rate=non_pdf_rate,
+        pdf_size_kb=pdf_size_kb,
+        pdf_size_sigma=pdf_size_sigma,
+        seed=seed,
+    )
+    simulator = SimulatorServer(settings)
+    simulator.start()
+    os.environ.update(LOADTEST_ENV)
+    os.environ["LOG_LEVEL"] = log_level
+    os.environ["METADATA_URL"] = f"{simulator.url}/works/"
+    os.environ["CONTENT_URL"] = f"{simulator.url}/doi/"
+    state_directory = tempfile.TemporaryDirectory()
+    os.environ["STATE_STORE"] = (
+        f"sqlite:///{state_directory.name}/state.db"
+        if state_store == "sqlite"
+        else "dynamodb"
+    )
+    os.environ["OBJECT_STORE"] = (
+        f"file://{state_directory.name}/objects" if object_store == "local" else "s3"
+    )
+    if object_store == "local":
+        os.makedirs(f"{state_directory.name}/objects/{os.environ['BUCKET']}")
+    try:
+        with mock_aws():
+            create_aws_resources(create_table=state_store == "dynamodb")
+            upload_spreadsheet(dois)
+
+            duration = run_command(["deposit", *shlex.split(deposit_args)])
+            click.echo(
+                f"deposit: {dois} DOIs in {duration:.2f}s "
+                f"({dois / duration:.1f} DOIs/sec), peak RSS {peak_rss_mib():.1f} MiB"
+            )
+            click.echo(RUN_METRICS.report())
+            click.echo(f"DOI statuses: {status_counts()}\n")
+
+            results = simulate_dss(dss_error_rate, seed)
+            duration = run_command(["listen", *shlex.split(listen_args)])
+            click.echo(
+                f"listen: {results} result messages in {duration:.2f}s "
+                f"({results / duration:.1f} messages/sec), "
+                f"peak RSS {peak_rss_mib():.1f} MiB"
+            )
+            click.echo(RUN_METRICS.report())
+            click.echo(f"DOI statuses: {status_counts()}")
+    finally:
+        simulator.stop()
+        state_directory.cleanup()
+
+
+if __name__ == "__main__":
+    main()
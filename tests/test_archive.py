@@ -0,0 +1,62 @@
+import gzip
+import json
+
+from freezegun import freeze_time
+
+from awd.archive import DoiArchive
+from awd.database import DoiProcessAttempt, StatusCounts
+from awd.status import Status
+
+
+def add_item_with_status(doi, status_code):
+    DoiProcessAttempt.add_item(doi)
+    DoiProcessAttempt.get(doi).update_status(status_code=status_code)
+
+
+def test_archive_terminal_items(mocked_dynamodb, mocked_s3, s3_client):
+    with freeze_time("2023-08-21"):
+        add_item_with_status("10.1002/success.0001", Status.SUCCESS.value)
+        add_item_with_status("10.1002/failed.0001", Status.FAILED.value)
+        add_item_with_status("10.1002/sent.0001", Status.MESSAGE_SENT.value)
+    add_item_with_status("10.1002/recent.0001", Status.SUCCESS.value)
+    archive = DoiArchive(s3_client, "awd")
+    archived_count = archive.archive_terminal_items(min_age_seconds=86400, segments=2)
+    assert archived_count == 2  # noqa: PLR2004
+    assert archive.contains("10.1002/success.0001")
+    assert archive.contains("10.1002/failed.0001")
+    assert not archive.contains("10.1002/recent.0001")
+    assert DoiProcessAttempt.get("10.1002/success.0001").expires_at is not None
+    assert DoiProcessAttempt.get("10.1002/sent.0001").expires_at is None
+    archived_dois = set()
+    for key in s3_client.list_keys("awd", "archived/doi-items/items/"):
+        archived_file = gzip.decompress(s3_client.get_file("awd", key)).decode()
+        archived_dois.update(
+            json.loads(line)["doi"] for line in archived_file.splitlines()
+        )
+    assert archived_dois == {"10.1002/success.0001", "10.1002/failed.0001"}
+    assert StatusCounts.read()["SUCCESS"] == 1
+    assert StatusCounts.read()["FAILED"] == 0
+    assert archive.archive_terminal_items(min_age_seconds=86400) == 0
+
+
+def test_archive_expire_item_skips_changed_item(mocked_dynamodb, mocked_s3):
+    add_item_with_status("10.1002/term.3131", Status.FAILED.value)
+    archived_item = DoiProcessAttempt.get("10.1002/term.3131")
+    DoiProcessAttempt.get("10.1002/term.3131").update_status(
+        status_code=Status.UNPROCESSED.value
+    )
+    assert not DoiArchive.expire_item(archived_item)
+    assert DoiProcessAttempt.get("10.1002/term.3131").expires_at is None
+
+
+def test_check_doi_and_add_to_table_skips_archived_doi(
+    mocked_dynamodb, mocked_s3, s3_client
+):
+    archive = DoiArchive(s3_client, "awd")
+    s3_client.put_file("{}", "awd", archive.index_key("10.1002/term.3131"))
+    assert archive.index_key("10.1002/term.3131") == (
+        "archived/doi-items/index/10.1002%2Fterm.3131.json"
+    )
+    DoiProcessAttempt.check_doi_and_add_to_table("10.1002/term.3131", archive=archive)
+    DoiProcessAttempt.check_doi_and_add_to_table("10.1002/new.0001", archive=archive)
+    assert DoiProcessAttempt.retrieve_unprocessed_dois() == ["10.1002/new.0001"]
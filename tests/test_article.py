@@ -1,14 +1,22 @@
+import time
 from unittest.mock import Mock
 
 import pytest
 from requests import Response
 
 from awd.article import (
+    WILEY_PREVIEW_BYTES,
+    ArticleContentCancelledError,
+    DoiAttemptNotDueError,
+    DoiLeaseUnavailableError,
     InvalidArticleContentResponseError,
     InvalidCrossrefMetadataError,
     InvalidDSpaceMetadataError,
     UnprocessedStatusFalseError,
 )
+from awd.concurrency import ByteBudget
+from awd.database import DoiProcessAttempt
+from awd.scheduler import BackoffSchedule
 from awd.status import Status
 
 
@@ -33,6 +41,86 @@ def test_check_status_and_increment_process_attempts_false_raises_exception(
         sample_article.check_status_and_increment_process_attempts()
 
 
+def test_check_status_and_increment_process_attempts_leased_raises_exception(
+    mocked_dynamodb,
+    sample_article,
+    sample_doiprocessattempt,
+):
+    sample_doiprocessattempt.save()
+    sample_doiprocessattempt.acquire_lease("other-deposit", 60)
+    with pytest.raises(DoiLeaseUnavailableError):
+        sample_article.check_status_and_increment_process_attempts()
+    assert DoiProcessAttempt.get("10.1002/term.3131").process_attempts == 0
+
+
+def test_article_process_releases_lease(
+    mocked_dynamodb,
+    sample_article,
+    sample_doiprocessattempt,
+):
+    def get_and_validate_crossref_metadata():
+        raise InvalidCrossrefMetadataError
+
+    sample_doiprocessattempt.save()
+    sample_article.get_and_validate_crossref_metadata = get_and_validate_crossref_metadata
+    with pytest.raises(InvalidCrossrefMetadataError):
+        sample_article.process()
+    doi_process_attempt = DoiProcessAttempt.get("10.1002/term.3131")
+    assert doi_process_attempt.process_attempts == 1
+    assert doi_process_attempt.lease_owner is None
+
+
+def test_check_status_and_increment_process_attempts_not_due_raises_exception(
+    mocked_dynamodb,
+    sample_article,
+    sample_doiprocessattempt,
+):
+    sample_doiprocessattempt.update_status(
+        status_code=Status.UNPROCESSED.value, next_attempt_at=time.time() + 60
+    )
+    with pytest.raises(DoiAttemptNotDueError):
+        sample_article.check_status_and_increment_process_attempts()
+    assert DoiProcessAttempt.get("10.1002/term.3131").lease_owner is None
+
+
+def test_article_process_pdf_unavailable_backs_off(
+    mocked_dynamodb,
+    mocked_web,
+    sample_article,
+):
+    DoiProcessAttempt.add_item("10.1002/none.0000")
+    sample_article.doi = "10.1002/none.0000"
+    sample_article.get_and_validate_crossref_metadata = lambda: None
+    sample_article.create_and_validate_dspace_metadata = lambda: None
+    sample_article.content_backoff = BackoffSchedule(60, 3600, 2)
+    with pytest.raises(InvalidArticleContentResponseError):
+        sample_article.process()
+    doi_process_attempt = DoiProcessAttempt.get("10.1002/none.0000")
+    assert doi_process_attempt.status_code == Status.UNPROCESSED.value
+    assert doi_process_attempt.process_attempts == 0
+    assert doi_process_attempt.content_attempts == 1
+    assert doi_process_attempt.next_attempt_at >= time.time() + 59
+    assert doi_process_attempt.lease_owner is None
+    assert not list(DoiProcessAttempt.retrieve_due_doi_process_attempts())
+
+
+def test_article_process_pdf_unavailable_fails_after_content_attempts(
+    mocked_dynamodb,
+    mocked_web,
+    sample_article,
+):
+    DoiProcessAttempt.add_item("10.1002/none.0000")
+    sample_article.doi = "10.1002/none.0000"
+    sample_article.get_and_validate_crossref_metadata = lambda: None
+    sample_article.create_and_validate_dspace_metadata = lambda: None
+    sample_article.content_backoff = BackoffSchedule(60, 3600, 1)
+    with pytest.raises(InvalidArticleContentResponseError):
+        sample_article.process()
+    doi_process_attempt = DoiProcessAttempt.get("10.1002/none.0000")
+    assert doi_process_attempt.status_code == Status.FAILED.value
+    assert doi_process_attempt.next_attempt_at is None
+
+
 def test_create_dspace_metadata_minimum_metadata(
     sample_article, crossref_work_record_minimum
 ):
@@ -66,6 +154,13 @@ def test_valid_crossref_metadata_failure(sample_article):
     assert sample_article.valid_crossref_metadata(response) is False
 
 
+def test_valid_crossref_metadata_non_json_response(caplog, sample_article):
+    response = Mock()
+    response.json.side_effect = ValueError("Expecting value")
+    assert sample_article.valid_crossref_metadata(response) is False
+    assert "Unable to parse 10.1002/term.3131 response as JSON" in caplog.text
+
+
 def test_valid_crossref_metadata_success(sample_article):
     response = Mock()
     response.json.return_value = {
@@ -139,6 +234,60 @@ def test_get_and_validate_wiley_article_content_success(
     assert sample_article.article_content == wiley_pdf
 
 
+def test_valid_article_content_response_pdf_header_without_pdf_body(sample_article):
+    wiley_response = Response()
+    wiley_response.headers = {"content-type": "application/pdf"}
+    assert (
+        sample_article.valid_article_content_response(
+            wiley_response, body_start=b"<html>challenge</html>"
+        )
+        is False
+    )
+
+
+def test_get_and_validate_wiley_article_content_logs_bounded_preview(
+    caplog, mocked_web, sample_article
+):
+    caplog.set_level("DEBUG")
+    html = b"<html>" + b"x" * 1_000_000
+    mocked_web.get(
+        "http://example.com/doi/10.1002/term.3131",
+        content=html,
+        headers={"Content-Type": "application/pdf"},
+    )
+    with pytest.raises(InvalidArticleContentResponseError):
+        sample_article.get_and_validate_wiley_article_content()
+    preview_record = next(
+        record for record in caplog.records if "Response preview" in record.message
+    )
+    assert len(preview_record.message) < 3 * WILEY_PREVIEW_BYTES
+    assert "A PDF could not be retrieved for DOI: 10.1002/term.3131" in caplog.text
+
+
+def test_get_and_validate_wiley_article_content_acquires_content_length(
+    mocked_web, sample_article, wiley_pdf
+):
+    mocked_web.get(
+        "http://example.com/doi/10.1002/term.3131",
+        content=wiley_pdf,
+        headers={"Content-Type": "application/pdf", "Content-Length": "1000000"},
+    )
+    sample_article.byte_budget = ByteBudget(capacity=2_000_000)
+    sample_article.get_and_validate_wiley_article_content()
+    assert sample_article.byte_budget.in_use == 1_000_000  # noqa: PLR2004
+    sample_article.release_content_bytes()
+    assert sample_article.byte_budget.in_use == 0
+
+
+def test_get_and_validate_wiley_article_content_accounts_for_unknown_length(
+    mocked_web, sample_article, wiley_pdf
+):
+    sample_article.byte_budget = ByteBudget(capacity=1)
+    sample_article.get_and_validate_wiley_article_content()
+    assert sample_article.byte_budget.in_use == len(wiley_pdf)
+    assert sample_article.content_bytes == len(wiley_pdf)
+
+
 def test_get_and_validate_wiley_article_content_invalid_content_raises_error(
     mocked_web,
     sample_article,
@@ -146,3 +295,103 @@ def test_get_and_validate_wiley_article_content_invalid_content_raises_error(
     sample_article.doi = "10.1002/none.0000"
     with pytest.raises(InvalidArticleContentResponseError):
         sample_article.get_and_validate_wiley_article_content()
+
+
+def test_article_process_parallel_io_success(
+    mocked_dynamodb, mocked_web, parallel_io_article, s3_client
+):
+    DoiProcessAttempt.add_item("10.1002/term.3131")
+    parallel_io_article.process()
+    assert (
+        DoiProcessAttempt.get("10.1002/term.3131").status_code
+        == Status.MESSAGE_SENT.value
+    )
+    assert s3_client.file_exists("awd", "10.1002-term.3131.json")
+    assert s3_client.file_exists("awd", "10.1002-term.3131.pdf")
+    assert parallel_io_article.byte_budget.in_use == 0
+
+
+def test_article_process_parallel_io_invalid_metadata_cancels_content(
+    caplog, mocked_dynamodb, mocked_web, parallel_io_article, s3_client, wiley_pdf
+):
+    mocked_web.get(
+        "http://example.com/doi/10.1002/nome.tadata",
+        headers={"Content-Type": "application/html; charset=UTF-8"},
+    )
+    DoiProcessAttempt.add_item("10.1002/nome.tadata")
+    parallel_io_article.doi = "10.1002/nome.tadata"
+    with pytest.raises(InvalidCrossrefMetadataError):
+        parallel_io_article.process()
+    doi_process_attempt = DoiProcessAttempt.get("10.1002/nome.tadata")
+    assert doi_process_attempt.process_attempts == 1
+    assert doi_process_attempt.content_attempts is None
+    assert doi_process_attempt.lease_owner is None
+    assert parallel_io_article.content_cancelled.is_set()
+    assert parallel_io_article.byte_budget.in_use == 0
+    assert not s3_client.file_exists("awd", "10.1002-nome.tadata.pdf")
+
+
+def test_article_process_parallel_io_pdf_unavailable_backs_off(
+    mocked_dynamodb, mocked_web, parallel_io_article
+):
+    DoiProcessAttempt.add_item("10.1002/none.0000")
+    parallel_io_article.doi = "10.1002/none.0000"
+    with pytest.raises(InvalidArticleContentResponseError):
+        parallel_io_article.process()
+    doi_process_attempt = DoiProcessAttempt.get("10.1002/none.0000")
+    assert doi_process_attempt.status_code == Status.UNPROCESSED.value
+    assert doi_process_attempt.content_attempts == 1
+
+
+def test_article_process_parallel_io_failed_upload_stops_other_upload(
+    mocked_dynamodb, mocked_web, parallel_io_article, s3_client
+):
+    put_file = s3_client.put_file
+    started, finished = [], []
+
+    def put_file_failing_pdf(file_content, bucket, key):
+        if key.endswith(".pdf"):
+            message = "Upload failed"
+            raise OSError(message)
+        started.append(key)
+        time.sleep(0.05)
+        put_file(file_content, bucket, key)
+        finished.append(key)
+
+    parallel_io_article.s3_client.put_file = put_file_failing_pdf
+    DoiProcessAttempt.add_item("10.1002/term.3131")
+    with pytest.raises(OSError, match="Upload failed"):
+        parallel_io_article.process()
+    # the metadata upload is cancelled if it has not started, or waited for
+    assert started == finished
+    assert (
+        DoiProcessAttempt.get("10.1002/term.3131").status_code == Status.UNPROCESSED.value
+    )
+
+
+def test_get_and_validate_wiley_article_content_cancelled_before_request(
+    mocked_web, sample_article
+):
+    sample_article.content_cancelled.set()
+    with pytest.raises(ArticleContentCancelledError):
+        sample_article.get_and_validate_wiley_article_content()
+    assert mocked_web.call_count == 0
+
+
+def test_get_and_validate_wiley_article_content_cancelled_during_download(
+    mocked_web, sample_article
+):
+    sample_article.byte_budget = ByteBudget(capacity=10_000_000)
+    chunks = []
+
+    def check_cancelled(chunk):
+        chunks.append(chunk)
+        sample_article.content_cancelled.set()
+        raise ArticleContentCancelledError
+
+    sample_article.check_cancelled = check_cancelled
+    with pytest.raises(ArticleContentCancelledError):
+        sample_article.get_and_validate_wiley_article_content()
+    assert len(chunks) == 1
+    sample_article.release_content_bytes()
+    assert sample_article.byte_budget.in_use == 0
@@ -0,0 +1,139 @@
+import copy
+import json
+from io import StringIO
+from unittest.mock import Mock
+
+import pytest
+
+from awd.helpers import SQSClient, filter_log_stream
+
+LARGE_AUTHOR_COUNT = 5_000
+LARGE_LOG_LINE_COUNT = 50_000
+LARGE_ATTACHMENT_SIZE = 5 * 1024 * 1024
+
+
+@pytest.fixture
+def crossref_work_record_large(crossref_work_record_full):
+    work_record = copy.deepcopy(crossref_work_record_full)
+    author = work_record["message"]["author"][0]
+    work_record["message"]["author"] = [
+        {**author, "family": f"{author['family']} {i}"} for i in range(LARGE_AUTHOR_COUNT)
+    ]
+    work_record["message"]["ISSN"] = [f"{i:04d}-{i:04d}" for i in range(500)]
+    work_record["message"]["container-title"] = [f"Journal {i}" for i in range(500)]
+    return work_record
+
+
+@pytest.fixture
+def dspace_metadata_large(sample_article, crossref_work_record_large):
+    sample_article.crossref_metadata = crossref_work_record_large
+    return sample_article.create_dspace_metadata("config/metadata_mapping.json")
+
+
+@pytest.fixture
+def large_log_stream():
+    stream = StringIO()
+    for i in range(LARGE_LOG_LINE_COUNT):
+        if i % 10 == 0:
+            stream.write(f"ERROR    2023-08-21 00:00:00 PDF not retrieved for {i}\n")
+        else:
+            stream.write(f"INFO     2023-08-21 00:00:00 DOI: 10.1002/{i}, Result: {{}}\n")
+    return stream
+
+
+@pytest.fixture
+def large_attachment():
+    line = "ERROR    2023-08-21 00:00:00 Insufficient metadata for 10.1002/term.3131\n"
+    return line * (LARGE_ATTACHMENT_SIZE // len(line))
+
+
+def crossref_response(work_record):
+    response = Mock()
+    response.json.return_value = work_record
+    return response
+
+
+def test_benchmark_create_dspace_metadata_full(
+    benchmark, sample_article, crossref_work_record_full
+):
+    sample_article.crossref_metadata = crossref_work_record_full
+    metadata = benchmark(
+        sample_article.create_dspace_metadata, "config/metadata_mapping.json"
+    )
+    assert metadata["metadata"]
+
+
+def test_benchmark_create_dspace_metadata_large(
+    benchmark, sample_article, crossref_work_record_large
+):
+    sample_article.crossref_metadata = crossref_work_record_large
+    metadata = benchmark(
+        sample_article.create_dspace_metadata, "config/metadata_mapping.json"
+    )
+    assert len(metadata["metadata"]) > LARGE_AUTHOR_COUNT
+
+
+def test_benchmark_valid_dspace_metadata_full(benchmark, sample_article, dspace_metadata):
+    assert benchmark(sample_article.valid_dspace_metadata, dspace_metadata) is True
+
+
+def test_benchmark_valid_dspace_metadata_large(
+    benchmark, sample_article, dspace_metadata_large
+):
+    assert benchmark(sample_article.valid_dspace_metadata, dspace_metadata_large) is True
+
+
+def test_benchmark_valid_crossref_metadata_full(
+    benchmark, sample_article, crossref_work_record_full
+):
+    response = crossref_response(crossref_work_record_full)
+    assert benchmark(sample_article.valid_crossref_metadata, response) is True
+
+
+def test_benchmark_valid_crossref_metadata_large(
+    benchmark, sample_article, crossref_work_record_large
+):
+    response = crossref_response(crossref_work_record_large)
+    assert benchmark(sample_article.valid_crossref_metadata, response) is True
+
+
+def test_benchmark_create_dss_message_body(benchmark, submission_message_body):
+    message_body = benchmark(
+        SQSClient.create_dss_message_body,
+        submission_system="DSpace@MIT",
+        collection_handle="123.4/5678",
+        metadata_s3_uri="s3://awd/10.1002-term.3131.json",
+        bitstream_file_name="10.1002-term.3131.pdf",
+        bitstream_s3_uri="s3://awd/10.1002-term.3131.pdf",
+    )
+    assert message_body == submission_message_body
+
+
+def test_benchmark_valid_sqs_message(benchmark, sqs_client, valid_result_message):
+    assert benchmark(sqs_client.valid_sqs_message, valid_result_message) is True
+
+
+def test_benchmark_valid_sqs_message_large_body(
+    benchmark, sqs_client, valid_result_message
+):
+    message_body = json.loads(valid_result_message["Body"])
+    message_body["Bitstreams"] = message_body["Bitstreams"] * 1_000
+    valid_result_message["Body"] = json.dumps(message_body)
+    assert benchmark(sqs_client.valid_sqs_message, valid_result_message) is True
+
+
+def test_benchmark_filter_log_stream_large(benchmark, large_log_stream):
+    filtered_log = benchmark(filter_log_stream, large_log_stream)
+    assert filtered_log.count("\n") == LARGE_LOG_LINE_COUNT // 10
+
+
+def test_benchmark_ses_create_email_large_attachment(
+    benchmark, ses_client, large_attachment
+):
+    message = benchmark(
+        ses_client.create_email,
+        subject="Email subject",
+        attachment_content=large_attachment,
+        attachment_name="attachment.txt",
+    )
+    assert message["Subject"] == "Email subject"
@@ -1,10 +1,49 @@
+import json
 import logging
+import os
+import signal
+import subprocess
+import sys
+import threading
 from http import HTTPStatus
 
 from awd.cli import cli
+from awd.database import DoiProcessAttempt
+from awd.depositor import Depositor
+from awd.state import SQLiteStateStore
+from awd.status import Status
+from awd.storage import LocalObjectStore
 
 logger = logging.getLogger(__name__)
 
+CLI_IMPORT_TIME_BUDGET_MICROSECONDS = 500_000
+HEAVY_MODULES = [
+    "boto3",
+    "botocore",
+    "email.mime.multipart",
+    "pynamodb",
+    "requests",
+    "sentry_sdk",
+    "smart_open",
+]
+
+
+def loaded_heavy_modules(script):
+    result = subprocess.run(  # noqa: S603
+        [
+            sys.executable,
+            "-c",
+            (
+                f"{script}\nimport json, sys\n"
+                f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+            ),
+        ],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    return json.loads(result.stdout.splitlines()[-1])
+
 
 def test_deposit_success(
     caplog,
@@ -46,6 +85,280 @@ def test_deposit_success(
         assert "Logs sent to" in caplog.text
 
 
+def test_deposit_sqlite_state_store(
+    doi_list_success,
+    mocked_web,
+    mocked_s3,
+    mocked_ses,
+    mocked_sqs_input,
+    monkeypatch,
+    s3_client,
+    runner,
+    tmp_path,
+):
+    path = tmp_path / "state.db"
+    monkeypatch.setenv("STATE_STORE", f"sqlite:///{path}")
+    s3_client.put_file(file_content=doi_list_success, bucket="awd", key="doi_success.csv")
+    result = runner.invoke(cli, ["deposit"])
+    assert result.exit_code == 0
+    assert (
+        SQLiteStateStore(str(path)).get("10.1002/term.3131").status_code
+        == Status.MESSAGE_SENT.value
+    )
+
+
+def test_deposit_local_object_store(
+    doi_list_success,
+    mocked_web,
+    mocked_dynamodb,
+    mocked_ses,
+    mocked_sqs_input,
+    monkeypatch,
+    runner,
+    tmp_path,
+):
+    object_store = LocalObjectStore(str(tmp_path))
+    object_store.put_file(doi_list_success, "awd", "doi_success.csv")
+    monkeypatch.setenv("OBJECT_STORE", f"file://{tmp_path}")
+    result = runner.invoke(cli, ["deposit"])
+    assert result.exit_code == 0
+    assert object_store.file_exists("awd", "archived/doi_success.csv")
+    assert object_store.get_file("awd", "10.1002-term.3131.pdf")
+    assert json.loads(object_store.get_file("awd", "10.1002-term.3131.json"))
+
+
+def test_deposit_with_workers(
+    caplog,
+    doi_list_success,
+    mocked_web,
+    mocked_dynamodb,
+    mocked_s3,
+    mocked_ses,
+    mocked_sqs_input,
+    s3_client,
+    sqs_client,
+    runner,
+):
+    with caplog.at_level(logging.DEBUG):
+        s3_client.put_file(
+            file_content=doi_list_success, bucket="awd", key="doi_success.csv"
+        )
+        result = runner.invoke(cli, ["deposit", "--workers", "4"])
+        assert result.exit_code == 0
+        assert s3_client.file_exists("awd", "10.1002-term.3131.pdf")
+        sqs_client.queue_name = "mock-input-queue"
+        assert len(list(sqs_client.receive())) == 1
+        assert "Submission process has completed" in caplog.text
+
+
+def test_deposit_with_crossref_hedging_and_parallel_article_io(
+    doi_list_success,
+    mocked_web,
+    mocked_dynamodb,
+    mocked_s3,
+    mocked_ses,
+    mocked_sqs_input,
+    s3_client,
+    sqs_client,
+    runner,
+):
+    s3_client.put_file(file_content=doi_list_success, bucket="awd", key="doi_success.csv")
+    result = runner.invoke(
+        cli,
+        [
+            "deposit",
+            "--workers",
+            "2",
+            "--crossref-hedge-percentile",
+            "95",
+            "--parallel-article-io",
+        ],
+    )
+    assert result.exit_code == 0
+    sqs_client.queue_name = "mock-input-queue"
+    assert len(list(sqs_client.receive())) == 1
+
+
+def test_deposit_invalid_schedule(runner):
+    result = runner.invoke(cli, ["deposit", "--schedule", "oldest:x"])
+    assert result.exit_code == 2  # noqa: PLR2004
+    assert "Invalid value for '--schedule'" in result.output
+
+
+def test_deposit_time_budget_leaves_dois_and_sends_report(
+    caplog,
+    doi_list_success,
+    mocked_web,
+    mocked_dynamodb,
+    mocked_s3,
+    mocked_ses,
+    mocked_sqs_input,
+    s3_client,
+    runner,
+):
+    with caplog.at_level(logging.DEBUG):
+        s3_client.put_file(
+            file_content=doi_list_success, bucket="awd", key="doi_success.csv"
+        )
+        result = runner.invoke(cli, ["deposit", "--time-budget", "30"])
+        assert result.exit_code == 0
+        assert not s3_client.file_exists("awd", "10.1002-term.3131.pdf")
+        assert "Deadline reached, 1 DOIs left for the next run" in caplog.text
+        assert "Logs sent to" in caplog.text
+
+
+def test_deposit_unexpected_error_sends_report(
+    caplog,
+    monkeypatch,
+    doi_list_success,
+    mocked_dynamodb,
+    mocked_s3,
+    mocked_ses,
+    mocked_sqs_input,
+    s3_client,
+    runner,
+):
+    def process_doi(*_):
+        message = "unexpected"
+        raise RuntimeError(message)
+
+    monkeypatch.setattr(Depositor, "process_doi", process_doi)
+    with caplog.at_level(logging.DEBUG):
+        s3_client.put_file(
+            file_content=doi_list_success, bucket="awd", key="doi_success.csv"
+        )
+        result = runner.invoke(cli, ["deposit"])
+        assert isinstance(result.exception, RuntimeError)
+        assert "Submission process stopped by an unexpected error" in caplog.text
+        assert "Logs sent to" in caplog.text
+
+
+def test_deposit_events_success(
+    caplog,
+    doi_list_success,
+    mocked_web,
+    mocked_dynamodb,
+    mocked_ses,
+    mocked_sqs_event,
+    mocked_sqs_input,
+    s3_client,
+    sqs_client,
+    runner,
+):
+    with caplog.at_level(logging.DEBUG):
+        s3_client.put_file(
+            file_content=doi_list_success, bucket="awd", key="doi_success.csv"
+        )
+        result = runner.invoke(cli, ["deposit", "--events", "--wait-time-seconds", "0"])
+        assert result.exit_code == 0
+        assert s3_client.file_exists("awd", "archived/doi_success.csv")
+        sqs_client.queue_name = "mock-input-queue"
+        assert len(list(sqs_client.receive())) == 1
+        assert "1 spreadsheets processed from S3 events" in caplog.text
+        assert "Submission process has completed" in caplog.text
+        assert "Logs sent to" in caplog.text
+
+
+def test_deposit_events_without_spreadsheets_sends_no_email(
+    caplog, mocked_dynamodb, mocked_ses, mocked_sqs_event, runner
+):
+    with caplog.at_level(logging.DEBUG):
+        result = runner.invoke(cli, ["deposit", "--events", "--wait-time-seconds", "0"])
+        assert result.exit_code == 0
+        assert "0 spreadsheets processed from S3 events" in caplog.text
+        assert "Logs sent to" not in caplog.text
+
+
+def test_deposit_events_requires_event_queue(
+    caplog, monkeypatch, mocked_dynamodb, mocked_s3, runner
+):
+    monkeypatch.delenv("SQS_EVENT_QUEUE")
+    result = runner.invoke(cli, ["deposit", "--events"])
+    assert result.exit_code == 0
+    assert "SQS_EVENT_QUEUE must be set to process S3 events" in caplog.text
+
+
+def test_deposit_coordinator_and_worker_cannot_be_combined(runner):
+    result = runner.invoke(cli, ["deposit", "--coordinator", "--worker"])
+    assert result.exit_code == 2  # noqa: PLR2004
+    assert "--events, --coordinator and --worker cannot be combined" in result.output
+
+
+def test_deposit_coordinator_enqueues_dois_and_emails_worker_reports(
+    caplog,
+    monkeypatch,
+    doi_list_success,
+    mocked_dynamodb,
+    mocked_ses,
+    mocked_sqs_work,
+    s3_client,
+    sqs_work_client,
+    runner,
+):
+    def collect_worker_reports(*_):
+        return "ERROR worker error\n"
+
+    with caplog.at_level(logging.DEBUG):
+        s3_client.put_file(
+            file_content=doi_list_success, bucket="awd", key="doi_success.csv"
+        )
+        monkeypatch.setattr(Depositor, "collect_worker_reports", collect_worker_reports)
+        result = runner.invoke(cli, ["deposit", "--coordinator", "--time-budget", "0"])
+        assert result.exit_code == 0
+        assert s3_client.file_exists("awd", "archived/doi_success.csv")
+        assert "1 DOIs sent to the work queue" in caplog.text
+        assert "Stopped waiting for workers with 1 work items remaining" in caplog.text
+        assert "Logs sent to" in caplog.text
+    message = json.loads(sqs_work_client.receive_batch(0, 30)[0]["Body"])
+    assert message["doi"] == "10.1002/term.3131"
+
+
+def test_deposit_coordinator_skips_already_processed_spreadsheet_dois(
+    caplog,
+    doi_list_success,
+    mocked_dynamodb,
+    mocked_ses,
+    mocked_sqs_work,
+    s3_client,
+    sqs_work_client,
+    runner,
+):
+    DoiProcessAttempt.add_item("10.1002/term.3131")
+    DoiProcessAttempt.get("10.1002/term.3131").update_status(
+        status_code=Status.SUCCESS.value
+    )
+    s3_client.put_file(file_content=doi_list_success, bucket="awd", key="doi.csv")
+    with caplog.at_level(logging.DEBUG):
+        result = runner.invoke(cli, ["deposit", "--coordinator", "--time-budget", "0"])
+    assert result.exit_code == 0
+    assert "1 DOIs ingested from doi.csv, 0 added" in caplog.text
+    assert "0 DOIs sent to the work queue" in caplog.text
+    assert sqs_work_client.receive_batch(0, 30) == []
+    assert DoiProcessAttempt.get("10.1002/term.3131").status_code == Status.SUCCESS.value
+
+
+def test_deposit_worker_processes_work_queue(
+    caplog,
+    mocked_web,
+    mocked_dynamodb,
+    mocked_ses,
+    mocked_sqs_input,
+    mocked_sqs_work,
+    s3_client,
+    sqs_work_client,
+    runner,
+):
+    DoiProcessAttempt.add_item("10.1002/term.3131")
+    sqs_work_client.send_batch(['{"doi": "10.1002/term.3131", "run_id": "run-1"}'])
+    with caplog.at_level(logging.DEBUG):
+        result = runner.invoke(cli, ["deposit", "--worker", "--wait-time-seconds", "0"])
+        assert result.exit_code == 0
+        assert s3_client.file_exists("awd", "10.1002-term.3131.pdf")
+        assert "1 work items completed by worker" in caplog.text
+        assert "Logs sent to" not in caplog.text
+    assert sqs_work_client.approximate_message_count() == 0
+
+
 def test_deposit_insufficient_metadata(
     caplog,
     doi_list_insufficient_metadata,
@@ -143,6 +456,71 @@ def test_deposit_wrong_dynamodb_table_exits(
         assert ("Unable to read DynamoDB table") in caplog.text
 
 
+def test_stats(mocked_dynamodb, runner):
+    DoiProcessAttempt.add_item("10.1002/term.3131")
+    result = runner.invoke(cli, ["stats"])
+    assert result.exit_code == 0
+    assert "UNPROCESSED: 1\n" in result.output
+    assert "TOTAL: 1\n" in result.output
+
+
+def test_stats_sqlite_state_store(monkeypatch, runner, tmp_path):
+    path = tmp_path / "state.db"
+    SQLiteStateStore(str(path)).add("10.1002/term.3131")
+    monkeypatch.setenv("STATE_STORE", f"sqlite:///{path}")
+    result = runner.invoke(cli, ["stats"])
+    assert result.exit_code == 0
+    assert "UNPROCESSED: 1\n" in result.output
+
+
+def test_stats_unknown_state_store(monkeypatch, runner):
+    monkeypatch.setenv("STATE_STORE", "redis://")
+    result = runner.invoke(cli, ["stats"])
+    assert result.exit_code == 1
+    assert "Unknown state store: redis://" in result.output
+
+
+def test_stats_reconcile(mocked_dynamodb, sample_doiprocessattempt, runner):
+    sample_doiprocessattempt.save()
+    result = runner.invoke(cli, ["stats", "--reconcile"])
+    assert result.exit_code == 0
+    assert "UNPROCESSED: 1\n" in result.output
+
+
+def test_migrate(mocked_dynamodb, runner):
+    DoiProcessAttempt(
+        doi="10.1002/term.3131",
+        process_attempts=0,
+        last_modified="2023-08-21 00:00:00",
+        status_code=1,
+    ).save()
+    result = runner.invoke(cli, ["migrate"])
+    assert result.exit_code == 0
+    assert "1 DOI items migrated" in result.output
+    assert DoiProcessAttempt.retrieve_unprocessed_dois() == ["10.1002/term.3131"]
+
+
+def test_archive(mocked_dynamodb, mocked_s3, s3_client, runner):
+    DoiProcessAttempt.add_item("10.1002/term.3131")
+    DoiProcessAttempt.get("10.1002/term.3131").update_status(status_code=3)
+    result = runner.invoke(cli, ["archive", "--min-age-days", "0"])
+    assert result.exit_code == 0
+    assert "1 DOI items archived" in result.output
+    assert s3_client.file_exists(
+        "awd", "archived/doi-items/index/10.1002%2Fterm.3131.json"
+    )
+
+
+def test_export(mocked_dynamodb, runner, tmp_path):
+    DoiProcessAttempt.add_item("10.1002/term.3131")
+    result = runner.invoke(
+        cli,
+        ["export", "--output", str(tmp_path), "--modified-since", "2023-08-21"],
+    )
+    assert result.exit_code == 0
+    assert f"1 DOI items exported to {tmp_path}" in result.output
+
+
 def test_listen_success(
     caplog,
     mocked_dynamodb,
@@ -190,3 +568,151 @@ def test_listen_message_error(
         assert result.exit_code == 0
         assert "Error while processing SQS message:" in caplog.text
         assert "Logs sent to" in caplog.text
+
+
+def test_listen_with_profile_writes_profile_and_summary(
+    caplog, tmp_path, mocked_dynamodb, mocked_ses, mocked_sqs_output, runner
+):
+    profile_path = tmp_path / "listen.prof"
+    with caplog.at_level(logging.DEBUG):
+        result = runner.invoke(
+            cli, ["--profile", str(profile_path), "--profile-email", "listen"]
+        )
+        assert result.exit_code == 0
+        assert profile_path.exists()
+        assert "cumulative" in (tmp_path / "listen.prof.txt").read_text()
+        assert f"Profile written to {profile_path}" in caplog.text
+        assert "Logs sent to" in caplog.text
+
+
+def test_listen_with_profile_writes_to_s3(
+    mocked_dynamodb, mocked_s3, mocked_ses, mocked_sqs_output, runner, s3_client
+):
+    result = runner.invoke(cli, ["--profile", "s3://awd/profiles/listen.prof", "listen"])
+    assert result.exit_code == 0
+    assert sorted(
+        s3_object["Key"]
+        for s3_object in s3_client.client.list_objects(Bucket="awd")["Contents"]
+    ) == ["profiles/listen.prof", "profiles/listen.prof.txt"]
+
+
+def test_cli_import_time_within_budget():
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import awd.cli"],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    cumulative_microseconds = next(
+        int(line.split("|")[1])
+        for line in result.stderr.splitlines()
+        if line.split("|")[-1].strip() == "awd.cli"
+    )
+    assert cumulative_microseconds < CLI_IMPORT_TIME_BUDGET_MICROSECONDS
+
+
+def test_cli_help_loads_no_heavy_modules():
+    script = (
+        "from awd.cli import cli\n"
+        "try:\n    cli(['--help'])\n"
+        "except SystemExit:\n    pass"
+    )
+    assert loaded_heavy_modules(script) == []
+
+
+def test_command_help_loads_no_heavy_modules():
+    for command in ("deposit", "listen", "export"):
+        script = (
+            "from awd.cli import cli\n"
+            f"try:\n    cli(['{command}', '--help'])\n"
+            "except SystemExit:\n    pass"
+        )
+        assert loaded_heavy_modules(script) == [], command
+
+
+def test_listen_loads_neither_smart_open_nor_requests():
+    # moto loads requests, so it is unloaded before listen runs to detect any import
+    script = """
+import sys
+
+import boto3
+from click.testing import CliRunner
+from moto import mock_aws
+
+with mock_aws():
+    boto3.client("sqs").create_queue(QueueName="mock-output-queue")
+    boto3.client("ses").verify_email_identity(EmailAddress="noreply@example.com")
+    for name in list(sys.modules):
+        if name.partition(".")[0] in ("requests", "smart_open"):
+            del sys.modules[name]
+    from awd.cli import cli
+
+    result = CliRunner().invoke(cli, ["listen"])
+    assert result.exit_code == 0, result.output
+"""
+    loaded_modules = loaded_heavy_modules(script)
+    assert "boto3" in loaded_modules
+    assert "smart_open" not in loaded_modules
+    assert "requests" not in loaded_modules
+
+
+def test_listen_with_workers_partitioned_by_doi(
+    caplog,
+    mocked_dynamodb,
+    mocked_ses,
+    mocked_sqs_output,
+    sample_doiprocessattempt,
+    sqs_client,
+    result_message_attributes_error,
+    result_message_attributes_success,
+    result_message_body_error,
+    result_message_body_success,
+    runner,
+):
+    with caplog.at_level(logging.INFO):
+        sqs_client.send(result_message_attributes_error, result_message_body_error)
+        sqs_client.send(result_message_attributes_success, result_message_body_success)
+        sqs_client.send(message_attributes={}, message_body={})
+        sample_doiprocessattempt.add_item("10.1002/term.3131")
+        sample_doiprocessattempt.add_item("222.2/2222")
+        result = runner.invoke(cli, ["listen", "--workers", "4", "--partition-by-doi"])
+        assert result.exit_code == 0
+        assert "DOI: 222.2/2222, Result: {'ResultType': 'error'" in caplog.text
+        assert "DOI: 10.1002/term.3131, Result: {'ResultType': 'success'" in caplog.text
+        assert "Error while processing SQS message:" in caplog.text
+        assert (
+            sample_doiprocessattempt.get("10.1002/term.3131").status_code
+            == Status.SUCCESS.value
+        )
+        assert next(sqs_client.receive(), None) is None
+
+
+def test_listen_follow_stops_on_sigterm(
+    caplog,
+    mocked_dynamodb,
+    mocked_ses,
+    mocked_sqs_output,
+    sample_doiprocessattempt,
+    sqs_client,
+    result_message_attributes_success,
+    result_message_body_success,
+    runner,
+):
+    with caplog.at_level(logging.DEBUG):
+        sqs_client.send(result_message_attributes_success, result_message_body_success)
+        sample_doiprocessattempt.add_item("10.1002/term.3131")
+        timer = threading.Timer(1, os.kill, (os.getpid(), signal.SIGTERM))
+        timer.start()
+        result = runner.invoke(
+            cli,
+            ["listen", "--follow", "--wait-time-seconds", "0", "--flush-interval", "0"],
+        )
+        timer.join()
+        assert result.exit_code == 0
+        assert "Shutdown requested" in caplog.text
+        assert "Logs sent to" in caplog.text
+        assert (
+            sample_doiprocessattempt.get("10.1002/term.3131").status_code
+            == Status.SUCCESS.value
+        )
+        assert next(sqs_client.receive(), None) is None
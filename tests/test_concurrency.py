@@ -0,0 +1,325 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+
+import pytest
+
+from awd.concurrency import (
+    BackgroundCall,
+    ByteBudget,
+    RequestHedger,
+    batched,
+    process_in_order,
+)
+from awd.logs import ContextFilter, log_context
+from awd.metrics import RUN_METRICS
+
+logger = logging.getLogger(__name__)
+
+
+def test_byte_budget_blocks_until_bytes_are_released():
+    RUN_METRICS.reset()
+    budget = ByteBudget(capacity=100)
+    budget.acquire(60)
+    acquired = threading.Event()
+
+    def acquire():
+        budget.acquire(60)
+        acquired.set()
+
+    thread = threading.Thread(target=acquire)
+    thread.start()
+    assert not acquired.wait(0.1)
+    budget.release(60)
+    thread.join(timeout=5)
+    assert acquired.is_set()
+    assert budget.in_use == 60  # noqa: PLR2004
+    assert budget.peak == 60  # noqa: PLR2004
+    assert RUN_METRICS.stage_summary()["byte_budget_wait"]["count"] == 1
+
+
+def test_byte_budget_allows_oversized_request_when_empty():
+    budget = ByteBudget(capacity=100)
+    budget.acquire(500)
+    assert budget.in_use == 500  # noqa: PLR2004
+
+
+def test_byte_budget_non_blocking_acquire_only_accounts():
+    budget = ByteBudget(capacity=100)
+    budget.acquire(100)
+    budget.acquire(50, block=False)
+    assert budget.in_use == 150  # noqa: PLR2004
+    assert budget.peak == 150  # noqa: PLR2004
+
+
+def test_batched():
+    assert list(batched(range(5), 2)) == [[0, 1], [2, 3], [4]]
+
+
+def test_batched_empty():
+    assert list(batched([], 2)) == []
+
+
+def test_process_in_order_logs_in_input_order(caplog):
+    def process(item):
+        time.sleep(0.01 * (5 - item))
+        logger.info("Processed %s", item)
+
+    with caplog.at_level(logging.INFO):
+        outcomes = list(process_in_order(process, range(5), workers=5))
+    assert outcomes == [(item, None) for item in range(5)]
+    assert [record.getMessage() for record in caplog.records] == [
+        f"Processed {item}" for item in range(5)
+    ]
+
+
+def test_process_in_order_isolates_errors():
+    def process(item):
+        if item == 1:
+            raise ValueError(item)
+
+    outcomes = list(process_in_order(process, range(3), workers=2))
+    assert [item for item, _ in outcomes] == [0, 1, 2]
+    assert outcomes[0][1] is None
+    assert isinstance(outcomes[1][1], ValueError)
+    assert outcomes[2][1] is None
+
+
+def test_process_in_order_cancels_items_after_consumer_raises(caplog):
+    started = []
+
+    def process(item):
+        started.append(item)
+        if item == 0:
+            raise ValueError(item)
+        time.sleep(0.01)
+        logger.info("Processed %s", item)
+
+    def consume():
+        with closing(process_in_order(process, range(20), workers=1)) as outcomes:
+            for _, error in outcomes:
+                if error:
+                    raise error
+
+    with caplog.at_level(logging.INFO), pytest.raises(ValueError, match="0"):
+        consume()
+    # only an item already in progress when the consumer raised may have run
+    assert len(started) <= 2  # noqa: PLR2004
+    assert [record.getMessage() for record in caplog.records] == [
+        f"Processed {item}" for item in started[1:]
+    ]
+
+
+def test_process_in_order_raises_base_exception():
+    class AbortError(BaseException):
+        pass
+
+    def process(item):
+        logger.info("Processing %s", item)
+        if item == 1:
+            raise AbortError
+
+    outcomes = process_in_order(process, range(3), workers=2)
+    assert next(outcomes) == (0, None)
+    with pytest.raises(AbortError):
+        next(outcomes)
+
+
+def test_process_in_order_partition_key_processes_sequentially():
+    active = {"a": 0, "b": 0}
+    max_active = {"a": 0, "b": 0}
+    lock = threading.Lock()
+
+    def process(item):
+        key = item[0]
+        with lock:
+            active[key] += 1
+            max_active[key] = max(max_active[key], active[key])
+        time.sleep(0.01)
+        with lock:
+            active[key] -= 1
+
+    items = ["a1", "b1", "a2", "b2", "a3"]
+    outcomes = list(
+        process_in_order(process, items, workers=4, partition_key=lambda item: item[0])
+    )
+    assert [item for item, _ in outcomes] == items
+    assert max_active == {"a": 1, "b": 1}
+
+
+@pytest.fixture
+def request_hedger():
+    hedger = RequestHedger(percentile=95, max_hedge_rate=1, min_observations=5)
+    hedger.latencies.extend([0.01] * 10)
+    yield hedger
+    hedger.shutdown()
+
+
+def slow_first_request(seconds, first_error=None):
+    calls = []
+    lock = threading.Lock()
+
+    def request():
+        with lock:
+            calls.append(None)
+            first = len(calls) == 1
+        if first:
+            time.sleep(seconds)
+            if first_error:
+                raise first_error
+            return "primary"
+        return "hedge"
+
+    return request, calls
+
+
+def test_request_hedger_does_not_hedge_before_enough_observations():
+    hedger = RequestHedger(min_observations=5)
+    request, calls = slow_first_request(0.05)
+    assert hedger.hedge_delay() is None
+    assert hedger.call(request) == "primary"
+    assert len(calls) == 1
+    assert len(hedger.latencies) == 1
+    hedger.shutdown()
+
+
+def test_request_hedger_hedge_delay_tracks_percentile(request_hedger):
+    request_hedger.latencies.extend([0.5] * 10)
+    assert request_hedger.hedge_delay() == 0.5  # noqa: PLR2004
+
+
+def test_request_hedger_uses_first_answer(request_hedger):
+    RUN_METRICS.reset()
+    request, calls = slow_first_request(0.5)
+    start = time.perf_counter()
+    assert request_hedger.call(request) == "hedge"
+    assert time.perf_counter() - start < 0.5  # noqa: PLR2004
+    assert len(calls) == 2  # noqa: PLR2004
+    assert RUN_METRICS.counters["hedged_requests"] == 1
+    assert RUN_METRICS.counters["hedge_wins"] == 1
+
+
+def test_request_hedger_fast_request_is_not_hedged(request_hedger):
+    assert request_hedger.call(lambda: "primary") == "primary"
+    assert request_hedger.hedges == 0
+
+
+def test_request_hedger_respects_max_hedge_rate(request_hedger):
+    request_hedger.max_hedge_rate = 0
+    request, calls = slow_first_request(0.05)
+    assert request_hedger.call(request) == "primary"
+    assert len(calls) == 1
+
+
+def test_request_hedger_uses_answer_after_error(request_hedger):
+    request, _ = slow_first_request(0.05, first_error=ValueError("error"))
+    assert request_hedger.call(request) == "hedge"
+
+
+def test_request_hedger_raises_error_if_all_requests_fail(request_hedger):
+    def request():
+        time.sleep(0.05)
+        message = "error"
+        raise ValueError(message)
+
+    with pytest.raises(ValueError, match="error"):
+        request_hedger.call(request)
+
+
+def test_request_hedger_logs_answer_in_caller_context(caplog, request_hedger):
+    caplog.set_level("INFO")
+    calls = []
+    lock = threading.Lock()
+
+    def request():
+        with lock:
+            calls.append(None)
+            name = "primary" if len(calls) == 1 else "hedge"
+        if name == "primary":
+            time.sleep(0.2)
+        record = logging.LogRecord(__name__, logging.INFO, __file__, 1, "", None, None)
+        ContextFilter().filter(record)
+        logger.info("%s request for %s", name, record.doi)
+        return name
+
+    def process(doi):
+        with log_context(doi=doi):
+            assert request_hedger.call(request) == "hedge"
+        # the beaten primary request logs while the caller's records are still held
+        time.sleep(0.3)
+
+    for _, error in process_in_order(process, ["10.1/1"], workers=1):
+        assert error is None
+    assert [record.getMessage() for record in caplog.records] == [
+        "hedge request for 10.1/1"
+    ]
+
+
+def test_background_call_replays_records_in_caller_order(caplog):
+    caplog.set_level("INFO")
+
+    def process(item):
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            call = BackgroundCall(
+                executor, lambda: logger.info("background %s", item) or item
+            )
+            time.sleep(0.01)
+            logger.info("caller %s", item)
+            assert call.result() == item
+
+    for _, error in process_in_order(process, [1, 2, 3], workers=3):
+        assert error is None
+    assert [record.message for record in caplog.records] == [
+        "caller 1",
+        "background 1",
+        "caller 2",
+        "background 2",
+        "caller 3",
+        "background 3",
+    ]
+
+
+def test_background_call_runs_in_caller_context():
+    def record_doi():
+        record = logging.LogRecord(__name__, logging.INFO, __file__, 1, "", None, None)
+        ContextFilter().filter(record)
+        return record.doi
+
+    with ThreadPoolExecutor(max_workers=1) as executor, log_context(doi="10.1/1"):
+        assert BackgroundCall(executor, record_doi).result() == "10.1/1"
+
+
+def test_background_call_result_raises_exception():
+    def fail():
+        message = "error"
+        raise ValueError(message)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        call = BackgroundCall(executor, fail)
+        with pytest.raises(ValueError, match="error"):
+            call.result()
+
+
+def test_background_call_abandon_drops_records_and_exception(caplog):
+    caplog.set_level("INFO")
+    stop = threading.Event()
+
+    def process(_):
+        with ThreadPoolExecutor(max_workers=1) as executor:
+
+            def background():
+                logger.info("background")
+                stop.wait(1)
+                message = "stopped"
+                raise ValueError(message)
+
+            call = BackgroundCall(executor, background)
+            stop.set()
+            call.abandon()
+            assert call.future.done()
+
+    for _, error in process_in_order(process, [1], workers=1):
+        assert error is None
+    assert "background" not in caplog.text
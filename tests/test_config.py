@@ -29,3 +29,53 @@ def test_config_configure_logger(config_instance):
         config_instance.configure_logger(stream=io.StringIO())
         == "Logger 'root' configured with level=INFO"
     )
+
+
+def test_config_aws_client_settings_defaults(config_instance):
+    assert config_instance.aws_client_settings() == {
+        "max_pool_connections": 50,
+        "connect_timeout": 10,
+        "read_timeout": 60,
+        "max_attempts": 5,
+    }
+
+
+def test_config_aws_client_settings_from_env(monkeypatch, config_instance):
+    monkeypatch.setenv("AWS_CLIENT_MAX_POOL_CONNECTIONS", "100")
+    monkeypatch.setenv("AWS_CLIENT_MAX_ATTEMPTS", "2")
+    settings = config_instance.aws_client_settings()
+    assert settings["max_pool_connections"] == 100  # noqa: PLR2004
+    assert settings["max_attempts"] == 2  # noqa: PLR2004
+
+
+def test_config_inflight_bytes_budget(monkeypatch, config_instance):
+    assert config_instance.inflight_bytes_budget() == 512 * 1024 * 1024
+    monkeypatch.setenv("INFLIGHT_BYTES_BUDGET", "1048576")
+    assert config_instance.inflight_bytes_budget() == 1048576  # noqa: PLR2004
+
+
+def test_config_doi_lease_seconds(monkeypatch, config_instance):
+    assert config_instance.doi_lease_seconds() == 900  # noqa: PLR2004
+    monkeypatch.setenv("DOI_LEASE_SECONDS", "60")
+    assert config_instance.doi_lease_seconds() == 60  # noqa: PLR2004
+
+
+def test_config_content_retry_settings(monkeypatch, config_instance):
+    assert config_instance.content_retry_settings() == {
+        "base_seconds": 3600,
+        "max_seconds": 604800,
+        "threshold": 10,
+    }
+    monkeypatch.setenv("CONTENT_RETRY_THRESHOLD", "3")
+    assert config_instance.content_retry_settings()["threshold"] == 3  # noqa: PLR2004
+
+
+def test_config_dss_retry_settings(monkeypatch, config_instance):
+    monkeypatch.setenv("RETRY_THRESHOLD", "3")
+    assert config_instance.dss_retry_settings() == {
+        "base_seconds": 900,
+        "max_seconds": 86400,
+        "threshold": 3,
+    }
+    monkeypatch.setenv("DSS_RETRY_BASE_SECONDS", "60")
+    assert config_instance.dss_retry_settings()["base_seconds"] == 60  # noqa: PLR2004
@@ -1,3 +1,14 @@
+import logging
+import time
+
+import pytest
+
+from awd.database import (
+    DoiLeaseLostError,
+    DoiProcessAttempt,
+    StatusCounts,
+    TimestampsMigration,
+)
 from awd.status import Status
 
 
@@ -56,9 +67,245 @@ def test_sqs_error_update_status_below_retry_threshold_set_unprocessed_status(
     )
 
 
+def test_sqs_error_update_status_not_retryable_set_failed_status(
+    caplog,
+    sample_doiprocessattempt,
+):
+    sample_doiprocessattempt.doi = "222.2/2222"
+    sample_doiprocessattempt.sqs_error_update_status(retry_threshold=30, retryable=False)
+    assert sample_doiprocessattempt.get("222.2/2222").status_code == Status.FAILED.value
+    assert (
+        "DOI: '222.2/2222' has a DSS error that is not retryable and will not be "
+        "attempted again" in caplog.text
+    )
+
+
+def test_sqs_error_update_status_sets_next_attempt(sample_doiprocessattempt):
+    sample_doiprocessattempt.doi = "222.2/2222"
+    sample_doiprocessattempt.sqs_error_update_status(
+        retry_threshold=30, next_attempt_at=1000.0
+    )
+    item = sample_doiprocessattempt.get("222.2/2222")
+    assert item.next_attempt_at == 1000.0  # noqa: PLR2004
+
+
+def test_save_batch(mocked_dynamodb, sample_doiprocessattempt):
+    sample_doiprocessattempt.add_item(doi="111.1/1111")
+    sample_doiprocessattempt.add_item(doi="222.2/2222")
+    doi_process_attempts = [
+        DoiProcessAttempt.get("111.1/1111"),
+        DoiProcessAttempt.get("222.2/2222"),
+    ]
+    for doi_process_attempt in doi_process_attempts:
+        doi_process_attempt.set_status(status_code=Status.SUCCESS.value)
+    assert DoiProcessAttempt.get("111.1/1111").status_code == Status.UNPROCESSED.value
+    DoiProcessAttempt.save_batch(doi_process_attempts)
+    assert DoiProcessAttempt.get("111.1/1111").status_code == Status.SUCCESS.value
+    assert DoiProcessAttempt.get("222.2/2222").status_code == Status.SUCCESS.value
+
+
+def test_sqs_error_status_code(sample_doiprocessattempt):
+    assert (
+        sample_doiprocessattempt.sqs_error_status_code(retry_threshold=10)
+        == Status.UNPROCESSED.value
+    )
+    assert (
+        sample_doiprocessattempt.sqs_error_status_code(retry_threshold=0)
+        == Status.FAILED.value
+    )
+
+
 def test_update_status(mocked_dynamodb, sample_doiprocessattempt):
     sample_doiprocessattempt.update_status(status_code=Status.MESSAGE_SENT.value)
     assert (
         sample_doiprocessattempt.get("10.1002/term.3131").status_code
         == Status.MESSAGE_SENT.value
     )
+
+
+def test_configure_connection(monkeypatch, mocked_dynamodb, sample_doiprocessattempt):
+    for setting in [
+        "max_pool_connections",
+        "connect_timeout_seconds",
+        "read_timeout_seconds",
+        "max_retry_attempts",
+    ]:
+        monkeypatch.setattr(
+            DoiProcessAttempt.Meta, setting, getattr(DoiProcessAttempt.Meta, setting)
+        )
+    sample_doiprocessattempt.add_item(doi="222.2/2222")
+    DoiProcessAttempt.configure_connection(
+        max_pool_connections=64, connect_timeout=5, read_timeout=20, max_attempts=4
+    )
+    assert DoiProcessAttempt._connection is None  # noqa: SLF001
+    connection = DoiProcessAttempt._get_connection()  # noqa: SLF001
+    config = connection.connection.client.meta.config
+    assert config.max_pool_connections == 64  # noqa: PLR2004
+    assert config.connect_timeout == 5  # noqa: PLR2004
+    assert config.read_timeout == 20  # noqa: PLR2004
+    assert DoiProcessAttempt.get("222.2/2222").status_code == Status.UNPROCESSED.value
+
+
+def test_acquire_lease_held_by_another_owner_fails(sample_doiprocessattempt):
+    sample_doiprocessattempt.save()
+    assert sample_doiprocessattempt.acquire_lease("deposit-1", 60)
+    other = DoiProcessAttempt.get("10.1002/term.3131")
+    assert not other.acquire_lease("deposit-2", 60)
+    assert other.lease_owner == "deposit-1"
+
+
+def test_acquire_lease_reclaims_expired_lease(caplog, sample_doiprocessattempt):
+    sample_doiprocessattempt.lease_owner = "deposit-1"
+    sample_doiprocessattempt.lease_expires_at = time.time() - 1
+    sample_doiprocessattempt.save()
+    with caplog.at_level(logging.INFO):
+        assert sample_doiprocessattempt.acquire_lease("deposit-2", 60)
+    assert DoiProcessAttempt.get("10.1002/term.3131").lease_owner == "deposit-2"
+    assert "Expired lease on 10.1002/term.3131 reclaimed from deposit-1" in caplog.text
+
+
+def test_acquire_lease_requires_unprocessed_status(sample_doiprocessattempt):
+    sample_doiprocessattempt.update_status(status_code=Status.MESSAGE_SENT.value)
+    assert not sample_doiprocessattempt.acquire_lease("deposit-1", 60)
+
+
+def test_release_lease(caplog, sample_doiprocessattempt):
+    sample_doiprocessattempt.save()
+    sample_doiprocessattempt.acquire_lease("deposit-1", 60)
+    sample_doiprocessattempt.release_lease("deposit-2")
+    assert "Lease on 10.1002/term.3131 was no longer held by deposit-2" in caplog.text
+    sample_doiprocessattempt.release_lease("deposit-1")
+    assert DoiProcessAttempt.get("10.1002/term.3131").lease_owner is None
+
+
+def test_leased_writes_fail_after_expired_lease_is_reclaimed(
+    caplog, sample_doiprocessattempt
+):
+    sample_doiprocessattempt.save()
+    assert sample_doiprocessattempt.acquire_lease("deposit-1", -1)
+    reclaimed = DoiProcessAttempt.get("10.1002/term.3131")
+    assert reclaimed.acquire_lease("deposit-2", 60)
+    reclaimed.increment_process_attempts(lease_owner="deposit-2")
+    with pytest.raises(DoiLeaseLostError):
+        sample_doiprocessattempt.increment_process_attempts(lease_owner="deposit-1")
+    with pytest.raises(DoiLeaseLostError):
+        sample_doiprocessattempt.update_status(
+            status_code=Status.MESSAGE_SENT.value, lease_owner="deposit-1"
+        )
+    item = DoiProcessAttempt.get("10.1002/term.3131")
+    assert item.lease_owner == "deposit-2"
+    assert item.process_attempts == 1
+    assert item.status_code == Status.UNPROCESSED.value
+    assert "Lease on 10.1002/term.3131 was lost by deposit-1" in caplog.text
+    reclaimed.update_status(
+        status_code=Status.MESSAGE_SENT.value, lease_owner="deposit-2"
+    )
+    assert DoiProcessAttempt.get("10.1002/term.3131").status_code == (
+        Status.MESSAGE_SENT.value
+    )
+
+
+def test_add_item_counts_new_dois_only(mocked_dynamodb):
+    DoiProcessAttempt.add_item("10.1002/term.3131")
+    DoiProcessAttempt.get("10.1002/term.3131").increment_process_attempts()
+    assert DoiProcessAttempt.add_item("10.1002/term.3131") == {}
+    assert DoiProcessAttempt.get("10.1002/term.3131").process_attempts == 1
+    assert StatusCounts.read() == {
+        "UNPROCESSED": 1,
+        "MESSAGE_SENT": 0,
+        "SUCCESS": 0,
+        "FAILED": 0,
+    }
+
+
+def test_update_status_moves_status_count(mocked_dynamodb):
+    DoiProcessAttempt.add_item("10.1002/term.3131")
+    doi_process_attempt = DoiProcessAttempt.get("10.1002/term.3131")
+    doi_process_attempt.update_status(status_code=Status.MESSAGE_SENT.value)
+    doi_process_attempt.update_status(status_code=Status.MESSAGE_SENT.value)
+    doi_process_attempt.sqs_error_update_status(retry_threshold=0)
+    status_counts = StatusCounts.read()
+    assert status_counts["UNPROCESSED"] == 0
+    assert status_counts["MESSAGE_SENT"] == 0
+    assert status_counts["FAILED"] == 1
+
+
+def test_status_counts_reconcile(mocked_dynamodb, sample_doiprocessattempt):
+    sample_doiprocessattempt.save()
+    DoiProcessAttempt.add_item("10.1002/new.0001")
+    StatusCounts.apply([(Status.SUCCESS.value, 5)])
+    assert StatusCounts.reconcile(segments=2) == {
+        "UNPROCESSED": 2,
+        "MESSAGE_SENT": 0,
+        "SUCCESS": 0,
+        "FAILED": 0,
+    }
+
+
+def test_retrieve_due_doi_process_attempts(mocked_dynamodb):
+    TimestampsMigration(completed_at=time.time()).save()
+    DoiProcessAttempt.add_item("10.1002/due.0001")
+    DoiProcessAttempt.add_item("10.1002/later.0001")
+    later = DoiProcessAttempt.get("10.1002/later.0001")
+    later.next_attempt_at = time.time() + 3600
+    later.save()
+    DoiProcessAttempt.add_item("10.1002/sent.0001")
+    DoiProcessAttempt.get("10.1002/sent.0001").update_status(
+        status_code=Status.MESSAGE_SENT.value
+    )
+    assert [
+        item.doi for item in DoiProcessAttempt.retrieve_due_doi_process_attempts()
+    ] == ["10.1002/due.0001"]
+    assert sorted(DoiProcessAttempt.retrieve_unprocessed_dois()) == [
+        "10.1002/due.0001",
+        "10.1002/later.0001",
+    ]
+
+
+def test_migrate_timestamps(mocked_dynamodb):
+    DoiProcessAttempt(
+        doi="10.1002/term.3131",
+        process_attempts=0,
+        last_modified="2023-08-21 00:00:00",
+        status_code=Status.UNPROCESSED.value,
+    ).save()
+    DoiProcessAttempt(
+        doi="10.1002/sent.0001",
+        process_attempts=1,
+        last_modified="2023-08-21 00:00:00",
+        status_code=Status.MESSAGE_SENT.value,
+    ).save()
+    DoiProcessAttempt.add_item("10.1002/new.0001")
+    assert DoiProcessAttempt.migrate_timestamps(segments=2) == 2  # noqa: PLR2004
+    migrated = DoiProcessAttempt.get("10.1002/term.3131")
+    assert migrated.last_modified_ts == 1692576000  # noqa: PLR2004
+    assert migrated.next_attempt_at == 1692576000  # noqa: PLR2004
+    assert DoiProcessAttempt.get("10.1002/sent.0001").next_attempt_at is None
+    assert TimestampsMigration.completed() is True
+    assert DoiProcessAttempt.migrate_timestamps() == 0
+
+
+def test_retrieve_due_doi_process_attempts_scans_until_timestamps_migrated(
+    caplog, mocked_dynamodb
+):
+    DoiProcessAttempt(
+        doi="10.1002/legacy.0001",
+        process_attempts=0,
+        last_modified="2023-08-21 00:00:00",
+        status_code=Status.UNPROCESSED.value,
+    ).save()
+    DoiProcessAttempt.add_item("10.1002/new.0001")
+    assert [
+        item.doi for item in DoiProcessAttempt.retrieve_due_doi_process_attempts()
+    ] == ["10.1002/legacy.0001", "10.1002/new.0001"]
+    assert sorted(DoiProcessAttempt.retrieve_unprocessed_dois()) == [
+        "10.1002/legacy.0001",
+        "10.1002/new.0001",
+    ]
+    assert "run 'awd migrate'" in caplog.text
+    DoiProcessAttempt.migrate_timestamps()
+    caplog.clear()
+    assert [
+        item.doi for item in DoiProcessAttempt.retrieve_due_doi_process_attempts()
+    ] == ["10.1002/legacy.0001", "10.1002/new.0001"]
+    assert "run 'awd migrate'" not in caplog.text
@@ -0,0 +1,253 @@
+import logging
+
+from awd.database import DoiProcessAttempt
+from awd.depositor import Depositor
+from awd.scheduler import DoiScheduler, RunDeadline
+from awd.status import Status
+
+
+def create_depositor(s3_client, sqs_client):
+    return Depositor(
+        s3_client=s3_client,
+        sqs_client=sqs_client,
+        bucket="awd",
+        metadata_url="http://example.com/works/",
+        content_url="http://example.com/doi/",
+        sqs_base_url="https://queue.amazonaws.com/123456789012/",
+        sqs_input_queue="mock-input-queue",
+        sqs_output_queue="mock-output-queue",
+        collection_handle="123.4/5678",
+    )
+
+
+def test_depositor_ingest_and_archive_spreadsheet(
+    doi_list_success, mocked_dynamodb, mocked_s3, s3_client, sqs_client
+):
+    s3_client.put_file(file_content=doi_list_success, bucket="awd", key="doi.csv")
+    depositor = create_depositor(s3_client, sqs_client)
+    assert depositor.ingest_spreadsheet("doi.csv") == ["10.1002/term.3131"]
+    assert DoiProcessAttempt.get("10.1002/term.3131")
+    depositor.archive_spreadsheet("doi.csv")
+    assert not s3_client.file_exists("awd", "doi.csv")
+    assert s3_client.file_exists("awd", "archived/doi.csv")
+
+
+def test_depositor_ingest_spreadsheet_returns_only_added_dois(
+    doi_list_success, mocked_dynamodb, mocked_s3, s3_client, sqs_client
+):
+    DoiProcessAttempt.add_item("10.1002/term.3131")
+    DoiProcessAttempt.get("10.1002/term.3131").update_status(
+        status_code=Status.SUCCESS.value
+    )
+    s3_client.put_file(file_content=doi_list_success, bucket="awd", key="doi.csv")
+    depositor = create_depositor(s3_client, sqs_client)
+    new_dois = depositor.ingest_spreadsheet("doi.csv")
+    assert new_dois == []
+    assert depositor.schedule_unprocessed_dois(new_dois) == []
+
+
+def test_depositor_schedule_unprocessed_dois(
+    mocked_dynamodb, s3_client, sqs_client, sample_doiprocessattempt
+):
+    sample_doiprocessattempt.save()
+    DoiProcessAttempt.add_item("10.1002/new.0001")
+    depositor = create_depositor(s3_client, sqs_client)
+    assert depositor.schedule_unprocessed_dois([]) == [
+        "10.1002/term.3131",
+        "10.1002/new.0001",
+    ]
+    depositor.scheduler = DoiScheduler({"new": 1})
+    assert depositor.schedule_unprocessed_dois(["10.1002/new.0001"]) == [
+        "10.1002/new.0001",
+        "10.1002/term.3131",
+    ]
+
+
+def test_depositor_process_dois_leaves_dois_after_deadline(
+    caplog, mocked_dynamodb, s3_client, sqs_client, sample_doiprocessattempt
+):
+    sample_doiprocessattempt.save()
+    deadline = RunDeadline(time_budget=None)
+    deadline.expire()
+    create_depositor(s3_client, sqs_client).process_dois(
+        ["10.1002/term.3131"], deadline=deadline
+    )
+    assert "Deadline reached, 1 DOIs left for the next run" in caplog.text
+    assert DoiProcessAttempt.get("10.1002/term.3131").process_attempts == 0
+
+
+def test_depositor_process_spreadsheet_events(
+    caplog,
+    doi_list_success,
+    mocked_web,
+    mocked_dynamodb,
+    mocked_sqs_event,
+    mocked_sqs_input,
+    s3_client,
+    sqs_client,
+    sqs_event_client,
+):
+    sqs_client.queue_name = "mock-input-queue"
+    depositor = create_depositor(s3_client, sqs_client)
+    s3_client.put_file(file_content=doi_list_success, bucket="awd", key="doi.csv")
+    with caplog.at_level(logging.INFO):
+        assert depositor.process_spreadsheet_events(sqs_event_client, 0) == 1
+    assert "Processing spreadsheet from S3 event: doi.csv" in caplog.text
+    assert s3_client.file_exists("awd", "archived/doi.csv")
+    assert s3_client.file_exists("awd", "10.1002-term.3131.pdf")
+    assert len(list(sqs_client.receive())) == 1
+    assert sqs_event_client.receive_batch(0, 1) == []
+
+
+def test_depositor_process_spreadsheet_events_skips_archived_spreadsheet(
+    caplog,
+    mocked_dynamodb,
+    mocked_sqs_event,
+    s3_client,
+    sqs_client,
+    sqs_event_client,
+    s3_event_message_body,
+):
+    depositor = create_depositor(s3_client, sqs_client)
+    mocked_sqs_event.send_message(MessageBody=s3_event_message_body)
+    with caplog.at_level(logging.INFO):
+        assert depositor.process_spreadsheet_events(sqs_event_client, 0) == 0
+    assert (
+        "Spreadsheet already archived, skipping: new folder/doi_success(2).csv"
+        in caplog.text
+    )
+    assert sqs_event_client.receive_batch(0, 1) == []
+
+
+def test_depositor_process_spreadsheet_events_leaves_failed_message_on_queue(
+    caplog,
+    mocked_dynamodb,
+    mocked_sqs_event,
+    s3_client,
+    sqs_client,
+    sqs_event_client,
+):
+    depositor = create_depositor(s3_client, sqs_client)
+    mocked_sqs_event.send_message(MessageBody="not json")
+    assert depositor.process_spreadsheet_events(sqs_event_client, 0) == 0
+    assert "Error while processing S3 event message" in caplog.text
+    mocked_sqs_event.reload()
+    assert mocked_sqs_event.attributes["ApproximateNumberOfMessagesNotVisible"] == "1"
+
+
+def test_depositor_enqueue_and_process_work_queue(
+    mocked_web,
+    mocked_dynamodb,
+    mocked_sqs_input,
+    mocked_sqs_work,
+    s3_client,
+    sqs_client,
+    sqs_work_client,
+):
+    sqs_client.queue_name = "mock-input-queue"
+    DoiProcessAttempt.add_item("10.1002/term.3131")
+    depositor = create_depositor(s3_client, sqs_client)
+    assert depositor.enqueue_dois(sqs_work_client, ["10.1002/term.3131"], "run-1") == 1
+    completed_count = depositor.process_work_queue(
+        sqs_work_client, "worker-1", collect_errors=str, wait_time_seconds=0
+    )
+    assert completed_count == 1
+    assert s3_client.file_exists("awd", "10.1002-term.3131.pdf")
+    assert sqs_work_client.approximate_message_count() == 0
+    assert depositor.collect_worker_reports("run-1") == ""
+
+
+def test_depositor_process_work_queue_reports_errors_and_leaves_failed_item(
+    caplog,
+    monkeypatch,
+    mocked_dynamodb,
+    mocked_sqs_work,
+    s3_client,
+    sqs_client,
+    sqs_work_client,
+):
+    def process_doi(*_):
+        message = "unexpected"
+        raise RuntimeError(message)
+
+    depositor = create_depositor(s3_client, sqs_client)
+    monkeypatch.setattr(depositor, "process_doi", process_doi)
+    depositor.enqueue_dois(sqs_work_client, ["10.1002/term.3131"], "run-1")
+    completed_count = depositor.process_work_queue(
+        sqs_work_client,
+        "worker-1",
+        collect_errors=lambda: "ERROR work item failed\n",
+        wait_time_seconds=0,
+    )
+    assert completed_count == 0
+    assert "left on the queue for retry" in caplog.text
+    assert sqs_work_client.approximate_message_count() == 1
+    assert s3_client.file_exists("awd", "reports/run-1/worker-1-000001.txt")
+    assert depositor.collect_worker_reports("run-1") == "ERROR work item failed\n"
+    assert list(s3_client.list_keys("awd", "reports/")) == []
+
+
+def test_depositor_process_work_queue_gives_up_after_max_receives(
+    caplog,
+    monkeypatch,
+    mocked_dynamodb,
+    mocked_sqs_work,
+    s3_client,
+    sqs_client,
+    sqs_work_client,
+):
+    def process_doi(*_):
+        message = "unexpected"
+        raise RuntimeError(message)
+
+    depositor = create_depositor(s3_client, sqs_client)
+    monkeypatch.setattr(depositor, "process_doi", process_doi)
+    depositor.enqueue_dois(sqs_work_client, ["10.1002/term.3131"], "run-1")
+    assert (
+        depositor.process_work_queue(
+            sqs_work_client,
+            "worker-1",
+            collect_errors=str,
+            wait_time_seconds=0,
+            visibility_timeout=0,
+            max_receives=2,
+        )
+        == 1
+    )
+    assert caplog.text.count("left on the queue for retry") == 2  # noqa: PLR2004
+    assert "was received 3 times without completing" in caplog.text
+    assert sqs_work_client.approximate_message_count() == 0
+
+
+def test_depositor_process_work_queue_releases_items_after_deadline(
+    mocked_dynamodb, mocked_sqs_work, s3_client, sqs_client, sqs_work_client
+):
+    depositor = create_depositor(s3_client, sqs_client)
+    depositor.enqueue_dois(sqs_work_client, ["10.1002/term.3131"], "run-1")
+    deadline = RunDeadline(time_budget=None)
+    sqs_messages = depositor.receive_work_items(sqs_work_client, 0, 300)
+    deadline.expire()
+    assert depositor.process_work_items(sqs_messages, deadline) == (
+        [],
+        [sqs_messages[0]["ReceiptHandle"]],
+    )
+
+
+def test_depositor_wait_for_work_queue_stops_at_deadline(
+    mocked_sqs_work, s3_client, sqs_client, sqs_work_client
+):
+    depositor = create_depositor(s3_client, sqs_client)
+    assert depositor.wait_for_work_queue(sqs_work_client, 0) == 0
+    depositor.enqueue_dois(sqs_work_client, ["10.1002/term.3131"], "run-1")
+    deadline = RunDeadline(time_budget=None)
+    deadline.expire()
+    assert depositor.wait_for_work_queue(sqs_work_client, 0, deadline=deadline) == 1
+
+
+def test_depositor_wait_for_work_queue_stops_when_queue_stalls(
+    caplog, mocked_sqs_work, s3_client, sqs_client, sqs_work_client
+):
+    depositor = create_depositor(s3_client, sqs_client)
+    depositor.enqueue_dois(sqs_work_client, ["10.1002/term.3131"], "run-1")
+    assert depositor.wait_for_work_queue(sqs_work_client, 0, stall_timeout=0) == 1
+    assert "Work queue has made no progress for 0 seconds" in caplog.text
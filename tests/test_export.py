@@ -0,0 +1,58 @@
+import gzip
+import json
+
+import pytest
+from freezegun import freeze_time
+
+from awd.database import DoiProcessAttempt
+from awd.export import DoiTableExport
+
+
+def read_jsonl_parts(directory):
+    return [
+        json.loads(line)
+        for path in sorted(directory.glob("part-*.jsonl.gz"))
+        for line in gzip.decompress(path.read_bytes()).decode().splitlines()
+    ]
+
+
+def test_export_jsonl_parts(mocked_dynamodb, tmp_path):
+    DoiProcessAttempt.add_item("10.1002/term.3131")
+    DoiProcessAttempt.add_item("10.1002/new.0001")
+    tmp_path = tmp_path / "snapshot"
+    row_count = DoiTableExport(str(tmp_path), total_segments=3, rate_limit=100).run()
+    assert row_count == 2  # noqa: PLR2004
+    assert len(list(tmp_path.glob("part-*.jsonl.gz"))) == 3  # noqa: PLR2004
+    rows = read_jsonl_parts(tmp_path)
+    assert sorted(row["doi"] for row in rows) == ["10.1002/new.0001", "10.1002/term.3131"]
+    assert rows[0]["status"] == "UNPROCESSED"
+
+
+def test_export_modified_since(mocked_dynamodb, tmp_path):
+    with freeze_time("2023-08-21"):
+        DoiProcessAttempt.add_item("10.1002/term.3131")
+    with freeze_time("2023-09-01"):
+        DoiProcessAttempt.add_item("10.1002/new.0001")
+    table_export = DoiTableExport(str(tmp_path), modified_since="2023-08-22 00:00:00")
+    assert table_export.run() == 1
+    assert [row["doi"] for row in read_jsonl_parts(tmp_path)] == ["10.1002/new.0001"]
+
+
+def test_export_to_s3(mocked_dynamodb, mocked_s3, s3_client):
+    DoiProcessAttempt.add_item("10.1002/term.3131")
+    assert DoiTableExport("s3://awd/exports/", total_segments=1).run() == 1
+    part = s3_client.get_file("awd", "exports/part-00000.jsonl.gz")
+    assert json.loads(gzip.decompress(part))["doi"] == "10.1002/term.3131"
+
+
+def test_export_parquet(mocked_dynamodb, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    DoiProcessAttempt.add_item("10.1002/term.3131")
+    assert DoiTableExport(str(tmp_path), "parquet", total_segments=2).run() == 1
+    table = pq.read_table(tmp_path)
+    assert table.column("doi").to_pylist() == ["10.1002/term.3131"]
+
+
+def test_export_unknown_format_raises_error():
+    with pytest.raises(ValueError, match="Unknown export format: csv"):
+        DoiTableExport("exports", "csv")
@@ -1,21 +1,61 @@
+import datetime
+import json
 import logging
 from email.mime.multipart import MIMEMultipart
 from http import HTTPStatus
-from io import StringIO
+from io import BytesIO, StringIO
 
 import pytest
 from botocore.exceptions import ClientError
+from freezegun import freeze_time
 
+from awd.concurrency import RequestHedger
+from awd.database import DoiProcessAttempt
 from awd.helpers import (
+    ClientFactory,
     InvalidSQSMessageError,
+    configure_aws_clients,
+    drain_log_stream,
+    dss_error_is_retryable,
     filter_log_stream,
     get_crossref_response_from_doi,
     get_dois_from_spreadsheet,
+    get_s3_keys_from_event_message,
     get_wiley_response,
 )
+from awd.scheduler import BackoffSchedule
 from awd.status import Status
 
 
+# ClientFactory tests
+def test_client_factory_clients_share_session(s3_client, ses_client, sqs_client):
+    session = ClientFactory.session
+    assert session is not None
+    ClientFactory.client("s3")
+    assert ClientFactory.session is session
+
+
+def test_configure_aws_clients(monkeypatch):
+    for setting in ["max_pool_connections", "connect_timeout", "read_timeout"]:
+        monkeypatch.setattr(ClientFactory, setting, getattr(ClientFactory, setting))
+    for setting in ["max_pool_connections", "max_retry_attempts"]:
+        monkeypatch.setattr(
+            DoiProcessAttempt.Meta, setting, getattr(DoiProcessAttempt.Meta, setting)
+        )
+    monkeypatch.setattr(ClientFactory, "max_attempts", ClientFactory.max_attempts)
+    configure_aws_clients(
+        max_pool_connections=64, connect_timeout=5, read_timeout=20, max_attempts=4
+    )
+    config = ClientFactory.client("s3").meta.config
+    assert config.max_pool_connections == 64  # noqa: PLR2004
+    assert config.connect_timeout == 5  # noqa: PLR2004
+    assert config.read_timeout == 20  # noqa: PLR2004
+    assert config.retries == {"mode": "adaptive", "total_max_attempts": 4}
+    assert config.tcp_keepalive is True
+    assert DoiProcessAttempt.Meta.max_pool_connections == 64  # noqa: PLR2004
+    assert DoiProcessAttempt.Meta.max_retry_attempts == 3  # noqa: PLR2004
+
+
 # S3Client tests
 def test_s3_archive_file_in_bucket(mocked_s3, s3_client):
     s3_client.put_file(
@@ -38,6 +78,24 @@ def test_s3_archive_file_in_bucket(mocked_s3, s3_client):
     assert response["ResponseMetadata"]["HTTPStatusCode"] == HTTPStatus.OK
 
 
+def test_s3_file_exists(mocked_s3, s3_client):
+    s3_client.put_file(file_content="test", bucket="awd", key="test.csv")
+    assert s3_client.file_exists(bucket="awd", key="test.csv")
+    assert not s3_client.file_exists(bucket="awd", key="missing.csv")
+
+
+def test_s3_list_get_and_delete_files(mocked_s3, s3_client):
+    s3_client.put_file("b", "awd", "reports/run-1/b.txt")
+    s3_client.put_file("a", "awd", "reports/run-1/a.txt")
+    s3_client.put_file("c", "awd", "doi.csv")
+    keys = sorted(s3_client.list_keys("awd", "reports/run-1/"))
+    assert keys == ["reports/run-1/a.txt", "reports/run-1/b.txt"]
+    assert s3_client.get_file("awd", "reports/run-1/a.txt") == b"a"
+    s3_client.delete_files("awd", keys)
+    assert list(s3_client.list_keys("awd", "reports/")) == []
+    assert s3_client.file_exists("awd", "doi.csv")
+
+
 def test_s3_put_file(mocked_s3, s3_client):
     assert "Contents" not in s3_client.client.list_objects(Bucket="awd")
     s3_client.put_file(
@@ -51,6 +109,24 @@ def test_s3_put_file(mocked_s3, s3_client):
     )
 
 
+def test_s3_put_file_streams_file_object(mocked_s3, s3_client):
+    s3_client.put_file(BytesIO(b"%PDF-1.4"), "awd", "10.1002-term.3131.pdf")
+    assert s3_client.get_file("awd", "10.1002-term.3131.pdf") == b"%PDF-1.4"
+
+
+def test_s3_copy_file_and_uri(mocked_s3, s3_client):
+    s3_client.put_file("test", "awd", "test.csv")
+    s3_client.copy_file("awd", "test.csv", "copy/test.csv")
+    assert s3_client.get_file("awd", "copy/test.csv") == b"test"
+    assert s3_client.uri("awd", "copy/test.csv") == "s3://awd/copy/test.csv"
+
+
+def test_s3_check_bucket_access(caplog, mocked_s3, s3_client):
+    assert s3_client.check_bucket_access("awd")
+    assert not s3_client.check_bucket_access("not-a-bucket")
+    assert "Error accessing bucket: not-a-bucket" in caplog.text
+
+
 def test_s3_retrieve_file_type_from_bucket_with_matching_csv(mocked_s3, s3_client):
     s3_client.put_file(
         file_content="test1,test2,test3,test4",
@@ -80,6 +156,32 @@ def test_s3_retrieve_file_type_from_bucket_without_matching_csv(mocked_s3, s3_cl
     )
 
 
+def test_s3_retrieve_file_type_from_bucket_skips_excluded_prefix(
+    monkeypatch, mocked_s3, s3_client
+):
+    for key in [
+        "doi.csv",
+        "incoming/doi.csv",
+        "archived/doi.csv",
+        "archived/doi-items/index/10.1002%2Fterm.3131.json",
+    ]:
+        s3_client.put_file(file_content="10.1002/term.3131", bucket="awd", key=key)
+    listed_prefixes = []
+    list_children = s3_client.list_children
+
+    def record_list_children(bucket, prefix):
+        listed_prefixes.append(prefix)
+        return list_children(bucket, prefix)
+
+    monkeypatch.setattr(s3_client, "list_children", record_list_children)
+    assert sorted(
+        s3_client.retrieve_file_type_from_bucket(
+            bucket="awd", file_type="csv", excluded_key_prefix="archived"
+        )
+    ) == ["doi.csv", "incoming/doi.csv"]
+    assert listed_prefixes == ["", "incoming/"]
+
+
 # SESClient tests
 def test_ses_create_email(ses_client):
     message = ses_client.create_email(
@@ -132,6 +234,24 @@ def test_sqs_create_dss_message_body(sqs_client, submission_message_body):
     assert dss_message_body == submission_message_body
 
 
+def test_sqs_delete_batch_and_change_visibility_batch(
+    mocked_sqs_output,
+    sqs_client,
+    result_message_attributes_success,
+    result_message_body_success,
+):
+    for _ in range(12):
+        sqs_client.send(result_message_attributes_success, result_message_body_success)
+    receipt_handles = [message["ReceiptHandle"] for message in sqs_client.receive()]
+    assert len(receipt_handles) == 12  # noqa: PLR2004
+    sqs_client.change_visibility_batch(receipt_handles, visibility_timeout=0)
+    receipt_handles = [message["ReceiptHandle"] for message in sqs_client.receive()]
+    assert len(receipt_handles) == 12  # noqa: PLR2004
+    sqs_client.delete_batch(receipt_handles)
+    sqs_client.change_visibility_batch(receipt_handles, visibility_timeout=0)
+    assert next(sqs_client.receive(), None) is None
+
+
 def test_sqs_delete_nonexistent_message_raises_error(mocked_sqs_output, sqs_client):
     with pytest.raises(ClientError):
         sqs_client.delete(receipt_handle="12345678")
@@ -176,6 +296,92 @@ def test_sqs_process_result_message_error(
     )
 
 
+@freeze_time("2024-01-01 00:00:00")
+def test_sqs_process_result_message_error_schedules_next_attempt(
+    caplog,
+    mocked_sqs_output,
+    sqs_client,
+    sample_doiprocessattempt,
+    result_message_attributes_error,
+    result_message_body_error,
+):
+    caplog.set_level("INFO")
+    sample_doiprocessattempt.add_item(doi="222.2/2222")
+    DoiProcessAttempt.get("222.2/2222").increment_process_attempts()
+    DoiProcessAttempt.get("222.2/2222").increment_process_attempts()
+    sqs_client.send(
+        message_attributes=result_message_attributes_error,
+        message_body=result_message_body_error,
+    )
+    sqs_client.process_result_message(
+        sqs_message=next(sqs_client.receive()),
+        retry_threshold=30,
+        dss_backoff=BackoffSchedule(60, 3600, 30),
+    )
+    item = DoiProcessAttempt.get("222.2/2222")
+    assert item.status_code == Status.UNPROCESSED.value
+    assert (
+        item.next_attempt_at
+        == datetime.datetime(2024, 1, 1, 0, 2, tzinfo=datetime.UTC).timestamp()
+    )
+    assert "DSS error is retryable, next attempt in 120 seconds" in caplog.text
+
+
+def test_sqs_process_result_message_non_retryable_error_sets_failed_status(
+    caplog,
+    mocked_sqs_output,
+    sqs_client,
+    sample_doiprocessattempt,
+    result_message_attributes_error,
+):
+    sample_doiprocessattempt.add_item(doi="222.2/2222")
+    sqs_client.send(
+        message_attributes=result_message_attributes_error,
+        message_body=json.dumps(
+            {
+                "ResultType": "error",
+                "ErrorInfo": "Error occurred while posting item to DSpace",
+                "ExceptionMessage": "422 Client Error: Unprocessable Entity",
+            }
+        ),
+    )
+    sqs_client.process_result_message(
+        sqs_message=next(sqs_client.receive()),
+        retry_threshold=30,
+    )
+    item = DoiProcessAttempt.get("222.2/2222")
+    assert item.status_code == Status.FAILED.value
+    assert item.next_attempt_at is None
+    assert "DSS error that is not retryable" in caplog.text
+
+
+@pytest.mark.parametrize(
+    ("exception_message", "retryable"),
+    [
+        ("500 Server Error: Internal Server Error", True),
+        ("503 Server Error: Service Unavailable", True),
+        ("429 Client Error: Too Many Requests", True),
+        ("400 Client Error: Bad Request", False),
+        ("403 Client Error: Forbidden", False),
+        ("Read timed out. (read timeout=60)", True),
+        (None, True),
+    ],
+)
+def test_dss_error_is_retryable(exception_message, retryable):
+    assert (
+        dss_error_is_retryable(
+            {"ResultType": "error", "ExceptionMessage": exception_message}
+        )
+        is retryable
+    )
+
+
+def test_dss_error_is_retryable_uses_error_info():
+    assert not dss_error_is_retryable(
+        {"ResultType": "error", "ErrorInfo": "404 Client Error: Not Found"}
+    )
+
+
 def test_sqs_process_result_message_raises_invalid_sqs_exception(
     mocked_sqs_output,
     sqs_client,
@@ -237,6 +443,26 @@ def test_sqs_receive_success(
         assert message["MessageAttributes"] == result_message_attributes_success
 
 
+def test_sqs_receive_batch(
+    mocked_sqs_output,
+    sqs_client,
+    result_message_attributes_success,
+    result_message_body_success,
+):
+    sqs_client.send(result_message_attributes_success, result_message_body_success)
+    messages = sqs_client.receive_batch(wait_time_seconds=0, visibility_timeout=30)
+    assert len(messages) == 1
+    assert sqs_client.receive_batch(wait_time_seconds=0, visibility_timeout=30) == []
+
+
+def test_sqs_send_batch_and_approximate_message_count(mocked_sqs_output, sqs_client):
+    message_bodies = [f"message {index}" for index in range(12)]
+    assert sqs_client.send_batch(message_bodies) == 12  # noqa: PLR2004
+    assert sqs_client.approximate_message_count() == 12  # noqa: PLR2004
+    sqs_client.receive_batch(wait_time_seconds=0, visibility_timeout=30)
+    assert sqs_client.approximate_message_count() == 12  # noqa: PLR2004
+
+
 def test_sqs_send_raises_error_for_incorrect_queue(
     mocked_sqs_input, sqs_client, submission_message_attributes, submission_message_body
 ):
@@ -280,6 +506,13 @@ def test_sqs_valid_result_message_body_true(
 
 
 # Function tests
+def test_drain_log_stream():
+    stream = StringIO()
+    stream.write("INFO message\n")
+    assert drain_log_stream(stream) == "INFO message\n"
+    assert stream.getvalue() == ""
+
+
 def test_filter_log_stream():
     assert filter_log_stream(StringIO("ERROR\nINFO\nDEBUG\n")) == "ERROR\n"
 
@@ -292,12 +525,90 @@ def test_get_crossref_work_from_doi(mocked_web):
     assert work["message"]["title"] == ["Metal nanoparticles for bone tissue engineering"]
 
 
+def test_get_crossref_work_from_doi_with_hedger(mocked_web):
+    hedger = RequestHedger()
+    response = get_crossref_response_from_doi(
+        url="http://example.com/works/", doi="10.1002/term.3131", hedger=hedger
+    )
+    assert response.json()["message"]["title"] == [
+        "Metal nanoparticles for bone tissue engineering"
+    ]
+    assert len(hedger.latencies) == 1
+    hedger.shutdown()
+
+
 def test_get_dois_from_spreadsheet():
     dois = get_dois_from_spreadsheet(doi_csv_file="tests/fixtures/doi_success.csv")
     for doi in dois:
         assert doi == "10.1002/term.3131"
 
 
+def test_get_s3_keys_from_event_message(s3_event_message_body):
+    assert get_s3_keys_from_event_message(
+        {"Body": s3_event_message_body},
+        bucket="awd",
+        file_type=".csv",
+        excluded_key_prefix="archived",
+    ) == ["new folder/doi_success(2).csv"]
+
+
+def test_get_s3_keys_from_event_message_delivered_through_sns(s3_event_message_body):
+    sns_body = json.dumps({"Type": "Notification", "Message": s3_event_message_body})
+    assert get_s3_keys_from_event_message(
+        {"Body": sns_body},
+        bucket="awd",
+        file_type=".csv",
+        excluded_key_prefix="archived",
+    ) == ["new folder/doi_success(2).csv"]
+
+
+def test_get_s3_keys_from_event_message_ignores_test_event():
+    test_event = json.dumps({"Service": "Amazon S3", "Event": "s3:TestEvent"})
+    assert (
+        get_s3_keys_from_event_message(
+            {"Body": test_event},
+            bucket="awd",
+            file_type=".csv",
+            excluded_key_prefix="archived",
+        )
+        == []
+    )
+
+
+def test_get_s3_keys_from_event_message_ignores_other_buckets_and_keys(caplog):
+    body = json.dumps(
+        {
+            "Records": [
+                {
+                    "eventName": "ObjectCreated:Put",
+                    "s3": {"bucket": {"name": "other"}, "object": {"key": "a.csv"}},
+                },
+                {
+                    "eventName": "ObjectCreated:Copy",
+                    "s3": {
+                        "bucket": {"name": "awd"},
+                        "object": {"key": "archived/b.csv"},
+                    },
+                },
+                {
+                    "eventName": "ObjectRemoved:Delete",
+                    "s3": {"bucket": {"name": "awd"}, "object": {"key": "c.csv"}},
+                },
+            ]
+        }
+    )
+    assert (
+        get_s3_keys_from_event_message(
+            {"Body": body},
+            bucket="awd",
+            file_type=".csv",
+            excluded_key_prefix="archived",
+        )
+        == []
+    )
+    assert "Ignoring event for bucket: other" in caplog.text
+
+
 def test_get_wiley_response(mocked_web, wiley_pdf):
     response = get_wiley_response(url="http://example.com/doi/", doi="10.1002/term.3131")
     assert response.content == wiley_pdf
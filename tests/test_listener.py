@@ -0,0 +1,179 @@
+import logging
+import threading
+import time
+
+from botocore.exceptions import EndpointConnectionError
+
+from awd.database import StatusCounts
+from awd.listener import ResultBatch, ResultListener, VisibilityHeartbeat
+from awd.status import Status
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+
+
+def test_result_batch_flush_saves_status_and_deletes_messages(
+    mocked_sqs_output,
+    sample_doiprocessattempt,
+    sqs_client,
+    result_message_attributes_success,
+    result_message_body_success,
+):
+    sample_doiprocessattempt.add_item("10.1002/term.3131")
+    sqs_client.send(result_message_attributes_success, result_message_body_success)
+    result_batch = ResultBatch(sqs_client)
+    sqs_client.process_result_message(
+        sqs_message=next(sqs_client.receive()),
+        retry_threshold="10",
+        result_batch=result_batch,
+    )
+    assert (
+        sample_doiprocessattempt.get("10.1002/term.3131").status_code
+        == Status.UNPROCESSED.value
+    )
+    assert len(result_batch.flush()) == 1
+    assert (
+        sample_doiprocessattempt.get("10.1002/term.3131").status_code
+        == Status.SUCCESS.value
+    )
+    assert next(sqs_client.receive(), None) is None
+    assert result_batch.flush() == []
+    assert StatusCounts.read()["UNPROCESSED"] == 0
+    assert StatusCounts.read()["SUCCESS"] == 1
+
+
+def test_visibility_heartbeat_extends_in_flight_messages(
+    mocked_sqs_output,
+    sqs_client,
+    result_message_attributes_success,
+    result_message_body_success,
+):
+    sqs_client.send(result_message_attributes_success, result_message_body_success)
+    sqs_message = sqs_client.receive_batch(wait_time_seconds=0, visibility_timeout=1)[0]
+    heartbeat = VisibilityHeartbeat(sqs_client, visibility_timeout=60, interval=0.1)
+    heartbeat.add([sqs_message["ReceiptHandle"]])
+    heartbeat.start()
+    time.sleep(1.5)
+    heartbeat.stop()
+    assert sqs_client.receive_batch(wait_time_seconds=0, visibility_timeout=1) == []
+
+
+def test_result_listener_processes_messages_until_stopped(
+    caplog,
+    mocked_sqs_output,
+    sample_doiprocessattempt,
+    sqs_client,
+    result_message_attributes_error,
+    result_message_attributes_success,
+    result_message_body_error,
+    result_message_body_success,
+):
+    sample_doiprocessattempt.add_item("10.1002/term.3131")
+    sample_doiprocessattempt.add_item("222.2/2222")
+    sqs_client.send(result_message_attributes_success, result_message_body_success)
+    sqs_client.send(result_message_attributes_error, result_message_body_error)
+    digests = []
+    listener = ResultListener(
+        sqs_client=sqs_client,
+        retry_threshold="10",
+        send_digest=lambda: digests.append(caplog.text),
+        workers=2,
+        wait_time_seconds=0,
+        flush_interval=0,
+    )
+    with caplog.at_level(logging.INFO):
+        thread = threading.Thread(target=listener.run)
+        thread.start()
+        wait_for(
+            lambda: sample_doiprocessattempt.get("10.1002/term.3131").status_code
+            == Status.SUCCESS.value
+        )
+        listener.stop()
+        thread.join()
+    assert len(digests) == 1
+    assert "DOI: 222.2/2222, Result:" in digests[0]
+    assert "Stopped listening for result messages" in caplog.text
+    assert sqs_client.receive_batch(wait_time_seconds=0, visibility_timeout=1) == []
+
+
+def test_result_listener_skips_empty_digest(mocked_sqs_output, sqs_client):
+    digests = []
+    listener = ResultListener(
+        sqs_client=sqs_client,
+        retry_threshold="10",
+        send_digest=lambda: digests.append("digest"),
+        wait_time_seconds=0,
+        digest_interval=0,
+    )
+    listener.stop()
+    listener.run()
+    assert digests == []
+
+
+def test_result_listener_flush_failure_releases_messages(
+    caplog,
+    monkeypatch,
+    mocked_sqs_output,
+    sample_doiprocessattempt,
+    sqs_client,
+    result_message_attributes_success,
+    result_message_body_success,
+):
+    def save_batch(*_):
+        message = "Unable to write"
+        raise RuntimeError(message)
+
+    sample_doiprocessattempt.add_item("10.1002/term.3131")
+    sqs_client.send(result_message_attributes_success, result_message_body_success)
+    listener = ResultListener(
+        sqs_client=sqs_client,
+        retry_threshold="10",
+        send_digest=lambda: None,
+        visibility_timeout=1,
+    )
+    monkeypatch.setattr(listener.state_store, "save_batch", save_batch)
+    sqs_messages = sqs_client.receive_batch(wait_time_seconds=0, visibility_timeout=1)
+    listener.heartbeat.add(message["ReceiptHandle"] for message in sqs_messages)
+    listener.process(sqs_messages)
+    listener.flush()
+    assert "Unable to flush result messages" in caplog.text
+    assert listener.heartbeat.receipt_handles == set()
+    time.sleep(1.5)
+    assert len(sqs_client.receive_batch(wait_time_seconds=0, visibility_timeout=1)) == 1
+
+
+def test_result_listener_keeps_listening_after_receive_and_digest_errors(
+    caplog, monkeypatch, mocked_sqs_output, sqs_client
+):
+    def send_digest():
+        message = "Unable to send email"
+        raise RuntimeError(message)
+
+    listener = ResultListener(
+        sqs_client=sqs_client,
+        retry_threshold="10",
+        send_digest=send_digest,
+        wait_time_seconds=0,
+        digest_interval=0,
+    )
+    receive_calls = []
+
+    def receive_batch(**_):
+        receive_calls.append(1)
+        if len(receive_calls) == 1:
+            raise EndpointConnectionError(endpoint_url="http://sqs")
+        listener.results_since_digest = 1
+        listener.stop()
+        return []
+
+    monkeypatch.setattr(sqs_client, "receive_batch", receive_batch)
+    with caplog.at_level(logging.INFO):
+        listener.run()
+    assert len(receive_calls) == 2  # noqa: PLR2004
+    assert "Unable to receive result messages" in caplog.text
+    assert "Unable to send the digest of result messages" in caplog.text
+    assert "Stopped listening for result messages" in caplog.text
@@ -0,0 +1,30 @@
+import os
+
+from click.testing import CliRunner
+
+from tests.loadtest import main
+
+
+def test_loadtest_reports_throughput(monkeypatch):
+    monkeypatch.setattr(os, "environ", os.environ.copy())
+    result = CliRunner().invoke(
+        main,
+        [
+            "--dois",
+            "5",
+            "--latency-ms",
+            "0",
+            "--latency-jitter-ms",
+            "0",
+            "--error-rate",
+            "0",
+            "--non-pdf-rate",
+            "0",
+            "--pdf-size-kb",
+            "1",
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    assert "deposit: 5 DOIs in" in result.output
+    assert "listen: 5 result messages in" in result.output
+    assert "wiley_content" in result.output
@@ -0,0 +1,154 @@
+import io
+import json
+import logging
+
+import pytest
+
+from awd import logs
+from awd.concurrency import process_in_order
+from awd.logs import (
+    ContextFilter,
+    JsonFormatter,
+    configure_logging,
+    flush_logs,
+    log_context,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@pytest.fixture
+def configure_root_logger():
+    # pytest adds its handlers to the root logger when the test is called, so they are
+    # removed when logging is configured and restored afterwards
+    root = logging.getLogger()
+    handlers, level = [], root.level
+
+    def configure(stream, log_format="text"):
+        handlers.extend(root.handlers)
+        for handler in handlers:
+            root.removeHandler(handler)
+        configure_logging(stream, logging.INFO, log_format=log_format)
+        return root
+
+    yield configure
+    logs.stop_logging()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+
+
+def create_record(message="message", *args):
+    return logging.LogRecord(__name__, logging.INFO, __file__, 1, message, args, None)
+
+
+def test_log_context_adds_fields_to_records():
+    context_filter = ContextFilter()
+    with log_context(doi="10.1002/term.3131"):
+        with log_context(stage="crossref_metadata"):
+            record = create_record()
+            context_filter.filter(record)
+        outer_record = create_record()
+        context_filter.filter(outer_record)
+    assert (record.doi, record.stage) == ("10.1002/term.3131", "crossref_metadata")
+    assert (outer_record.doi, outer_record.stage) == ("10.1002/term.3131", None)
+
+
+def test_context_filter_keeps_existing_fields():
+    record = create_record()
+    record.doi = "10.1002/term.3131"
+    with log_context(doi="10.1002/term.3132"):
+        ContextFilter().filter(record)
+    assert record.doi == "10.1002/term.3131"
+
+
+def test_json_formatter_formats_record_with_context_fields():
+    record = create_record("DOI: %s, Result: %s", "10.1002/term.3131", {"a": 1})
+    record.doi, record.stage = "10.1002/term.3131", None
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["level"] == "INFO"
+    assert entry["message"] == "DOI: 10.1002/term.3131, Result: {'a': 1}"
+    assert entry["doi"] == "10.1002/term.3131"
+    assert "stage" not in entry
+
+
+def test_json_formatter_includes_exception():
+    error = ValueError("error")
+    record = logging.LogRecord(
+        __name__,
+        logging.ERROR,
+        __file__,
+        1,
+        "failed",
+        None,
+        exc_info=(ValueError, error, None),
+    )
+    assert "ValueError: error" in json.loads(JsonFormatter().format(record))["exception"]
+
+
+def test_configure_logging_writes_text_to_stream(configure_root_logger):
+    stream = io.StringIO()
+    configure_root_logger(stream)
+    logger.info("Info message")
+    logger.debug("Debug message")
+    flush_logs()
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 1
+    assert lines[0].startswith("INFO")
+    assert lines[0].endswith("Info message")
+
+
+def test_configure_logging_json_console(capsys, configure_root_logger):
+    stream = io.StringIO()
+    configure_root_logger(stream, log_format="json")
+    with log_context(doi="10.1002/term.3131", stage="wiley_content"):
+        logger.error("A PDF could not be retrieved for DOI: %s", "10.1002/term.3131")
+    flush_logs()
+    entry = json.loads(capsys.readouterr().err)
+    assert entry["doi"] == "10.1002/term.3131"
+    assert entry["stage"] == "wiley_content"
+    assert stream.getvalue().startswith("ERROR")
+
+
+def test_configure_logging_replaces_own_handler(configure_root_logger):
+    first_stream, second_stream = io.StringIO(), io.StringIO()
+    root_logger = configure_root_logger(first_stream)
+    configure_logging(second_stream, logging.INFO)
+    logger.info("Info message")
+    flush_logs()
+    assert len(root_logger.handlers) == 1
+    assert first_stream.getvalue() == ""
+    assert "Info message" in second_stream.getvalue()
+
+
+def test_configure_logging_leaves_existing_handlers():
+    handlers = list(logging.getLogger().handlers)
+    assert handlers
+    configure_logging(io.StringIO(), logging.INFO)
+    assert logging.getLogger().handlers == handlers
+
+
+def test_configure_logging_unknown_format_raises_exception():
+    with pytest.raises(ValueError, match="Unknown log format: xml"):
+        configure_logging(io.StringIO(), logging.INFO, log_format="xml")
+
+
+def test_configure_logging_keeps_process_in_order_records_in_order(
+    capsys, configure_root_logger
+):
+    stream = io.StringIO()
+    configure_root_logger(stream, log_format="json")
+
+    def log_doi(doi):
+        with log_context(doi=doi):
+            logger.info("Processing %s", doi)
+
+    dois = [f"10.1002/{index}" for index in range(20)]
+    for _ in process_in_order(log_doi, dois, workers=4):
+        pass
+    flush_logs()
+    assert [line.split()[-1] for line in stream.getvalue().splitlines()] == dois
+    entries = [json.loads(line) for line in capsys.readouterr().err.splitlines()]
+    assert [entry["doi"] for entry in entries] == dois
@@ -0,0 +1,35 @@
+import pytest
+
+from awd.metrics import RunMetrics
+
+
+def test_run_metrics_timer_records_stage_when_block_raises():
+    metrics = RunMetrics()
+    message = "failed"
+    with pytest.raises(ValueError, match=message), metrics.timer("stage"):
+        raise ValueError(message)
+    assert metrics.stage_summary()["stage"]["count"] == 1
+
+
+def test_run_metrics_stage_summary():
+    metrics = RunMetrics()
+    for seconds in [0.1, 0.2, 0.3, 0.4]:
+        metrics.record("upload", seconds)
+    summary = metrics.stage_summary()["upload"]
+    assert summary["count"] == 4  # noqa: PLR2004
+    assert summary["total"] == pytest.approx(1.0)
+    assert summary["mean"] == pytest.approx(0.25)
+    assert summary["p50"] == pytest.approx(0.2)
+    assert summary["max"] == pytest.approx(0.4)
+
+
+def test_run_metrics_report_and_reset():
+    metrics = RunMetrics()
+    metrics.record("crossref_metadata", 0.05)
+    metrics.increment("retries", 2)
+    report = metrics.report()
+    assert "crossref_metadata" in report
+    assert "retries: 2" in report
+    metrics.reset()
+    assert metrics.stage_summary() == {}
+    assert "retries" not in metrics.report()
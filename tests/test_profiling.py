@@ -0,0 +1,51 @@
+import pstats
+from concurrent.futures import ThreadPoolExecutor
+
+from awd.profiling import RunProfiler
+
+
+def test_run_profiler_summary_sorted_by_cumulative_time(tmp_path):
+    profiler = RunProfiler(output_path=str(tmp_path / "run.prof"), top=5)
+    profiler.start()
+    sorted(range(1000))
+    summary = profiler.summary()
+    profiler.stop()
+    assert "Ordered by: cumulative time" in summary
+    assert "List reduced from" in summary
+
+
+def test_run_profiler_stop_and_write(tmp_path):
+    profile_path = tmp_path / "run.prof"
+    profiler = RunProfiler(output_path=str(profile_path))
+    profiler.start()
+    sorted(range(1000))
+    profiler.stop_and_write()
+    assert profiler.running is False
+    assert pstats.Stats(str(profile_path)).total_calls > 0
+    assert "cumulative" in (tmp_path / "run.prof.txt").read_text()
+
+
+def test_run_profiler_stop_and_write_logs_failure(caplog, tmp_path):
+    profiler = RunProfiler(output_path=str(tmp_path / "missing" / "run.prof"))
+    profiler.start()
+    profiler.stop_and_write()
+    assert "Unable to write profile to" in caplog.text
+
+
+def sort_in_worker_thread():
+    return sorted(range(1000))
+
+
+def test_run_profiler_includes_worker_threads(tmp_path):
+    profile_path = tmp_path / "run.prof"
+    profiler = RunProfiler(output_path=str(profile_path))
+    profiler.start()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        list(executor.map(lambda _: sort_in_worker_thread(), range(4)))
+    profiler.stop_and_write()
+    stats = pstats.Stats(str(profile_path))
+    assert [
+        call_count
+        for (_, _, function), (_, call_count, *_) in stats.stats.items()
+        if function == "sort_in_worker_thread"
+    ] == [4]
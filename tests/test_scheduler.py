@@ -0,0 +1,133 @@
+import pytest
+
+from awd.database import DoiProcessAttempt
+from awd.scheduler import (
+    BackoffSchedule,
+    DoiScheduler,
+    RunDeadline,
+    unprocessed_doi_candidates,
+)
+from awd.status import Status
+
+
+def create_item(doi, process_attempts, last_modified, status_code=1):
+    return DoiProcessAttempt(
+        doi=doi,
+        process_attempts=process_attempts,
+        last_modified=last_modified,
+        status_code=status_code,
+    )
+
+
+@pytest.fixture
+def items():
+    return [
+        create_item("10.1/recent", 0, "2023-08-21 00:00:00"),
+        create_item("10.1/oldest", 9, "2023-01-01 00:00:00"),
+        create_item("10.1/middle", 2, "2023-05-01 00:00:00"),
+        create_item("10.1/new", 0, "2023-08-22 00:00:00"),
+    ]
+
+
+def test_scheduler_oldest_first(items):
+    assert DoiScheduler({"oldest": 1}).order(items, new_dois=set()) == [
+        "10.1/oldest",
+        "10.1/middle",
+        "10.1/recent",
+        "10.1/new",
+    ]
+
+
+def test_scheduler_fewest_attempts_first(items):
+    assert DoiScheduler({"fewest-attempts": 1}).order(items, new_dois=set()) == [
+        "10.1/recent",
+        "10.1/new",
+        "10.1/middle",
+        "10.1/oldest",
+    ]
+
+
+def test_scheduler_new_first(items):
+    assert DoiScheduler({"new": 1}).order(items, new_dois={"10.1/new"}) == [
+        "10.1/new",
+        "10.1/oldest",
+        "10.1/middle",
+        "10.1/recent",
+    ]
+
+
+def test_scheduler_weighted_mix_interleaves_policies(items):
+    scheduler = DoiScheduler.from_spec("new:1, oldest:2")
+    assert scheduler.weights == {"new": 1, "oldest": 2}
+    assert scheduler.order(items, new_dois={"10.1/new", "10.1/recent"}) == [
+        "10.1/recent",
+        "10.1/oldest",
+        "10.1/middle",
+        "10.1/new",
+    ]
+
+
+def test_scheduler_from_spec_rejects_unknown_policy():
+    with pytest.raises(ValueError, match="Unknown scheduling policies: newest"):
+        DoiScheduler.from_spec("newest")
+
+
+def test_scheduler_rejects_weight_below_one():
+    with pytest.raises(ValueError, match="weights must be at least 1"):
+        DoiScheduler.from_spec("oldest:0")
+
+
+def test_unprocessed_doi_candidates(items):
+    items.append(create_item("10.1/done", 1, "2023-01-01 00:00:00", status_code=3))
+    candidates = unprocessed_doi_candidates(
+        items, new_dois=["10.1/done", "10.1/unscanned", "10.1/unscanned"]
+    )
+    assert [candidate.doi for candidate in candidates] == [
+        "10.1/recent",
+        "10.1/oldest",
+        "10.1/middle",
+        "10.1/new",
+        "10.1/unscanned",
+    ]
+    assert candidates[-1].process_attempts == 0
+    assert candidates[-1].status_code == Status.UNPROCESSED.value
+
+
+def test_run_deadline_without_budget_allows_start_until_expired():
+    deadline = RunDeadline(time_budget=None)
+    assert deadline.allows_start()
+    deadline.expire()
+    assert not deadline.allows_start()
+
+
+def test_run_deadline_uses_initial_latency_until_observed():
+    deadline = RunDeadline(time_budget=10, reserve=0, initial_latency=30)
+    assert deadline.predicted_latency() == 30  # noqa: PLR2004
+    assert not deadline.allows_start()
+
+
+def test_run_deadline_predicts_from_observed_latency():
+    deadline = RunDeadline(time_budget=10, reserve=0, initial_latency=30)
+    for _ in range(39):
+        deadline.observe(1)
+    deadline.observe(60)
+    assert deadline.predicted_latency() < 10  # noqa: PLR2004
+    assert deadline.allows_start()
+
+
+def test_run_deadline_reserve_is_subtracted_from_budget():
+    deadline = RunDeadline(time_budget=100, reserve=95, initial_latency=10)
+    assert not deadline.allows_start()
+
+
+def test_backoff_schedule_doubles_delay_up_to_maximum():
+    backoff = BackoffSchedule(base_seconds=60, max_seconds=300, threshold=5)
+    assert [backoff.delay(attempts) for attempts in range(1, 6)] == [
+        60,
+        120,
+        240,
+        300,
+        300,
+    ]
+    assert not backoff.exhausted(4)
+    assert backoff.exhausted(5)
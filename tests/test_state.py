@@ -0,0 +1,178 @@
+import pytest
+from pynamodb.exceptions import DoesNotExist
+
+from awd.archive import DoiArchive
+from awd.database import DoiLeaseLostError, DoiProcessAttempt, StatusCounts
+from awd.state import (
+    DynamoDBStateStore,
+    SQLiteStateStore,
+    create_state_store,
+)
+from awd.status import Status
+
+
+def test_create_state_store(mocked_dynamodb):
+    assert isinstance(create_state_store(None, "wiley"), DynamoDBStateStore)
+    assert isinstance(create_state_store("dynamodb", "wiley"), DynamoDBStateStore)
+    state_store = create_state_store("sqlite://", "wiley")
+    assert isinstance(state_store, SQLiteStateStore)
+    assert state_store.name == "SQLite database :memory:"
+
+
+def test_create_state_store_unknown_url_raises_exception():
+    with pytest.raises(ValueError, match="Unknown state store: redis://"):
+        create_state_store("redis://", "wiley")
+
+
+def test_dynamodb_state_store_save_batch_updates_status_counts(mocked_dynamodb):
+    state_store = DynamoDBStateStore()
+    state_store.add_batch(["10.1002/term.3131", "10.1002/term.3132"])
+    assert state_store.add_batch(["10.1002/term.3131"]) == []
+    items = [state_store.get("10.1002/term.3131"), state_store.get("10.1002/term.3132")]
+    for item in items:
+        item.set_status(Status.SUCCESS.value)
+    state_store.save_batch(items, {item.doi: Status.UNPROCESSED.value for item in items})
+    assert DoiProcessAttempt.get("10.1002/term.3131").status_code == Status.SUCCESS.value
+    assert StatusCounts.read()["SUCCESS"] == 2  # noqa: PLR2004
+    assert state_store.status_counts()["UNPROCESSED"] == 0
+
+
+def test_sqlite_state_store_add_batch_skips_existing_and_archived_dois(
+    mocked_s3, s3_client
+):
+    archive = DoiArchive(s3_client, "awd")
+    s3_client.put_file("{}", "awd", archive.index_key("10.1002/archived.0001"))
+    state_store = SQLiteStateStore()
+    state_store.add("10.1002/term.3131")
+    state_store.increment_process_attempts(state_store.get("10.1002/term.3131"))
+    assert state_store.add_batch(
+        ["10.1002/term.3131", "10.1002/archived.0001", "10.1002/new.0001"],
+        archive=archive,
+    ) == ["10.1002/new.0001"]
+    assert state_store.get("10.1002/term.3131").process_attempts == 1
+    assert state_store.get("10.1002/new.0001").process_attempts == 0
+    with pytest.raises(DoesNotExist):
+        state_store.get("10.1002/archived.0001")
+    assert sorted(state_store.retrieve_unprocessed_dois()) == [
+        "10.1002/new.0001",
+        "10.1002/term.3131",
+    ]
+
+
+def test_sqlite_state_store_get_missing_doi_raises_exception():
+    with pytest.raises(DoesNotExist):
+        SQLiteStateStore().get("10.1002/term.3131")
+
+
+def test_sqlite_state_store_lease(caplog):
+    state_store = SQLiteStateStore()
+    state_store.add("10.1002/term.3131")
+    item = state_store.get("10.1002/term.3131")
+    assert state_store.acquire_lease(item, "deposit-1", 60)
+    assert item.lease_owner == "deposit-1"
+    assert not state_store.acquire_lease(
+        state_store.get("10.1002/term.3131"), "deposit-2", 60
+    )
+    state_store.release_lease(item, "deposit-2")
+    assert "Lease on 10.1002/term.3131 was no longer held by deposit-2" in caplog.text
+    state_store.release_lease(item, "deposit-1")
+    assert state_store.get("10.1002/term.3131").lease_owner is None
+
+
+def test_sqlite_state_store_expired_lease_is_reclaimed():
+    state_store = SQLiteStateStore()
+    state_store.add("10.1002/term.3131")
+    assert state_store.acquire_lease(state_store.get("10.1002/term.3131"), "old", -1)
+    item = state_store.get("10.1002/term.3131")
+    assert state_store.acquire_lease(item, "new", 60)
+    assert state_store.get("10.1002/term.3131").lease_owner == "new"
+
+
+def test_sqlite_state_store_leased_writes_fail_after_lease_is_reclaimed():
+    state_store = SQLiteStateStore()
+    state_store.add("10.1002/term.3131")
+    stalled = state_store.get("10.1002/term.3131")
+    assert state_store.acquire_lease(stalled, "old", -1)
+    item = state_store.get("10.1002/term.3131")
+    assert state_store.acquire_lease(item, "new", 60)
+    state_store.increment_process_attempts(item, lease_owner="new")
+    with pytest.raises(DoiLeaseLostError):
+        state_store.increment_process_attempts(stalled, lease_owner="old")
+    with pytest.raises(DoiLeaseLostError):
+        state_store.update_status(stalled, Status.FAILED.value, lease_owner="old")
+    item = state_store.get("10.1002/term.3131")
+    assert (item.lease_owner, item.process_attempts) == ("new", 1)
+    assert item.status_code == Status.UNPROCESSED.value
+
+
+def test_sqlite_state_store_lease_requires_unprocessed_status():
+    state_store = SQLiteStateStore()
+    state_store.add("10.1002/term.3131")
+    item = state_store.get("10.1002/term.3131")
+    state_store.update_status(item, Status.MESSAGE_SENT.value)
+    assert not state_store.acquire_lease(item, "deposit-1", 60)
+
+
+def test_sqlite_state_store_retrieve_due_in_next_attempt_order():
+    state_store = SQLiteStateStore()
+    state_store.add_batch(["10.1002/term.3131", "10.1002/term.3132"])
+    first, second = (
+        state_store.get("10.1002/term.3131"),
+        state_store.get("10.1002/term.3132"),
+    )
+    first.next_attempt_at, second.next_attempt_at = 200.0, 100.0
+    state_store.save([first, second])
+    assert [item.doi for item in state_store.retrieve_due(now=150)] == [
+        "10.1002/term.3132"
+    ]
+    assert [item.doi for item in state_store.retrieve_due(now=300)] == [
+        "10.1002/term.3132",
+        "10.1002/term.3131",
+    ]
+
+
+def test_sqlite_state_store_status_counts():
+    state_store = SQLiteStateStore()
+    state_store.add_batch(["10.1002/term.3131", "10.1002/term.3132"])
+    item = state_store.get("10.1002/term.3131")
+    item.set_status(Status.FAILED.value)
+    state_store.save_batch([item], {item.doi: Status.UNPROCESSED.value})
+    assert state_store.status_counts(reconcile=True) == {
+        "UNPROCESSED": 1,
+        "MESSAGE_SENT": 0,
+        "SUCCESS": 0,
+        "FAILED": 1,
+    }
+    assert [item.doi for item in state_store.retrieve_due()] == ["10.1002/term.3132"]
+
+
+def test_sqlite_state_store_file_is_shared(tmp_path):
+    path = str(tmp_path / "state.db")
+    SQLiteStateStore(path).add("10.1002/term.3131")
+    state_store = create_state_store(f"sqlite:///{path}", "wiley")
+    assert state_store.get("10.1002/term.3131").status_code == Status.UNPROCESSED.value
+
+
+def test_create_state_store_sqlite_relative_path(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    state_store = create_state_store("sqlite:///state.db", "wiley")
+    state_store.add("10.1002/term.3131")
+    assert state_store.name == "SQLite database state.db"
+    assert (tmp_path / "state.db").exists()
+
+
+def test_create_state_store_sqlite_url_with_host_raises_exception():
+    with pytest.raises(ValueError, match=r"Unknown state store: sqlite://state\.db"):
+        create_state_store("sqlite://state.db", "wiley")
+
+
+def test_sqlite_state_store_update_status_with_next_attempt():
+    state_store = SQLiteStateStore()
+    state_store.add("10.1002/term.3131")
+    item = state_store.get("10.1002/term.3131")
+    item.content_attempts = 1
+    state_store.update_status(item, Status.UNPROCESSED.value, next_attempt_at=500.0)
+    item = state_store.get("10.1002/term.3131")
+    assert item.content_attempts == 1
+    assert item.next_attempt_at == 500.0  # noqa: PLR2004
+    assert list(state_store.retrieve_due(now=499)) == []
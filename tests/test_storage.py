@@ -0,0 +1,95 @@
+import io
+
+import pytest
+
+from awd.helpers import S3Client, get_dois_from_spreadsheet
+from awd.storage import LocalObjectStore, copy_stream, create_object_store
+
+
+@pytest.fixture
+def local_object_store(tmp_path):
+    (tmp_path / "awd").mkdir()
+    return LocalObjectStore(str(tmp_path))
+
+
+def test_create_object_store(mocked_s3, tmp_path):
+    assert isinstance(create_object_store(None), S3Client)
+    assert isinstance(create_object_store("s3"), S3Client)
+    object_store = create_object_store(f"file://{tmp_path}")
+    assert isinstance(object_store, LocalObjectStore)
+    assert object_store.root == tmp_path
+
+
+def test_create_object_store_unknown_url_raises_exception():
+    with pytest.raises(ValueError, match="Unknown object store: gs://"):
+        create_object_store("gs://")
+
+
+def test_local_object_store_put_get_and_list_files(local_object_store):
+    local_object_store.put_file("b", "awd", "reports/run-1/b.txt")
+    local_object_store.put_file(b"a", "awd", "reports/run-1/a.txt")
+    local_object_store.put_file(io.BytesIO(b"c"), "awd", "reports/run-10/c.txt")
+    local_object_store.put_file("d", "awd", "doi.csv")
+    assert list(local_object_store.list_keys("awd", "reports/run-1")) == [
+        "reports/run-1/a.txt",
+        "reports/run-1/b.txt",
+        "reports/run-10/c.txt",
+    ]
+    assert list(local_object_store.list_keys("awd", "reports/run-1/")) == [
+        "reports/run-1/a.txt",
+        "reports/run-1/b.txt",
+    ]
+    assert local_object_store.get_file("awd", "reports/run-10/c.txt") == b"c"
+    assert list(local_object_store.list_keys("awd", "missing/")) == []
+
+
+def test_local_object_store_put_file_replaces_file(local_object_store):
+    local_object_store.put_file("old", "awd", "test.json")
+    local_object_store.put_file("new", "awd", "test.json")
+    assert local_object_store.get_file("awd", "test.json") == b"new"
+    assert list(local_object_store.list_keys("awd", "")) == ["test.json"]
+
+
+def test_local_object_store_put_file_streams_file(local_object_store, tmp_path):
+    source_path = tmp_path / "source.pdf"
+    source_path.write_bytes(b"%PDF-1.4 content")
+    with source_path.open("rb") as source:
+        local_object_store.put_file(source, "awd", "10.1002-term.3131.pdf")
+    assert local_object_store.get_file("awd", "10.1002-term.3131.pdf") == (
+        b"%PDF-1.4 content"
+    )
+
+
+def test_local_object_store_copy_archive_and_delete_files(local_object_store):
+    local_object_store.put_file("10.1002/term.3131", "awd", "doi.csv")
+    local_object_store.copy_file("awd", "doi.csv", "copy/doi.csv")
+    local_object_store.archive_file_with_new_key("awd", "doi.csv", "archived")
+    assert not local_object_store.file_exists("awd", "doi.csv")
+    assert local_object_store.file_exists("awd", "archived/doi.csv")
+    assert list(
+        local_object_store.retrieve_file_type_from_bucket("awd", ".csv", "archived")
+    ) == ["copy/doi.csv"]
+    local_object_store.delete_files("awd", ["copy/doi.csv", "missing.csv"])
+    assert not local_object_store.file_exists("awd", "copy/doi.csv")
+
+
+def test_local_object_store_uri_is_readable(local_object_store):
+    local_object_store.put_file("10.1002/term.3131\n", "awd", "doi.csv")
+    uri = local_object_store.uri("awd", "doi.csv")
+    assert uri.startswith("file://")
+    assert list(get_dois_from_spreadsheet(uri)) == ["10.1002/term.3131"]
+
+
+def test_local_object_store_check_bucket_access(caplog, local_object_store):
+    assert local_object_store.check_bucket_access("awd")
+    assert not local_object_store.check_bucket_access("not-a-bucket")
+    assert "Error accessing bucket: not-a-bucket" in caplog.text
+
+
+def test_copy_stream_copies_from_current_position(tmp_path):
+    source_path = tmp_path / "source"
+    source_path.write_bytes(b"skip-copied")
+    with source_path.open("rb") as source, (tmp_path / "copy").open("wb") as copy:
+        source.seek(5)
+        copy_stream(source, copy)
+    assert (tmp_path / "copy").read_bytes() == b"copied"